@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#
+# bench_blit.py -- per-update rendering cost of the status widgets
+#
+"""
+Builds the five limit bars of the LimitPlugin (AZ, EL, rotator and the
+two AG probes, with the limits used for SUKA) and the guiding error
+plots of the PlotPlugin, and times an update of each: new values and
+the rendering they cause.
+
+The limit bars are drawn on a ginga canvas ('canvas'); for them the
+time to build one and the cost of an update that repeats the values
+shown are also reported.  The guiding error plot is timed with
+blitting off ('figure'), where an update redraws the whole figure, and
+on ('blit'), where only the dynamic artists are drawn over the kept
+background.
+
+Runs headless with the Qt "offscreen" platform unless --display is
+given.
+
+Usage:
+    bench_blit.py [--iter=N]
+"""
+import sys, os
+import time
+import logging
+from argparse import ArgumentParser
+
+import numpy as np
+
+from ginga import toolkit
+
+pluginHome = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '..', 'statmon', 'plugins')
+
+# title, warn, alarm, limit
+limit_bars = [('AZ', (-260.0, 260.0), (-269.5, 269.5), (-270.0, 270.0)),
+              ('EL', (15.0, 89.0), (10.0, 89.5), (10.0, 90.0)),
+              ('Rotator Cs', (-260.0, 260.0), (-269.5, 269.5),
+               (-270.0, 270.0)),
+              ('Ag-R Cs', (0.0, 140.0), (0.0, 140.0), (-5.0, 145.0)),
+              ('Ag-Theta Cs', (-185.0, 185.0), (-185.0, 185.0),
+               (-185.0, 185.0))]
+
+
+def percentiles(samples, pcts=(50, 90, 99)):
+    samples = sorted(samples)
+    n = len(samples)
+    if n == 0:
+        return [0.0 for pct in pcts]
+    return [samples[min(n - 1, int(n * pct / 100.0))] for pct in pcts]
+
+
+def show(app, plot, wd, ht):
+    w = plot.get_widget()
+    w.resize(wd, ht)
+    w.show()
+    # let the resize and the deferred first draw happen
+    app.process_events()
+    time.sleep(0.5)
+    app.process_events()
+
+
+def time_updates(app, plot, update_fn, options):
+    times = []
+    for i in range(options.iter):
+        t = time.perf_counter()
+        update_fn(i)
+        if not getattr(plot, 'blit', True):
+            # the full redraw is normally deferred; count it here
+            plot.plot.redraw_now()
+        app.process_events()
+        times.append(time.perf_counter() - t)
+    return times
+
+
+def main(options, args):
+    logger = logging.getLogger('bench_blit')
+    logger.setLevel(logging.ERROR)
+    logger.addHandler(logging.StreamHandler())
+
+    if not options.display:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    toolkit.use(options.toolkit)
+    sys.path.insert(0, pluginHome)
+
+    from ginga.gw import Widgets
+    import LimitPlugin
+    import PlotPlugin
+
+    app = Widgets.Application(logger=logger)
+    rng = np.random.default_rng(0)
+
+    print("%d updates per widget" % (options.iter))
+    print("%-16s %6s %10s %10s %10s %10s %10s" % (
+        "widget", "draw", "p50 ms", "p90 ms", "p99 ms", "same ms",
+        "build ms"))
+    totals = {}
+
+    def report(name, draw, times, same_times=None, build_time=None):
+        res = [t * 1.0e3 for t in percentiles(times)]
+        totals[draw] = totals.get(draw, 0.0) + res[0]
+        extra = ''
+        if same_times is not None:
+            extra += "%10.2f" % (percentiles(same_times, pcts=(50,))[0] * 1.0e3)
+        if build_time is not None:
+            extra += " %10.2f" % (build_time * 1.0e3)
+        print("%-16s %6s %10.2f %10.2f %10.2f %s" % (name, draw, *res, extra))
+        sys.stdout.flush()
+
+    for title, warn, alarm, limit in limit_bars:
+        values = rng.uniform(limit[0], limit[1], options.iter + 1)
+        t = time.perf_counter()
+        plot = LimitPlugin.Limit(title=title, alarm=alarm, warn=warn,
+                                 limit=limit, logger=logger)
+        show(app, plot, 350, 100)
+        build_time = time.perf_counter() - t - 0.5
+        # redraw at once, rather than after a lag, so that it is counted
+        plot.viewer.set_redraw_lag(0.0)
+        times = time_updates(
+            app, plot,
+            lambda i: plot.update_limit(values[i + 1], values[i]),
+            options)
+        same_times = time_updates(
+            app, plot,
+            lambda i: plot.update_limit(values[-1], values[-2]),
+            options)
+        report(title, 'canvas', times, same_times, build_time)
+        plot.get_widget().hide()
+
+    errors = rng.normal(0.0, 250.0, (options.iter + 500, 2))
+    for blit in (False, True):
+        plot = PlotPlugin.GuidingErrorPlot(logger=logger, blit=blit)
+        show(app, plot, 350, 350)
+        # a full history of points
+        for x, y in errors[:500]:
+            plot.plot_point(x * 0.001, y * 0.001)
+        times = time_updates(app, plot,
+                             lambda i: plot.update_plot(*errors[500 + i]),
+                             options)
+        report('GuidingError', 'blit' if blit else 'figure', times)
+        plot.get_widget().hide()
+
+    for draw, total in totals.items():
+        print("%-16s %6s %10.2f" % ("sum of p50", draw, total))
+
+
+if __name__ == "__main__":
+
+    argprs = ArgumentParser(description="Blitting benchmark")
+    argprs.add_argument("--display", dest="display", default=False,
+                        action="store_true",
+                        help="Show the widgets (default: offscreen)")
+    argprs.add_argument("--iter", dest="iter", type=int, default=100,
+                        help="Number of updates timed", metavar="N")
+    argprs.add_argument("-t", "--toolkit", dest="toolkit", default='qt5',
+                        help="Use toolkit NAME", metavar="NAME")
+
+    (options, args) = argprs.parse_known_args(sys.argv[1:])
+
+    main(options, args)
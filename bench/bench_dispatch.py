@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#
+# bench_dispatch.py -- benchmark Controller.update_status dispatch cost
+#
+"""
+Measures the cost of dispatching one status packet through
+Controller.update_status as the number of registered plugins grows.
+Each plugin registers its own set of aliases and every packet touches
+only a single plugin, so dispatch cost should stay flat.
+
+Usage:
+    bench_dispatch.py [--aliases=N] [--packets=N]
+"""
+import sys
+import time
+import threading
+import logging
+from argparse import ArgumentParser
+
+from statmon.Model import StatusModel
+from statmon.Control import Controller
+
+
+class BenchController(Controller):
+    """Headless controller: no remote status handle, no thread pool,
+    and GUI callbacks are run immediately rather than queued."""
+
+    def get_status_handle(self):
+        self.proxystatus = None
+
+    def nongui_do(self, method, *args, **kwdargs):
+        pass
+
+    def gui_do(self, method, *args, **kwdargs):
+        method(*args, **kwdargs)
+
+
+def make_controller(logger):
+    model = StatusModel(logger)
+    ctrl = BenchController(logger, None, None, None, threading.Event(),
+                           model)
+    return ctrl
+
+
+def run(logger, num_plugins, num_aliases, num_packets):
+    ctrl = make_controller(logger)
+    num_callbacks = [0]
+
+    def cb_fn(statusDict):
+        num_callbacks[0] += 1
+
+    for i in range(num_plugins):
+        aliases = ['BENCH.P%d.A%d' % (i, j) for j in range(num_aliases)]
+        ctrl.register_select('plugin%d' % (i), cb_fn, aliases)
+
+    # each packet changes all the aliases of one plugin
+    packets = []
+    for k in range(num_packets):
+        i = k % num_plugins
+        packets.append({'BENCH.P%d.A%d' % (i, j): float(k)
+                        for j in range(num_aliases)})
+
+    start_time = time.perf_counter()
+    for statusInfo in packets:
+        ctrl.update_status(ctrl.model, statusInfo)
+    elapsed = time.perf_counter() - start_time
+
+    assert num_callbacks[0] == num_packets
+    return elapsed / num_packets
+
+
+def main(options, args):
+    logger = logging.getLogger('bench_dispatch')
+    logger.setLevel(logging.WARNING)
+
+    print("%10s  %14s" % ("plugins", "usec/packet"))
+    for num_plugins in (10, 100, 1000, 10000):
+        per_packet = run(logger, num_plugins, options.aliases,
+                         options.packets)
+        print("%10d  %14.2f" % (num_plugins, per_packet * 1.0e6))
+
+
+if __name__ == "__main__":
+
+    argprs = ArgumentParser(description="Status dispatch benchmark")
+    argprs.add_argument("--aliases", dest="aliases", type=int, default=20,
+                        help="Number of aliases per plugin", metavar="N")
+    argprs.add_argument("--packets", dest="packets", type=int,
+                        default=10000,
+                        help="Number of packets to dispatch", metavar="N")
+
+    (options, args) = argprs.parse_known_args(sys.argv[1:])
+
+    main(options, args)
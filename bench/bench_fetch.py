@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+#
+# bench_fetch.py -- contention benchmark for StatusModel.store/fetch
+#
+"""
+A simulated status stream writes into the StatusModel at a fixed rate
+while a number of reader "plugins" continuously fetch their aliases.
+Reports fetch and store latency percentiles for the copy-on-write model
+and, for comparison, for a model that takes the writer's lock on reads
+(the old behavior).
+
+Usage:
+    bench_fetch.py [--rate=HZ] [--readers=N] [--time=SECS]
+"""
+import sys
+import time
+import random
+import threading
+import logging
+from argparse import ArgumentParser
+
+from g2cam.status.common import STATNONE as statNone
+
+from statmon.Model import StatusModel
+
+
+class LockedStatusModel(StatusModel):
+    """StatusModel with readers and the writer sharing one lock."""
+
+    def store(self, statusInfo):
+        with self.lock:
+            self.statusDict.update(statusInfo)
+
+    def fetch(self, fetchDict):
+        with self.lock:
+            for key in fetchDict.keys():
+                fetchDict[key] = self.statusDict.get(key, statNone)
+
+
+def percentiles(samples, pcts=(50, 90, 99, 99.9)):
+    samples = sorted(samples)
+    n = len(samples)
+    if n == 0:
+        return [0.0 for pct in pcts]
+    return [samples[min(n - 1, int(n * pct / 100.0))] for pct in pcts]
+
+
+def run(model, options):
+    all_aliases = ['BENCH.A%d' % (i) for i in range(options.aliases)]
+    model.store({alias: 0.0 for alias in all_aliases})
+
+    ev_quit = threading.Event()
+    store_times = []
+    fetch_times = [[] for i in range(options.readers)]
+
+    def writer():
+        interval = 1.0 / options.rate
+        next_time = time.perf_counter()
+        k = 0
+        while not ev_quit.is_set():
+            statusInfo = {alias: float(k)
+                          for alias in random.sample(all_aliases,
+                                                     options.packet)}
+            t1 = time.perf_counter()
+            model.store(statusInfo)
+            store_times.append(time.perf_counter() - t1)
+            k += 1
+            next_time += interval
+            time.sleep(max(0.0, next_time - time.perf_counter()))
+
+    def reader(i):
+        aliases = random.sample(all_aliases, options.fetch)
+        samples = fetch_times[i]
+        while not ev_quit.is_set():
+            statusDict = {}.fromkeys(aliases)
+            t1 = time.perf_counter()
+            model.fetch(statusDict)
+            samples.append(time.perf_counter() - t1)
+            # yield, as a plugin would while it redraws
+            time.sleep(0.0)
+
+    threads = [threading.Thread(target=writer)]
+    threads.extend([threading.Thread(target=reader, args=(i,))
+                    for i in range(options.readers)])
+    for thread in threads:
+        thread.start()
+    time.sleep(options.time)
+    ev_quit.set()
+    for thread in threads:
+        thread.join()
+
+    fetches = []
+    for samples in fetch_times:
+        fetches.extend(samples)
+    return store_times, fetches
+
+
+def main(options, args):
+    logger = logging.getLogger('bench_fetch')
+    logger.setLevel(logging.WARNING)
+
+    print("writer %.0f Hz, %d readers, %d aliases/fetch, %.1f sec" % (
+        options.rate, options.readers, options.fetch, options.time))
+    print("%-16s %6s %10s %10s %10s %10s %10s" % (
+        "model", "op", "count", "p50 us", "p90 us", "p99 us", "p99.9 us"))
+    for name, klass in (('copy-on-write', StatusModel),
+                        ('locked', LockedStatusModel)):
+        store_times, fetch_times = run(klass(logger), options)
+        for op, samples in (('store', store_times), ('fetch', fetch_times)):
+            res = [t * 1.0e6 for t in percentiles(samples)]
+            print("%-16s %6s %10d %10.1f %10.1f %10.1f %10.1f" % (
+                name, op, len(samples), *res))
+
+
+if __name__ == "__main__":
+
+    argprs = ArgumentParser(description="Status cache contention benchmark")
+    argprs.add_argument("--aliases", dest="aliases", type=int, default=3000,
+                        help="Number of aliases in the cache", metavar="N")
+    argprs.add_argument("--fetch", dest="fetch", type=int, default=30,
+                        help="Number of aliases per plugin fetch",
+                        metavar="N")
+    argprs.add_argument("--packet", dest="packet", type=int, default=50,
+                        help="Number of aliases per status packet",
+                        metavar="N")
+    argprs.add_argument("--rate", dest="rate", type=float, default=200.0,
+                        help="Writer rate", metavar="HZ")
+    argprs.add_argument("--readers", dest="readers", type=int, default=20,
+                        help="Number of reader plugins", metavar="N")
+    argprs.add_argument("--time", dest="time", type=float, default=5.0,
+                        help="Duration of each run", metavar="SECS")
+
+    (options, args) = argprs.parse_known_args(sys.argv[1:])
+
+    main(options, args)
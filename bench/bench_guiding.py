@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+#
+# bench_guiding.py -- redraw time of the guiding error plot
+#
+"""
+Fills the guiding error plot of the PlotPlugin with 50, 500 and 5000
+points of history and times a redraw of the figure, and an update
+(one new point and a redraw).  The history is drawn as one collection
+(GuidingErrorPlot), or as one Circle patch per point, which is how
+the plot used to draw it.
+
+Runs headless with the Qt "offscreen" platform unless --display is
+given.
+
+Usage:
+    bench_guiding.py [--iter=N]
+"""
+import sys, os
+import time
+import logging
+from argparse import ArgumentParser
+
+import numpy as np
+
+from ginga import toolkit
+
+pluginHome = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '..', 'statmon', 'plugins')
+
+
+def percentiles(samples, pcts=(50, 90, 99)):
+    samples = sorted(samples)
+    n = len(samples)
+    if n == 0:
+        return [0.0 for pct in pcts]
+    return [samples[min(n - 1, int(n * pct / 100.0))] for pct in pcts]
+
+
+def make_plot(app, logger, num_pts):
+    import PlotPlugin
+
+    klass = type('BenchPlot', (PlotPlugin.GuidingErrorPlot,),
+                 dict(max_record=num_pts))
+    plot = klass(logger=logger)
+    w = plot.get_widget()
+    w.resize(350, 350)
+    w.show()
+    app.process_events()
+    return plot
+
+
+def run_collection(plot, errors, options):
+    for x, y in errors:
+        plot.update_plot(x, y)
+
+    redraw_times, update_times = [], []
+    for i in range(options.iter):
+        t = time.perf_counter()
+        plot.plot.redraw_now()
+        redraw_times.append(time.perf_counter() - t)
+
+        x, y = errors[i % len(errors)]
+        t = time.perf_counter()
+        plot.update_plot(x, y)
+        update_times.append(time.perf_counter() - t)
+    return redraw_times, update_times
+
+
+def run_patches(plot, errors, options):
+    from matplotlib.patches import Circle
+
+    # a patch per point, added and removed as the plot used to
+    plot.records.set_visible(False)
+    patches = []
+
+    def add_point(x, y):
+        if len(patches) > 0:
+            pre = patches[-1]
+            pre.set_radius(plot.record_radius)
+            pre.set_facecolor(plot.record_color)
+            pre.set_alpha(0.75)
+        circle = Circle(xy=(x * 0.001, y * 0.001), radius=plot.get_radius(),
+                        ec='none', fc=plot.plot_color, fill=True, alpha=1)
+        plot.axes.add_patch(circle)
+        patches.append(circle)
+        if len(patches) > plot.max_record:
+            patches.pop(0).remove()
+
+    for x, y in errors:
+        add_point(x, y)
+
+    redraw_times, update_times = [], []
+    for i in range(options.iter):
+        t = time.perf_counter()
+        plot.plot.redraw_now()
+        redraw_times.append(time.perf_counter() - t)
+
+        x, y = errors[i % len(errors)]
+        t = time.perf_counter()
+        add_point(x, y)
+        plot.draw()
+        update_times.append(time.perf_counter() - t)
+    return redraw_times, update_times
+
+
+def main(options, args):
+    logger = logging.getLogger('bench_guiding')
+    logger.setLevel(logging.ERROR)
+    logger.addHandler(logging.StreamHandler())
+
+    if not options.display:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    toolkit.use(options.toolkit)
+    sys.path.insert(0, pluginHome)
+
+    from ginga.gw import Widgets
+
+    app = Widgets.Application(logger=logger)
+
+    # guiding errors in milliarcsec, as the plot gets them
+    rng = np.random.default_rng(0)
+    errors = rng.normal(0.0, 250.0, (max(options.points), 2))
+
+    print("%d redraws" % (options.iter))
+    print("%-10s %6s %10s %10s %10s %10s" % (
+        "history", "points", "p50 ms", "p90 ms", "p99 ms", "update ms"))
+    for num_pts in options.points:
+        for name, run in (('patches', run_patches),
+                          ('collection', run_collection)):
+            plot = make_plot(app, logger, num_pts)
+            redraw_times, update_times = run(plot, errors[:num_pts],
+                                             options)
+            res = [t * 1.0e3 for t in percentiles(redraw_times)]
+            upd = percentiles(update_times, pcts=(50,))[0] * 1.0e3
+            print("%-10s %6d %10.2f %10.2f %10.2f %10.2f" % (
+                name, num_pts, *res, upd))
+            sys.stdout.flush()
+            plot.get_widget().hide()
+
+
+if __name__ == "__main__":
+
+    argprs = ArgumentParser(description="Guiding error plot benchmark")
+    argprs.add_argument("--display", dest="display", default=False,
+                        action="store_true",
+                        help="Show the plots (default: offscreen)")
+    argprs.add_argument("--iter", dest="iter", type=int, default=50,
+                        help="Number of redraws timed", metavar="N")
+    argprs.add_argument("--points", dest="points", default='50,500,5000',
+                        help="Sizes of the point history",
+                        metavar="N,N,...")
+    argprs.add_argument("-t", "--toolkit", dest="toolkit", default='qt5',
+                        help="Use toolkit NAME", metavar="NAME")
+
+    (options, args) = argprs.parse_known_args(sys.argv[1:])
+    options.points = [int(n) for n in options.points.split(',')]
+
+    main(options, args)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#
+# bench_lod.py -- redraw time of long time series plots
+#
+"""
+Builds one time series plot like those of the EnvMon plugins, holding a
+full 24 hours of points at one point a second, and times a refresh
+(new points, reduction and redraw) with 1, 6 and 24 hours visible.
+The time taken by the reduction alone is reported separately.
+The plain ginga XYPlot, which averages the points of each pixel column,
+is compared with LODXYPlot, which keeps a min/max pair per column.
+
+Runs headless with the Qt "offscreen" platform unless --display is
+given.
+
+Usage:
+    bench_lod.py [--width=PX] [--points=N] [--iter=N]
+"""
+import sys, os
+import time
+import logging
+from argparse import ArgumentParser
+
+import numpy as np
+
+from ginga import toolkit
+
+
+def percentiles(samples, pcts=(50, 90, 99)):
+    samples = sorted(samples)
+    n = len(samples)
+    if n == 0:
+        return [0.0 for pct in pcts]
+    return [samples[min(n - 1, int(n * pct / 100.0))] for pct in pcts]
+
+
+def make_points(num_pts, t_end):
+    rng = np.random.default_rng(0)
+    t = t_end - num_pts + np.arange(num_pts, dtype=float)
+    y = np.cumsum(rng.normal(0.0, 0.1, num_pts)) + 10.0
+    return np.array((t, y)).T
+
+
+def run(options, app, plot_class, hours, points):
+    from ginga.gw import Viewers
+    from ginga.plot.plotaide import PlotAide
+    from ginga.plot import time_series as tsp
+    from ginga.canvas.types import plots as gplots
+
+    logger = app.logger
+    viewer = Viewers.CanvasView(logger, render='widget')
+    viewer.set_desired_size(options.width, options.height)
+    viewer.enable_autozoom('off')
+    viewer.set_background('white')
+    aide = PlotAide(viewer)
+    aide.settings.set(autoaxis_x='off', autoaxis_y='vis')
+    aide.add_plot_decor(tsp.TimePlotBG(linewidth=2))
+    aide.add_plot_decor(tsp.XTimeAxis(num_labels=4))
+    aide.add_plot_decor(gplots.YAxis(num_labels=4))
+
+    plot = plot_class(name='bench', color='blue', x_acc=np.mean,
+                      y_acc=np.mean, linewidth=2.0, coord='data')
+    aide.add_plot(plot)
+
+    w = viewer.get_widget()
+    w.resize(options.width, options.height)
+    w.show()
+    app.process_events()
+
+    t_end = points[-1, 0]
+    plot.plot(points)
+    aide.update_plots()
+    # show the last (hours) of data
+    (x_lo, y_lo), (x_hi, y_hi) = plot.get_limits('data')
+    viewer.set_limits([(t_end - hours * 3600.0, y_lo), (t_end, y_hi)])
+    viewer.zoom_fit(axis='x')
+    app.process_events()
+
+    times, reduce_times = [], []
+    for i in range(options.iter):
+        # a refresh: the data changed, so the plot's points are reduced
+        # again and redrawn
+        plot.plot(points)
+        t = time.perf_counter()
+        aide.update_plots()
+        viewer.redraw_now(whence=0)
+        times.append(time.perf_counter() - t)
+
+        # the reduction alone
+        bbox = viewer.get_pan_bbox()
+        plot.plot(points)
+        t = time.perf_counter()
+        plot.calc_points(viewer, bbox[0][0], bbox[2][0])
+        reduce_times.append(time.perf_counter() - t)
+
+    num_drawn = len(plot.path.points)
+    w.hide()
+    return num_drawn, times, reduce_times
+
+
+def main(options, args):
+    logger = logging.getLogger('bench_lod')
+    logger.setLevel(logging.ERROR)
+    logger.addHandler(logging.StreamHandler())
+
+    if not options.display:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    toolkit.use(options.toolkit)
+
+    from ginga.gw import Widgets
+    from ginga.canvas.types.plots import XYPlot
+    from statmon.util.lod import LODXYPlot
+
+    app = Widgets.Application(logger=logger)
+
+    points = make_points(options.points, time.time())
+
+    print("%d points, plot %d px wide, %d refreshes" % (
+        options.points, options.width, options.iter))
+    print("%-10s %6s %8s %10s %10s %10s %10s" % (
+        "plot", "hours", "drawn", "reduce ms", "p50 ms", "p90 ms", "p99 ms"))
+    for hours in (1, 6, 24):
+        for name, plot_class in (('XYPlot', XYPlot),
+                                 ('LODXYPlot', LODXYPlot)):
+            num_drawn, times, reduce_times = run(options, app, plot_class,
+                                                 hours, points)
+            res = [t * 1.0e3 for t in percentiles(times)]
+            red = percentiles(reduce_times, pcts=(50,))[0] * 1.0e3
+            print("%-10s %6d %8d %10.2f %10.2f %10.2f %10.2f" % (
+                name, hours, num_drawn, red, *res))
+            sys.stdout.flush()
+
+
+if __name__ == "__main__":
+
+    argprs = ArgumentParser(description="Time series plot redraw benchmark")
+    argprs.add_argument("--display", dest="display", default=False,
+                        action="store_true",
+                        help="Show the plots (default: offscreen)")
+    argprs.add_argument("--height", dest="height", type=int, default=200,
+                        help="Plot height", metavar="PX")
+    argprs.add_argument("--iter", dest="iter", type=int, default=50,
+                        help="Number of refreshes timed", metavar="N")
+    argprs.add_argument("--points", dest="points", type=int,
+                        default=24 * 60 * 60,
+                        help="Number of points in the series", metavar="N")
+    argprs.add_argument("-t", "--toolkit", dest="toolkit", default='qt5',
+                        help="Use toolkit NAME", metavar="NAME")
+    argprs.add_argument("--width", dest="width", type=int, default=600,
+                        help="Plot width", metavar="PX")
+
+    (options, args) = argprs.parse_known_args(sys.argv[1:])
+
+    main(options, args)
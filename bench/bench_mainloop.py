@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#
+# bench_mainloop.py -- idle CPU and status latency of Controller.mainloop
+#
+"""
+Runs a Controller/Viewer with no plugins and measures:
+  - CPU used by the process while no status is arriving
+  - latency from a status packet arriving in the model to the plugin
+    callback running in the GUI thread
+
+Each main loop mode runs in its own process, since most toolkits allow
+only one application object per process.  "poll" is the old behavior
+of polling gui_queue every millisecond; "wakeup" sleeps in the toolkit's
+event loop until there is work.  Use QT_QPA_PLATFORM=offscreen to run
+without a display.
+
+Usage:
+    bench_mainloop.py [--toolkit=NAME] [--mode=poll|wakeup] [--idle=SECS]
+"""
+import sys
+import time
+import threading
+import subprocess
+import tempfile
+import logging
+from argparse import ArgumentParser
+
+from ginga import toolkit
+
+from statmon.Model import StatusModel
+
+
+def percentiles(samples, pcts=(50, 90, 99)):
+    samples = sorted(samples)
+    n = len(samples)
+    if n == 0:
+        return [0.0 for pct in pcts]
+    return [samples[min(n - 1, int(n * pct / 100.0))] for pct in pcts]
+
+
+def make_benchmon(logger, ev_quit, model):
+    from ginga.misc import Settings
+    from statmon.View import Viewer
+    from statmon.Control import Controller
+
+    class BenchMon(Controller, Viewer):
+        """Headless monitor: no remote status handle, no thread pool."""
+
+        def __init__(self, logger, ev_quit, model):
+            prefs = Settings.Preferences(basefolder=tempfile.mkdtemp(),
+                                         logger=logger)
+            settings = prefs.create_category('general')
+            Viewer.__init__(self, logger, settings, ev_quit)
+            Controller.__init__(self, logger, None, None, prefs,
+                                ev_quit, model)
+
+        def get_status_handle(self):
+            self.proxystatus = None
+
+        def nongui_do(self, method, *args, **kwdargs):
+            pass
+
+    return BenchMon(logger, ev_quit, model)
+
+
+def run(options):
+    logger = logging.getLogger('bench_mainloop')
+    logger.setLevel(logging.WARNING)
+    toolkit.use(options.toolkit)
+
+    ev_quit = threading.Event()
+    model = StatusModel(logger)
+    mon = make_benchmon(logger, ev_quit, model)
+    latencies = []
+    res = {}
+
+    def cb_fn(statusDict):
+        latencies.append(time.perf_counter() - statusDict['BENCH.T'])
+
+    mon.register_select('bench', cb_fn, ['BENCH.T'])
+
+    def driver():
+        # let the main loop get going
+        time.sleep(0.5)
+
+        # idle: nothing arrives
+        cpu, wall = time.process_time(), time.perf_counter()
+        time.sleep(options.idle)
+        res['idle'] = (time.process_time() - cpu) / (
+            time.perf_counter() - wall)
+
+        # packets arriving at a modest rate, so each one finds the
+        # main loop idle
+        for i in range(options.packets):
+            model.update_statusInfo({'BENCH.T': time.perf_counter()})
+            time.sleep(options.interval)
+
+        time.sleep(0.5)
+        mon.stop()
+
+    thread = threading.Thread(target=driver)
+    thread.start()
+    mon.mainloop(timeout=0.001 if options.mode == 'poll' else None)
+    thread.join()
+
+    res['lat'] = [t * 1.0e3 for t in percentiles(latencies)]
+    print("%-8s %10.1f %10d %10.3f %10.3f %10.3f" % (
+        options.mode, res['idle'] * 100.0, len(latencies), *res['lat']))
+
+
+def main(options, args):
+    if options.mode is not None:
+        run(options)
+        return
+
+    print("toolkit %s, %.1f sec idle, %d packets" % (
+        options.toolkit, options.idle, options.packets))
+    print("%-8s %10s %10s %10s %10s %10s" % (
+        "mode", "idle CPU%", "packets", "p50 ms", "p90 ms", "p99 ms"))
+    sys.stdout.flush()
+    for mode in ('poll', 'wakeup'):
+        subprocess.run([sys.executable, sys.argv[0], '--mode', mode] +
+                       sys.argv[1:], check=True)
+
+
+if __name__ == "__main__":
+
+    argprs = ArgumentParser(description="Main loop idle CPU and latency benchmark")
+    argprs.add_argument("--idle", dest="idle", type=float, default=5.0,
+                        help="Time to measure idle CPU", metavar="SECS")
+    argprs.add_argument("--interval", dest="interval", type=float,
+                        default=0.02,
+                        help="Time between packets", metavar="SECS")
+    argprs.add_argument("--mode", dest="mode", default=None,
+                        choices=('poll', 'wakeup'),
+                        help="Run only one main loop mode")
+    argprs.add_argument("--packets", dest="packets", type=int, default=200,
+                        help="Number of packets for latency", metavar="N")
+    argprs.add_argument("-t", "--toolkit", dest="toolkit", default='qt5',
+                        help="Use toolkit NAME", metavar="NAME")
+
+    (options, args) = argprs.parse_known_args(sys.argv[1:])
+
+    main(options, args)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+#
+# bench_memory.py -- resident memory of full time series plots
+#
+"""
+Loads the plugin list and layout of one of the monitor scripts
+(statmon, envmon or guidemon), fills every time series the plugins
+keep to its full length (num_pts points) and reports the growth in
+resident memory, with the values kept as float64 (the default) and
+as float32 ('compact_history', set in each plugin_<name>.cfg).
+
+The plots are refreshed after filling, so that the memory held by
+the plots themselves is counted.  Each case runs in its own process.
+Runs headless with the Qt "offscreen" platform unless --display is
+given.
+
+Usage:
+    bench_memory.py [--monitor=NAME]
+"""
+import sys, os
+import gc
+import time
+import runpy
+import threading
+import tempfile
+import subprocess
+import logging
+from argparse import ArgumentParser
+
+import numpy as np
+
+from ginga import toolkit
+from ginga.misc import ModuleManager, Settings, Task
+
+from statmon.Model import StatusModel
+
+import bench_replay
+
+
+def get_rss():
+    """Returns the resident set size of this process, in bytes."""
+    with open('/proc/self/status', 'r') as in_f:
+        for line in in_f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def fill_points(num_pts):
+    t = time.time() - num_pts + np.arange(num_pts, dtype=float)
+    return np.array((t, 10.0 + np.sin(t / 600.0))).T
+
+
+def run(options):
+    logger = logging.getLogger('bench_memory')
+    logger.setLevel(logging.ERROR)
+    logger.addHandler(logging.StreamHandler())
+
+    # plugins that persist their plots write under $HOME
+    os.environ['HOME'] = tempfile.mkdtemp()
+    basedir = tempfile.mkdtemp()
+
+    # pick up the plugin list and layout of the monitor
+    script = runpy.run_path(os.path.join(bench_replay.scriptHome,
+                                         options.monitor),
+                            run_name='bench_' + options.monitor)
+    for plugin_info in script['plugins']:
+        with open(os.path.join(basedir, 'plugin_%s.cfg' % (
+                plugin_info[0])), 'w') as out_f:
+            out_f.write("compact_history = %s\n" % (options.compact))
+
+    if not options.display:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    toolkit.use(options.toolkit)
+
+    ev_quit = threading.Event()
+    threadPool = Task.ThreadPool(logger=logger, ev_quit=ev_quit,
+                                 numthreads=4)
+    mm = ModuleManager.ModuleManager(logger)
+    prefs = Settings.Preferences(basefolder=basedir, logger=logger)
+    model = StatusModel(logger)
+    mon = bench_replay.make_benchmon(logger, threadPool, mm, prefs, ev_quit,
+                                     model)
+
+    mon.build_toplevel(layout=script['default_layout'])
+    for w in mon.ds.toplevels:
+        w.show()
+    for pluginName, moduleName, className, wsName, tabName in script['plugins']:
+        mon.load_plugin(pluginName, moduleName, className, wsName, tabName)
+    mon.update_pending()
+    # the time series plugins
+    plugins = [bnch.obj for bnch in mon.plugins.values()
+               if hasattr(bnch.get('obj', None), 'alias_d')]
+    gc.collect()
+    rss_start = get_rss()
+
+    # fill the shared history, then the plugins' own buffers
+    num_series = 0
+    for ring in model.history.rings.values():
+        ring.set_points(fill_points(ring.length))
+        num_series += 1
+    for plugin in plugins:
+        for bnch in plugin.alias_d.values():
+            if not bnch.shared:
+                bnch.dsrc.set_points(fill_points(plugin.num_pts))
+                num_series += 1
+        plugin.dirty.update(plugin.alias_d.keys())
+        plugin.update_plots()
+    mon.update_pending()
+    gc.collect()
+    rss_end = get_rss()
+
+    ev_quit.set()
+    mon.stop()
+
+    print("%-9s %-8s %7d %10.1f %10.1f %10.1f" % (
+        options.monitor, "float32" if options.compact else "float64",
+        num_series, rss_start / 2.0**20, rss_end / 2.0**20,
+        (rss_end - rss_start) / 2.0**20))
+
+
+def main(options, args):
+    if options.monitor is not None and options.compact is not None:
+        run(options)
+        return
+
+    print("%-9s %-8s %7s %10s %10s %10s" % (
+        "monitor", "values", "series", "start MB", "full MB", "growth MB"))
+    sys.stdout.flush()
+    monitors = ('statmon', 'envmon', 'guidemon')
+    if options.monitor is not None:
+        monitors = (options.monitor,)
+    for name in monitors:
+        for compact in (False, True):
+            subprocess.run([sys.executable, sys.argv[0], '--monitor', name,
+                            '--compact=%s' % (compact)] + sys.argv[1:],
+                           check=True)
+
+
+if __name__ == "__main__":
+
+    argprs = ArgumentParser(description="Time series memory benchmark")
+    argprs.add_argument("--compact", dest="compact", default=None,
+                        choices=('True', 'False'),
+                        help="Run only with compact history on or off")
+    argprs.add_argument("--display", dest="display", default=False,
+                        action="store_true",
+                        help="Show the monitor (default: offscreen)")
+    argprs.add_argument("--monitor", dest="monitor", default=None,
+                        choices=('statmon', 'envmon', 'guidemon'),
+                        help="Run only one monitor")
+    argprs.add_argument("-t", "--toolkit", dest="toolkit", default='qt5',
+                        help="Use toolkit NAME", metavar="NAME")
+
+    (options, args) = argprs.parse_known_args(sys.argv[1:])
+    if options.compact is not None:
+        options.compact = (options.compact == 'True')
+
+    main(options, args)
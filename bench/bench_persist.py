@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+# bench_persist.py -- GUI thread stall per EnvMon persist cycle
+#
+"""
+Simulates the persist cycle of an EnvMon plugin holding a day of
+history for a number of aliases, and measures how long each cycle
+blocks the GUI thread:
+
+  pickle      the original scheme: copy every alias's points and
+              np.save() them all as one pickled dict
+  sync        append-only series files, written in the GUI thread
+  background  append-only series files, written on a worker thread
+              (what the plugins do now)
+
+Between cycles each alias gets the points of one save interval.
+
+Usage:
+    bench_persist.py [--aliases=N] [--points=N] [--cycles=N]
+"""
+import sys, os
+import time
+import shutil
+import tempfile
+import threading
+import logging
+from argparse import ArgumentParser
+
+import numpy as np
+
+from statmon.util import persist
+
+
+def percentiles(samples, pcts=(50, 90, 99)):
+    samples = sorted(samples)
+    n = len(samples)
+    if n == 0:
+        return [0.0 for pct in pcts]
+    return [samples[min(n - 1, int(n * pct / 100.0))] for pct in pcts]
+
+
+def nongui_do(method, *args, **kwdargs):
+    thread = threading.Thread(target=method, args=args, kwargs=kwdargs)
+    thread.start()
+
+
+def run(mode, logger, options, dirpath):
+    aliases = ['BENCH.A%d' % (i) for i in range(options.aliases)]
+    t0 = time.time() - options.points
+    history = {alias: np.column_stack((t0 + np.arange(options.points),
+                                       np.random.rand(options.points)))
+               for alias in aliases}
+
+    store = persist.SeriesStore(os.path.join(dirpath, mode),
+                                options.points, logger)
+    for alias in aliases:
+        store.import_points(alias, history[alias])
+    store.save()
+    save_file = os.path.join(dirpath, mode + '.npy')
+
+    stalls = []
+    t = t0 + options.points
+    for i in range(options.cycles):
+        # one save interval of new points
+        for k in range(options.interval):
+            t += 1.0
+            for alias in aliases:
+                store.append(alias, t, 1.0)
+
+        start_time = time.perf_counter()
+        if mode == 'pickle':
+            cst = {alias: np.copy(history[alias]) for alias in aliases}
+            np.save(save_file, cst, allow_pickle=True)
+        elif mode == 'sync':
+            store.save()
+        else:
+            store.save_in_background(nongui_do)
+        stalls.append(time.perf_counter() - start_time)
+
+        # let any background save finish before the next cycle
+        while store.saving:
+            time.sleep(0.01)
+
+    store.close()
+    return stalls
+
+
+def main(options, args):
+    logger = logging.getLogger('bench_persist')
+    logger.setLevel(logging.WARNING)
+
+    dirpath = tempfile.mkdtemp()
+    try:
+        print("%d aliases x %d points, %d new points/cycle, %d cycles" % (
+            options.aliases, options.points, options.interval,
+            options.cycles))
+        print("%-12s %12s %12s %12s" % ("mode", "p50 ms", "p90 ms",
+                                        "max ms"))
+        for mode in ('pickle', 'sync', 'background'):
+            stalls = run(mode, logger, options, dirpath)
+            res = [t * 1.0e3 for t in percentiles(stalls, (50, 90, 100))]
+            print("%-12s %12.3f %12.3f %12.3f" % (mode, *res))
+    finally:
+        shutil.rmtree(dirpath)
+
+
+if __name__ == "__main__":
+
+    argprs = ArgumentParser(description="Persist stall benchmark")
+    argprs.add_argument("--aliases", dest="aliases", type=int, default=20,
+                        help="Number of aliases", metavar="N")
+    argprs.add_argument("--cycles", dest="cycles", type=int, default=10,
+                        help="Number of persist cycles", metavar="N")
+    argprs.add_argument("--interval", dest="interval", type=int,
+                        default=600,
+                        help="New points per alias per cycle", metavar="N")
+    argprs.add_argument("--points", dest="points", type=int,
+                        default=86400,
+                        help="Points of history per alias", metavar="N")
+
+    (options, args) = argprs.parse_known_args(sys.argv[1:])
+
+    main(options, args)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+#
+# bench_replay.py -- end-to-end status throughput benchmark
+#
+"""
+Loads the plugin list and layout of one of the monitor scripts
+(statmon, envmon or guidemon), then feeds it a recorded (--replay) or
+synthetic status stream through StatusModel.consume_stream, exactly as
+the live stream would.  The synthetic stream covers all the aliases
+that the loaded plugins registered for.
+
+Reports, per monitor:
+  - envelopes ingested per second
+  - dispatch latency: from an envelope being put on the status queue to
+    all the plugin callbacks for it being queued for the GUI
+  - GUI callback lag: from a plugin callback being queued to it running
+
+Runs headless: the Qt "offscreen" platform is used unless --display is
+given.  With --dummy the plugins are built but their status callbacks
+are replaced by no-ops, which measures the status pipeline without the
+cost of redrawing.  Each monitor runs in its own process.
+
+By default envelopes are sent as fast as possible, to measure
+throughput; use --speed=1 to see the latencies at the recorded (or
+synthetic) rate.
+
+Usage:
+    bench_replay.py [--monitor=NAME] [--replay=FILE] [--packets=N]
+                    [--rate=HZ] [--speed=FACTOR] [--template=FILE]
+                    [--dummy]
+"""
+import sys, os
+import time
+import runpy
+import threading
+import tempfile
+import subprocess
+import logging
+import queue as Queue
+from argparse import ArgumentParser
+
+from ginga import toolkit
+from ginga.misc import ModuleManager, Settings, Task
+
+from statmon.Model import StatusModel
+from statmon.util import replay
+
+scriptHome = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '..', 'scripts')
+
+# alias stamped into each envelope with the time it was queued
+al_stamp = 'BENCH.STAMP'
+
+
+def percentiles(samples, pcts=(50, 90, 99)):
+    samples = sorted(samples)
+    n = len(samples)
+    if n == 0:
+        return [0.0 for pct in pcts]
+    return [samples[min(n - 1, int(n * pct / 100.0))] for pct in pcts]
+
+
+class BenchModel(StatusModel):
+    """StatusModel that times the ingestion of each update."""
+
+    def __init__(self, logger):
+        super().__init__(logger)
+        self.arrival = 0.0
+        self.num_updates = 0
+        self.dispatch_times = []
+        self.last_done = 0.0
+
+    def update_statusInfo(self, statusInfo, batch=None):
+        self.arrival = time.perf_counter()
+        super().update_statusInfo(statusInfo, batch=batch)
+        self.last_done = time.perf_counter()
+        self.num_updates += 1
+        self.dispatch_times.append(
+            self.last_done - statusInfo.get(al_stamp, self.arrival))
+
+
+def make_benchmon(logger, threadPool, mm, prefs, ev_quit, model):
+    from statmon.View import Viewer
+    from statmon.Control import Controller
+
+    class BenchMon(Controller, Viewer):
+        """Monitor without a remote status service, that timestamps
+        plugin callbacks when they are queued and when they run."""
+
+        def __init__(self, logger, threadPool, mm, prefs, ev_quit, model):
+            settings = prefs.create_category('general')
+            Viewer.__init__(self, logger, settings, ev_quit)
+            self.queued = {}
+            self.lags = []
+            Controller.__init__(self, logger, threadPool, mm, prefs,
+                                ev_quit, model)
+            self.name = 'benchmon'
+
+        def get_status_handle(self):
+            self.proxystatus = None
+
+        def fetch_missing_aliases(self, aliases):
+            pass
+
+        def queue_callback(self, cbkey, reg, statusDict):
+            with self.lock:
+                # keep the oldest, if the callback is merged into
+                # one that is already queued
+                self.queued.setdefault(cbkey, self.model.arrival)
+            super().queue_callback(cbkey, reg, statusDict)
+
+        def time_callbacks(self, dummy=False):
+            """Wrap the callbacks of all registrations, to record their
+            lag.  If (dummy) is True the callbacks themselves are not
+            called."""
+            def make_wrapper(cbkey, cb_fn):
+                def wrapper(*args):
+                    with self.lock:
+                        t = self.queued.pop(cbkey, None)
+                    if t is not None:
+                        self.lags.append(time.perf_counter() - t)
+                    if not dummy:
+                        return cb_fn(*args)
+                return wrapper
+
+            with self.lock:
+                for cbkey, reg in self.regSelect.items():
+                    reg.cb_fn = make_wrapper(cbkey, reg.cb_fn)
+
+    return BenchMon(logger, threadPool, mm, prefs, ev_quit, model)
+
+
+def run(options):
+    logger = logging.getLogger('bench_replay')
+    logger.setLevel(logging.ERROR)
+    logger.addHandler(logging.StreamHandler())
+
+    # pick up the plugin list and layout of the monitor
+    script = runpy.run_path(os.path.join(scriptHome, options.monitor),
+                            run_name='bench_' + options.monitor)
+
+    if not options.display:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    toolkit.use(options.toolkit)
+
+    ev_quit = threading.Event()
+    threadPool = Task.ThreadPool(logger=logger, ev_quit=ev_quit,
+                                 numthreads=4)
+    mm = ModuleManager.ModuleManager(logger)
+    prefs = Settings.Preferences(basefolder=tempfile.mkdtemp(),
+                                 logger=logger)
+    model = BenchModel(logger)
+    mon = make_benchmon(logger, threadPool, mm, prefs, ev_quit, model)
+
+    mon.build_toplevel(layout=script['default_layout'])
+    for w in mon.ds.toplevels:
+        w.show()
+    for pluginName, moduleName, className, wsName, tabName in script['plugins']:
+        mon.load_plugin(pluginName, moduleName, className, wsName, tabName)
+    mon.update_pending()
+
+    mon.time_callbacks(dummy=options.dummy)
+    aliases = set(mon.regAlias.keys())
+
+    if options.replay:
+        records = list(replay.read_envelopes(options.replay))
+    else:
+        time_aliases = set([ring.time_alias
+                            for ring in model.history.rings.values()
+                            if ring.time_alias is not None])
+        template = None
+        if options.template:
+            template = replay.template_from_records(
+                replay.read_envelopes(options.template))
+        gen = replay.SyntheticStream(aliases - time_aliases,
+                                     rate=options.rate,
+                                     fraction=options.fraction,
+                                     template=template,
+                                     time_aliases=time_aliases, seed=0)
+        records = list(gen.records(options.packets))
+
+    threadPool.startall(wait=True)
+    status_q = Queue.Queue()
+    consumer = threading.Thread(target=model.consume_stream,
+                                args=(ev_quit, status_q, options.batch_size,
+                                      options.batch_time))
+    consumer.start()
+    res = {}
+
+    def driver():
+        # let the GUI settle
+        time.sleep(1.0)
+        start_time = time.perf_counter()
+        res['count'] = replay.replay_stream(ev_quit, status_q, records,
+                                            speed=options.speed,
+                                            stamp=al_stamp)
+        # wait for the model and GUI to catch up
+        while not status_q.empty() or mon.gui_queue.qsize() > 0:
+            time.sleep(0.01)
+        time.sleep(0.5)
+        res['elapsed'] = model.last_done - start_time
+        mon.stop()
+
+    thread = threading.Thread(target=driver)
+    thread.start()
+    try:
+        mon.mainloop()
+    finally:
+        ev_quit.set()
+        thread.join()
+        consumer.join()
+        threadPool.stopall(wait=True)
+
+    disp = [t * 1.0e3 for t in percentiles(model.dispatch_times)]
+    lag = [t * 1.0e3 for t in percentiles(mon.lags)]
+    print("%-9s %5d %6d %7d %9.0f %8.2f %8.2f %8.2f %7d %8.2f %8.2f %8.2f" % (
+        options.monitor, len(mon.regSelect), len(aliases), res['count'],
+        res['count'] / res['elapsed'], *disp, len(mon.lags), *lag))
+
+
+def main(options, args):
+    if options.monitor is not None:
+        run(options)
+        return
+
+    print("%s, %s, speed %s" % (
+        "dummy view" if options.dummy else "full view",
+        options.replay if options.replay else
+        "synthetic %d pkts @ %.0f Hz" % (options.packets, options.rate),
+        options.speed if options.speed > 0 else "max"))
+    print("%-9s %5s %6s %7s %9s %8s %8s %8s %7s %8s %8s %8s" % (
+        "monitor", "regs", "alias", "pkts", "pkts/s",
+        "disp p50", "p90", "p99", "cbs", "lag p50", "p90", "p99"))
+    sys.stdout.flush()
+    for name in ('statmon', 'envmon', 'guidemon'):
+        subprocess.run([sys.executable, sys.argv[0], '--monitor', name] +
+                       sys.argv[1:], check=True)
+
+
+if __name__ == "__main__":
+
+    argprs = ArgumentParser(description="Status stream replay benchmark")
+    argprs.add_argument("--batch-size", dest="batch_size", type=int,
+                        default=200,
+                        help="Max envelopes merged per update", metavar="N")
+    argprs.add_argument("--batch-time", dest="batch_time", type=float,
+                        default=0.05,
+                        help="Max time merging envelopes", metavar="SECS")
+    argprs.add_argument("--display", dest="display", default=False,
+                        action="store_true",
+                        help="Show the monitor (default: offscreen)")
+    argprs.add_argument("--dummy", dest="dummy", default=False,
+                        action="store_true",
+                        help="Replace plugin callbacks with no-ops")
+    argprs.add_argument("--fraction", dest="fraction", type=float,
+                        default=0.05,
+                        help="Fraction of aliases in a synthetic packet",
+                        metavar="FRAC")
+    argprs.add_argument("--monitor", dest="monitor", default=None,
+                        choices=('statmon', 'envmon', 'guidemon'),
+                        help="Run only one monitor")
+    argprs.add_argument("--packets", dest="packets", type=int, default=2000,
+                        help="Number of synthetic packets", metavar="N")
+    argprs.add_argument("--rate", dest="rate", type=float, default=50.0,
+                        help="Synthetic packet rate", metavar="HZ")
+    argprs.add_argument("--replay", dest="replay", default=None,
+                        help="Replay recorded envelopes from FILE",
+                        metavar="FILE")
+    argprs.add_argument("--speed", dest="speed", type=float, default=0.0,
+                        help="Replay at FACTOR times real time (0=max)",
+                        metavar="FACTOR")
+    argprs.add_argument("--template", dest="template", default=None,
+                        help="Type synthetic values like those in FILE",
+                        metavar="FILE")
+    argprs.add_argument("-t", "--toolkit", dest="toolkit", default='qt5',
+                        help="Use toolkit NAME", metavar="NAME")
+
+    (options, args) = argprs.parse_known_args(sys.argv[1:])
+
+    main(options, args)
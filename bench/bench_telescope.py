@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+#
+# bench_telescope.py -- per-update cost of the telescope schematic
+#
+"""
+Builds the telescope schematic of the TelescopePlugin and feeds it a
+mix of status packets.  Each packet has all the aliases of the plugin,
+as the plugin gets them.  In the 'tracking' mix, AZ, EL and the wind
+change in every packet, the focus position in one packet in 5 and the
+windscreen in one in 10.  In the 'steady' mix only the wind changes, in
+one packet in 10.  The rest of the status stays the same.
+
+Reports the CPU time of an update, including the redraw it causes, the
+CPU time of the update without the redraw ('parts ms') and the number
+of redraws.  The updates are timed with every part of the schematic
+redone for each packet ('every', as the plugin used to) and with only
+the parts whose status changed ('changed').
+
+Runs headless with the Qt "offscreen" platform unless --display is
+given.
+
+Usage:
+    bench_telescope.py [--iter=N] [--obcp=NAME]
+"""
+import sys, os
+import time
+import random
+import logging
+from argparse import ArgumentParser
+
+from ginga import toolkit
+
+pluginHome = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '..', 'statmon', 'plugins')
+
+# status of a telescope tracking with the Cs focus in use
+base_status = {
+    'STATL.DOMESHUTTER_POS': 'OPEN', 'TSCV.TopScreen': 0x0C,
+    'TSCL.TSFPOS': 5.0, 'TSCL.TSRPOS': 9.0,
+    'TSCV.WINDSDRV': 0x04, 'TSCV.WindScreen': 0x01,
+    'TSCL.WINDSPOS': 6.0, 'TSCL.WINDSCMD': 6.0,
+    'TSCL.WINDD': 120.0, 'TSCL.WINDS_O': 4.0, 'TSCL.Z': 0.3217,
+    'STATL.FOC_DESCR': 'Cassegrain', 'STATL.M2_DESCR': 'CS Opt M2',
+    'TSCV.FOCUSALARM': 0x00, 'TSCS.AZ': 35.0, 'TSCS.EL': 60.0,
+    'STATL.TELDRIVE': 'Guiding(AG1)',
+    'TSCV.M1Cover': 0x1111111111111111111111, 'TSCV.M1CoverOnway': 0x00,
+    'TSCV.CellCover': 0x01, 'TSCV.M3Drive': 0x0a,
+    'TSCV.InsRotRotation': 0x01, 'TSCV.InsRotMode': 0x01,
+    'TSCV.ADCOnOff': 0x01, 'TSCV.ADCMode': 0x04, 'TSCV.ADCInOut': 0x08,
+}
+
+
+def percentiles(samples, pcts=(50, 90, 99)):
+    samples = sorted(samples)
+    n = len(samples)
+    if n == 0:
+        return [0.0 for pct in pcts]
+    return [samples[min(n - 1, int(n * pct / 100.0))] for pct in pcts]
+
+
+def make_packets(mix, aliases, num_packets, seed=0):
+    rng = random.Random(seed)
+    status = {alias: base_status.get(alias, None) for alias in aliases}
+    packets = []
+    for i in range(num_packets):
+        status = dict(status)
+        if mix == 'tracking':
+            status['TSCS.AZ'] += 0.004
+            status['TSCS.EL'] += 0.002
+            change_wind = True
+            if i % 5 == 0:
+                status['TSCL.Z'] += rng.gauss(0.0, 0.0005)
+            if i % 10 == 0:
+                status['TSCL.WINDSPOS'] = round(6.0 + rng.gauss(0.0, 0.2), 2)
+        else:
+            change_wind = (i % 10 == 0)
+        if change_wind:
+            status['TSCL.WINDD'] = round(120.0 + rng.gauss(0.0, 5.0), 1)
+            status['TSCL.WINDS_O'] = round(4.0 + rng.gauss(0.0, 0.5), 1)
+        packets.append(status)
+    return packets
+
+
+def main(options, args):
+    logger = logging.getLogger('bench_telescope')
+    logger.setLevel(logging.ERROR)
+    logger.addHandler(logging.StreamHandler())
+
+    if not options.display:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    toolkit.use(options.toolkit)
+    sys.path.insert(0, pluginHome)
+
+    from ginga.gw import Widgets
+    import TelescopePlugin
+
+    app = Widgets.Application(logger=logger)
+
+    print("%d updates, %s focus" % (options.iter, options.obcp))
+    print("%-9s %-8s %10s %10s %10s %10s %8s" % (
+        "mix", "parts", "p50 ms", "p90 ms", "p99 ms", "parts ms",
+        "redraws"))
+    for mix in ('tracking', 'steady'):
+        packets = make_packets(mix, TelescopePlugin.TelescopePlugin.aliases,
+                               options.iter + 1)
+        for parts in ('every', 'changed'):
+            tel = TelescopePlugin.TelescopeCanvas(logger, obcp=options.obcp)
+            w = tel.get_widget()
+            w.resize(400, 400)
+            w.show()
+            tel.set_focus(options.obcp)
+            # redraw at once, rather than after a lag, so that it is counted
+            tel.viewer.set_redraw_lag(0.0)
+            tel.update_telescope(**packets[0])
+            app.process_events()
+
+            # time the redraws apart
+            redraw_times = []
+            redraw_now = tel.viewer.redraw_now
+
+            def timed_redraw_now(whence=0):
+                t = time.process_time()
+                redraw_now(whence=whence)
+                redraw_times.append(time.process_time() - t)
+            tel.viewer.redraw_now = timed_redraw_now
+
+            times, part_times, num_redraws = [], [], 0
+            for status in packets[1:]:
+                del redraw_times[:]
+                t = time.process_time()
+                if parts == 'every':
+                    tel.invalidate()
+                tel.update_telescope(**status)
+                app.process_events()
+                times.append(time.process_time() - t)
+                part_times.append(times[-1] - sum(redraw_times))
+                num_redraws += int(len(redraw_times) > 0)
+
+            res = [t * 1.0e3 for t in percentiles(times)]
+            res.append(percentiles(part_times, pcts=(50,))[0] * 1.0e3)
+            print("%-9s %-8s %10.2f %10.2f %10.2f %10.2f %8d" % (
+                mix, parts, *res, num_redraws))
+            sys.stdout.flush()
+            w.hide()
+
+
+if __name__ == "__main__":
+
+    argprs = ArgumentParser(description="Telescope schematic benchmark")
+    argprs.add_argument("--display", dest="display", default=False,
+                        action="store_true",
+                        help="Show the schematic (default: offscreen)")
+    argprs.add_argument("--iter", dest="iter", type=int, default=500,
+                        help="Number of updates timed", metavar="N")
+    argprs.add_argument("--obcp", dest="obcp", default='FOCAS',
+                        help="Instrument, for the focus shown",
+                        metavar="NAME")
+    argprs.add_argument("-t", "--toolkit", dest="toolkit", default='qt5',
+                        help="Use toolkit NAME", metavar="NAME")
+
+    (options, args) = argprs.parse_known_args(sys.argv[1:])
+
+    main(options, args)
@@ -10,10 +10,13 @@ import time
 import threading
 import queue as Queue
 import _thread as thread
+from collections import deque
 
 from g2base.remoteObjects import remoteObjects as ro
 
-from ginga.misc import Callback, Future, Task
+from ginga.misc import Callback, Future, Task, Bunch, Timer
+
+from statmon.util.stats import CallbackStats
 
 class ControlError(Exception):
     """Exception for errors thrown in this module."""
@@ -40,14 +43,32 @@ class Controller(Callback.Callbacks):
             self.enable_callback(name)
 
         self.gui_queue = Queue.Queue()
+        # queues of GwMain.gui_do_priority() and gui_do_oneshot()
+        self.priority_gui_queue = Queue.PriorityQueue()
+        self.oneshots = {}
         self.gui_thread_id = thread.get_ident()
+        # Thread-safe function that wakes up the GUI thread to drain
+        # gui_queue; set by mainloop() if the toolkit can do that
+        self.wakeup_fn = None
+        self.wakeup_pending = False
+        # Max time (secs) to spend draining gui_queue in one wakeup
+        self.gui_slice = 0.02
         # For asynchronous tasks on the thread pool
         self.tag = 'master'
         self.shares = ['threadPool', 'logger']
 
         self.lock = threading.RLock()
+        # For trailing flushes of rate-limited registrations
+        self.tmr_factory = Timer.TimerFactory(ev_quit=ev_quit, logger=logger)
         # Time limit (secs) that GUI should update within or get a warning
         self.update_limit = 1.0
+        # If True, a plugin has at most one status callback waiting in
+        # gui_queue; newer packets are merged into the pending one
+        self.coalesce_updates = True
+        # Holds the pending (not yet delivered) status delta per plugin
+        self.regPending = {}
+        # Number of status updates merged into a pending callback
+        self.num_merged = 0
 
         # Registrations for channels that plugins want to subscribe to
         self.regChannels = {}
@@ -55,6 +76,12 @@ class Controller(Callback.Callbacks):
 
         # Holds plugin registrations for specific status items
         self.regSelect = {}
+        # Inverted index of alias -> set of registration idents, so that
+        # dispatching a packet only costs time for the aliases in it
+        self.regAlias = {}
+        # Callback statistics per registration ident; these survive
+        # re-registration
+        self.regStats = {}
         self.model.add_callback('status-arrived', self.update_status)
 
         self.get_status_handle()
@@ -69,6 +96,10 @@ class Controller(Callback.Callbacks):
 
     def stop(self):
         self.ev_quit.set()
+        self.tmr_factory.quit()
+        # make sure a sleeping GUI thread notices that we are done
+        if self.wakeup_fn is not None:
+            self.wakeup_fn()
 
     def register_channels(self, ident, cb_fn, channels):
         # channels can be supplied as either a comma-separated string
@@ -111,22 +142,19 @@ class Controller(Callback.Callbacks):
         if len(statusInfo) == 0:
             return
 
-        aliasset = set(statusInfo.keys())
-
-        for cbkey in self.regSelect.keys():
-            aliases, cb_fn = self.regSelect[cbkey]
-            s = aliases.intersection(aliasset)
-            if len(s) > 0:
-                statusDict = {}.fromkeys(aliases)
-                model.fetch(statusDict)
+        with self.lock:
+            idents = set()
+            for alias in self.regAlias.keys() & statusInfo.keys():
+                idents.update(self.regAlias[alias])
+            regs = [(cbkey, self.regSelect[cbkey]) for cbkey in idents]
 
-                try:
-                    self.logger.debug("updating '%s'" % (cbkey))
-                    self.gui_do(self.error_wrap, cb_fn, statusDict)
+        for cbkey, reg in regs:
+            try:
+                self.dispatch(cbkey, reg, statusInfo)
 
-                except Exception as e:
-                    self.logger.error("Error making callback to '%s': %s" % (
-                        cbkey, str(e)), exc_info=True)
+            except Exception as e:
+                self.logger.error("Error making callback to '%s': %s" % (
+                    cbkey, str(e)), exc_info=True)
 
         end_time = time.time()
         elapsed = end_time - start_time
@@ -135,9 +163,175 @@ class Controller(Callback.Callbacks):
             self.logger.warn("Elapsed update time exceeded limit by %.2f sec" % (
                 diff))
 
-    def register_select(self, ident, cb_fn, aliases):
+    def dispatch(self, cbkey, reg, statusInfo):
+        """Queue a callback for registration (reg) under key (cbkey),
+        for a status update (statusInfo) that touches its aliases.
+        """
+        if reg.delta:
+            # only the aliases that changed since the last delivery
+            with self.lock:
+                statusDict = {alias: statusInfo[alias]
+                              for alias in reg.aliases & statusInfo.keys()
+                              if reg.last.get(alias, reg) != statusInfo[alias]}
+                if len(statusDict) == 0:
+                    return
+                reg.last.update(statusDict)
+        else:
+            statusDict = {}.fromkeys(reg.aliases)
+            self.model.fetch(statusDict)
+        reg.stats.add_fetched(len(statusDict))
+
+        if reg.max_hz is not None:
+            with self.lock:
+                # hold back and merge until the interval is up
+                reg.held.update(statusDict)
+                if reg.timer.is_set():
+                    # a trailing flush will deliver it
+                    return
+                wait = reg.last_time + 1.0 / reg.max_hz - time.time()
+                if wait > 0:
+                    reg.timer.set(wait)
+                    return
+                statusDict, reg.held = reg.held, {}
+                reg.last_time = time.time()
+
+        self.queue_callback(cbkey, reg, statusDict)
+
+    def flush_held(self, timer, cbkey, reg):
+        """Called from a timer to deliver the status held back for
+        rate-limited registration (reg) under key (cbkey).
+        """
+        with self.lock:
+            statusDict, reg.held = reg.held, {}
+            reg.last_time = time.time()
+        if len(statusDict) > 0:
+            self.queue_callback(cbkey, reg, statusDict)
+
+    def queue_callback(self, cbkey, reg, statusDict):
+        if self.coalesce_updates:
+            with self.lock:
+                pending = self.regPending.get(cbkey, None)
+                if pending is not None:
+                    # callback is still waiting in the queue;
+                    # merge the latest values into it
+                    pending.update(statusDict)
+                    self.num_merged += 1
+                    return
+                self.regPending[cbkey] = statusDict
+                reg.queued_time = time.time()
+
+            self.logger.debug("updating '%s'" % (cbkey))
+            self.gui_do(self.deliver_pending, cbkey, reg)
+            return
+
+        self.logger.debug("updating '%s'" % (cbkey))
+        self.gui_do(self.deliver, reg, statusDict, time.time())
+
+    def deliver(self, reg, statusDict, queued_time=None):
+        """Called in the GUI thread to make the callback for registration
+        (reg) with status (statusDict).  (queued_time) is when it was
+        queued for the GUI thread.
+        """
+        stats = reg.stats
+        start_time = time.time()
+        if queued_time is not None:
+            stats.add_lag(start_time - queued_time, start_time)
+
+        if reg.delta:
+            self.error_wrap(reg.cb_fn, statusDict, self.model.get_snapshot())
+        else:
+            self.error_wrap(reg.cb_fn, statusDict)
+
+        end_time = time.time()
+        stats.add_callback(end_time - start_time, end_time)
+
+    def deliver_pending(self, cbkey, reg):
+        """Called in the GUI thread to deliver the (possibly merged)
+        pending status for registration (reg) under key (cbkey).
+        """
+        with self.lock:
+            if self.regSelect.get(cbkey, None) is not reg:
+                # re-registered since this was queued; the status that
+                # was pending for the old registration has been dropped
+                return
+            statusDict = self.regPending.pop(cbkey, None)
+            queued_time = reg.queued_time
+        if statusDict is None:
+            return
+        self.deliver(reg, statusDict, queued_time)
+
+    def get_update_stats(self):
+        """Returns a dict of metrics about status delivery to the GUI."""
+        with self.lock:
+            return dict(queue_depth=self.gui_queue.qsize(),
+                        pending=len(self.regPending),
+                        merged=self.num_merged)
+
+    def get_plugin_stats(self):
+        """Returns a dict of callback statistics for each registration:
+        number of callbacks and aliases fetched, and summaries of the
+        rolling histograms of time spent in the callback and of the lag
+        from being queued to running in the GUI thread.
+        """
+        # the stats are read under their own locks, so this does not
+        # wait on the GUI thread
+        with self.lock:
+            items = list(self.regStats.items())
+        return {ident: stats.get_stats() for ident, stats in items}
+
+    def register_select(self, ident, cb_fn, aliases, delta=False,
+                        max_hz=None):
+        """Register callback (cb_fn) under key (ident) to be called when
+        any of (aliases) change.
+
+        Normally (cb_fn) is called with a dict of the current values of
+        all of (aliases).  If (delta) is True it is instead called with
+        a dict of only the aliases whose values changed since the last
+        callback, plus a read-only view of the whole status cache, and
+        is not called at all if nothing changed.
+
+        If (max_hz) is given, (cb_fn) is called at most that many times
+        per second; updates in between are merged and delivered with the
+        latest values at the end of the interval.
+        """
         aliases = set(aliases)
-        self.regSelect[ident] = (aliases, cb_fn)
+        reg = Bunch.Bunch(aliases=aliases, cb_fn=cb_fn, delta=delta,
+                          last={}, max_hz=max_hz, held={}, last_time=0.0,
+                          timer=None, queued_time=None)
+        if max_hz is not None:
+            reg.timer = self.tmr_factory.timer()
+            reg.timer.set_callback('expired', self.flush_held, ident, reg)
+
+        with self.lock:
+            if ident in self.regSelect:
+                # re-registration (e.g. instrument changed): drop the
+                # old aliases from the index before adding the new ones
+                old_reg = self.regSelect[ident]
+                if old_reg.timer is not None:
+                    old_reg.timer.stop()
+                # status merged for the old registration is dropped; the
+                # new one is caught up below or by the next update
+                self.regPending.pop(ident, None)
+                old_aliases = old_reg.aliases
+                for alias in old_aliases - aliases:
+                    idents = self.regAlias[alias]
+                    idents.discard(ident)
+                    if len(idents) == 0:
+                        del self.regAlias[alias]
+
+            self.regSelect[ident] = reg
+            reg.stats = self.regStats.setdefault(ident, CallbackStats())
+            for alias in aliases:
+                self.regAlias.setdefault(alias, set()).add(ident)
+
+        if delta:
+            # a delta callback only hears about changes, so start it off
+            # with whatever values we already have
+            snapshot = self.model.get_snapshot()
+            statusInfo = {alias: snapshot[alias] for alias in aliases
+                          if alias in snapshot}
+            if len(statusInfo) > 0:
+                self.dispatch(ident, reg, statusInfo)
 
         need_aliases = self.model.calc_missing_aliases(aliases)
         self.nongui_do(self.fetch_missing_aliases, aliases)
@@ -185,6 +379,7 @@ class Controller(Callback.Callbacks):
         future = Future.Future()
         future.freeze(method, *args, **kwdargs)
         self.gui_queue.put(future)
+        self.wakeup()
 
         my_id = thread.get_ident()
         if my_id != self.gui_thread_id:
@@ -200,8 +395,80 @@ class Controller(Callback.Callbacks):
 
     def gui_do_future(self, future):
         self.gui_queue.put(future)
+        self.wakeup()
         return future
 
+    def gui_do_priority(self, priority, method, *args, **kwdargs):
+        """Like gui_do(), but the future is run ahead of those queued by
+        gui_do(), lowest (priority) first.
+        """
+        future = Future.Future(priority=priority)
+        future.freeze(method, *args, **kwdargs)
+        self.priority_gui_queue.put(future)
+        self.wakeup()
+
+        my_id = thread.get_ident()
+        if my_id != self.gui_thread_id:
+            return future
+
+    def gui_do_oneshot(self, catname, method, *args, **kwdargs):
+        """Like gui_do(), but only the latest call queued under category
+        (catname) is run.
+        """
+        deq = self.oneshots.get(catname, None)
+        if deq is None:
+            deq = self.oneshots.setdefault(catname, deque([], 1))
+
+        future = Future.Future()
+        future.freeze(method, *args, **kwdargs)
+        deq.append(future)
+        self.wakeup()
+
+        my_id = thread.get_ident()
+        if my_id != self.gui_thread_id:
+            return future
+
+    def wakeup(self):
+        """Wake up the GUI thread to process the GUI queues.  Only one wakeup
+        is outstanding at a time; it drains everything queued up to the
+        point where it runs.
+        """
+        if self.wakeup_fn is not None and not self.wakeup_pending:
+            self.wakeup_pending = True
+            self.wakeup_fn()
+
+    def process_gui_queue(self):
+        """Called in the GUI thread's event loop after a wakeup."""
+        # clear this first, so that anything queued after this point
+        # triggers another wakeup
+        self.wakeup_pending = False
+        if self.ev_quit.is_set():
+            self.stop_event_loop()
+            return
+
+        # same order as GwMain.update_pending(): the priority futures,
+        # then the plain ones, then the latest of each one-shot
+        time_start = time.time()
+        for gui_queue in (self.priority_gui_queue, self.gui_queue):
+            while time.time() - time_start < self.gui_slice:
+                try:
+                    future = gui_queue.get(block=False)
+                except Queue.Empty:
+                    break
+                self._execute_future(future)
+
+        for deq in list(self.oneshots.values()):
+            try:
+                future = deq.pop()
+            except IndexError:
+                continue
+            self._execute_future(future)
+
+        if not (self.priority_gui_queue.empty() and self.gui_queue.empty()):
+            # ran out of time; let the toolkit handle its own events and
+            # then come back for the rest
+            self.wakeup()
+
     def nongui_do(self, method, *args, **kwdargs):
         task = Task.FuncTask(method, args, kwdargs, logger=self.logger)
         return self.nongui_do_task(task)
@@ -245,11 +512,31 @@ class Controller(Callback.Callbacks):
                 errmsg += tb_str
                 self.logger.error(errmsg)
 
-    def mainloop(self, timeout=0.001):
+    def mainloop(self, timeout=None):
+        """Run the GUI until ev_quit is set.  If (timeout) is None and
+        the toolkit supports it, the GUI thread sleeps in the toolkit's
+        own event loop and is woken up when work is added to gui_queue.
+        Otherwise gui_queue is polled every (timeout) seconds.
+        """
         # Mark our thread id
         self.gui_thread_id = thread.get_ident()
 
-        while not self.ev_quit.is_set():
-            self.update_pending(timeout=timeout)
+        if timeout is None:
+            self.wakeup_fn = self.make_wakeup(self.process_gui_queue)
+
+        if self.wakeup_fn is None:
+            if timeout is None:
+                timeout = 0.001
+            while not self.ev_quit.is_set():
+                self.update_pending(timeout=timeout)
+            return
+
+        self.logger.debug("running event-driven main loop")
+        # pick up anything that was queued before we got here
+        self.wakeup()
+        try:
+            self.run_event_loop()
+        finally:
+            self.wakeup_fn = None
 
 # END
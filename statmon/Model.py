@@ -3,14 +3,18 @@
 #
 # E. Jeschke
 #
+import time
 import threading
 import queue as Queue
+from types import MappingProxyType
 
 from g2base.remoteObjects import Monitor
 from ginga.misc import Callback
 
 from g2cam.status.common import STATNONE as statNone
 
+from statmon.util.history import StatusHistory
+
 class StatusModel(Callback.Callbacks):
 
     def __init__(self, logger):
@@ -18,10 +22,17 @@ class StatusModel(Callback.Callbacks):
 
         self.logger = logger
 
+        # Serializes writers only; readers never take this lock
         self.lock = threading.RLock()
-        # This is where we store all incoming status
+        # This is where we store all incoming status.  It is copy-on-write:
+        # store() builds a new dict and swaps the reference, so a reader
+        # that grabs self.statusDict always sees a consistent snapshot.
         self.statusDict = {}
 
+        # Optional history of (time, value) points for subscribed aliases,
+        # shared by all plugins
+        self.history = StatusHistory(logger, lock=self.lock)
+
         # Set of channels that we will subscribe to
         self.channels = set()
 
@@ -30,24 +41,61 @@ class StatusModel(Callback.Callbacks):
             self.enable_callback(name)
 
     def store(self, statusInfo):
+        """Store (statusInfo) in the status cache.  Each call copies the
+        whole cache, so a stream of updates should be stored a batch at
+        a time with store_batch().
+        """
+        self.store_batch([statusInfo])
+
+    def store_batch(self, batch):
+        """Store the updates in (batch), a list of status dicts, in
+        order, with a single copy of the cache.  The history gets the
+        values of each update.
+        """
         with self.lock:
-            self.statusDict.update(statusInfo)
-
-    def update_statusInfo(self, statusInfo):
-        self.store(statusInfo)
+            statusDict = dict(self.statusDict)
+            for statusInfo in batch:
+                statusDict.update(statusInfo)
+                self.history.append(statusInfo, statusDict)
+            self.statusDict = statusDict
+
+    def update_statusInfo(self, statusInfo, batch=None):
+        """Store (statusInfo) and call back the plugins.  (batch), if
+        given, is the list of updates (statusInfo) was merged from.
+        """
+        self.store_batch([statusInfo] if batch is None else batch)
         self.make_callback('status-arrived', statusInfo)
 
+    def get_snapshot(self):
+        """Returns a read-only view of the current status cache."""
+        return MappingProxyType(self.statusDict)
+
     def fetch(self, fetchDict):
+        statusDict = self.statusDict
+        for key in fetchDict.keys():
+            fetchDict[key] = statusDict.get(key, statNone)
+
+    def subscribe_history(self, aliases, num_pts, time_alias=None,
+                          compact=False):
+        """Keep a history of the last (num_pts) float values of each
+        alias in (aliases), timestamped with the value of (time_alias)
+        (or the arrival time, if None).  If (compact) is True the values
+        may be kept as float32.
+        """
         with self.lock:
-            for key in fetchDict.keys():
-                fetchDict[key] = self.statusDict.get(key, statNone)
+            self.history.subscribe(aliases, num_pts, time_alias=time_alias,
+                                   compact=compact)
+
+    def get_history(self, alias):
+        """Returns the history points of (alias): a (zero-copy) view, or
+        a copy if the values are kept compact."""
+        return self.history.get_points(alias)
 
     def calc_missing_aliases(self, aliasset):
-        with self.lock:
-            aliases = self.statusDict.keys()
+        aliases = self.statusDict.keys()
 
         # Figure out the set of aliases we don't yet have
-        need_aliases = aliasset.difference(set(aliases))
+        need_aliases = aliasset.difference(aliases)
         return need_aliases
 
     def update_channel_list(self, channels):
@@ -73,19 +121,53 @@ class StatusModel(Callback.Callbacks):
         else:
             self.make_callback('channel-arrived', bnch.path, bnch.value)
 
-    def consume_stream(self, ev_quit, status_q):
-        # consume and ingest the status stream
+    def consume_stream(self, ev_quit, status_q, batch_size=1,
+                       batch_time=0.0):
+        """Consume and ingest the status stream.  If (batch_size) is
+        greater than 1, all envelopes already waiting on (status_q) are
+        merged in arrival order (up to (batch_size) envelopes or
+        (batch_time) seconds) and ingested as a single update.
+        """
         while not ev_quit.is_set():
             try:
                 envelope = status_q.get(block=True, timeout=1.0)
                 status_dict = envelope['status']
                 #print(status_dict)
 
+                batch = None
+                if batch_size > 1:
+                    status_dict, batch = self.drain_stream(
+                        status_q, status_dict, batch_size, batch_time)
+
                 #self.logger.debug("received values '%s'" % str(status_dict))
-                self.update_statusInfo(status_dict)
+                # the cache is copied once for the whole batch
+                self.update_statusInfo(status_dict, batch=batch)
 
             except Queue.Empty:
                 continue
 
             except Exception as e:
                 self.logger.error("Error processing status: {}".format(e))
+
+    def drain_stream(self, status_q, status_dict, batch_size, batch_time):
+        # merge whatever else is waiting on the queue into one delta;
+        # later envelopes overwrite earlier ones for the same alias.
+        # Returns the delta and the list of updates it was merged from
+        batch = [status_dict]
+        status_dict = dict(status_dict)
+        count = 1
+        time_limit = time.time() + batch_time
+        while count < batch_size:
+            try:
+                envelope = status_q.get(block=False)
+
+            except Queue.Empty:
+                break
+
+            batch.append(envelope['status'])
+            status_dict.update(envelope['status'])
+            count += 1
+            if time.time() >= time_limit:
+                break
+
+        return status_dict, batch
@@ -8,6 +8,7 @@ import sys, os
 import traceback
 
 # GUI imports
+from ginga import toolkit
 from ginga.gw import Widgets, Desktop, GwMain
 from ginga.misc import Bunch
 
@@ -242,6 +243,48 @@ class Viewer(GwMain.GwMain, Widgets.Application):
             coords = map(int, coords)
             self.setPos(*coords)
 
+    def make_wakeup(self, callback):
+        """Returns a function that can be called from any thread to have
+        (callback) run in the GUI thread's event loop, or None if we don't
+        know how to do that for this toolkit.
+        """
+        family = toolkit.get_family()
+        if family == 'qt':
+            from ginga.qtw.QtHelp import QtCore
+
+            class Wakeup(QtCore.QObject):
+                activated = QtCore.Signal()
+
+            # always queued, so a wakeup from the GUI thread itself does
+            # not run (callback) re-entrantly
+            wakeup = Wakeup()
+            wakeup.activated.connect(
+                callback, QtCore.Qt.ConnectionType.QueuedConnection)
+            # necessary so it doesn't get garbage collected
+            self.w.wakeup = wakeup
+            return wakeup.activated.emit
+
+        elif family == 'gtk3':
+            from gi.repository import GLib
+
+            def wakeup():
+                GLib.idle_add(callback)
+            return wakeup
+
+        return None
+
+    def run_event_loop(self):
+        """Run the toolkit's own event loop until stop_event_loop()."""
+        # NOTE: not self.mainloop(), which the Controller overrides
+        Widgets.Application.mainloop(self)
+
+    def stop_event_loop(self):
+        if toolkit.get_family() == 'gtk3':
+            from gi.repository import Gtk
+            Gtk.main_quit()
+        else:
+            self.process_end()
+
 
     ####################################################
     # CALLBACKS
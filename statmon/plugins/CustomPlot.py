@@ -3,6 +3,7 @@
 #
 
 from matplotlib.figure import Figure
+from matplotlib.transforms import Bbox
 
 from ginga.gw.Plot import PlotWidget as GingaPlotWidget
 from ginga.plot.PlotView import PlotViewEvent
@@ -10,8 +11,21 @@ from ginga.misc.Settings import SettingGroup
 
 
 class PlotWidget(GingaPlotWidget):
+    """Matplotlib plot widget.
 
-    def __init__(self, figure=None, logger=None):
+    With blit=True, artists added with add_dynamic_artist() are left out
+    of full redraws of the figure.  After each full redraw, which happens
+    on the first draw, on a resize and on redraw_all(), the image of the
+    figure is kept; draw() then only puts that back and draws the dynamic
+    artists on top of it.  Call redraw_all() when anything else changes.
+
+    If dynamic_bbox is set, the dynamic artists stay inside it and only
+    that part of the figure is put back and redrawn.  Texts added with
+    add_dynamic_text() must lie outside of it; they are only redrawn
+    when their text has changed.
+    """
+
+    def __init__(self, figure=None, logger=None, blit=False):
 
         settings = SettingGroup(name="customplot", logger=logger)
         if figure is None:
@@ -23,5 +37,97 @@ class PlotWidget(GingaPlotWidget):
 
         #self.set_expanding(False, False)
 
+        self.blit = blit
+        # artists drawn on top of the background by draw()
+        self.dynamic_artists = []
+        # part of the figure (display coords) that they are drawn in,
+        # or None for all of it
+        self.dynamic_bbox = None
+        # texts drawn by draw() when changed: (text, extent) last drawn
+        self.dynamic_texts = {}
+        # the figure without the dynamic artists, from the last full draw
+        self.background = None
+        self.widget.mpl_connect('draw_event', self._full_draw_cb)
+
+    def add_dynamic_artist(self, artist):
+        artist.set_animated(self.blit)
+        self.dynamic_artists.append(artist)
+
+    def add_dynamic_text(self, artist):
+        artist.set_animated(self.blit)
+        self.dynamic_texts[artist] = None
+
     def draw(self):
+        if not self.blit or self.background is None:
+            self.plot.redraw()
+            return
+
+        canvas, figure = self.widget, self.plot.get_figure()
+        bbox = self.dynamic_bbox
+        full = bbox is None
+        if full:
+            # the texts are wiped out as well
+            canvas.restore_region(self.background)
+            bbox = figure.bbox
+        else:
+            self._restore(bbox)
+        self._draw_dynamic()
+        changed = [bbox]
+
+        if full or any(shown is None or shown[0] != artist.get_text()
+                       for artist, shown in self.dynamic_texts.items()):
+            changed.extend(self._draw_texts())
+        for bbox in changed:
+            canvas.blit(bbox)
+
+    def _restore(self, bbox):
+        # put back the background under (bbox), a Bbox in display coords;
+        # in a region the rows are counted down from the top of the figure
+        height = self.plot.get_figure().bbox.height
+        x0, y0, x1, y1 = bbox.padded(1).extents
+        self.widget.restore_region(self.background,
+                                   bbox=(x0, height - y1, x1, height - y0),
+                                   xy=(0, 0))
+
+    def _draw_texts(self):
+        """Draw the dynamic texts over the background; returns the Bboxes
+        of the figure that have changed."""
+        canvas, figure = self.widget, self.plot.get_figure()
+        renderer = canvas.get_renderer()
+        bboxes = []
+        for artist, shown in self.dynamic_texts.items():
+            extent = artist.get_window_extent(renderer)
+            bbox = extent
+            if shown is not None:
+                # cover the old text as well
+                bbox = Bbox.union([extent, shown[1]])
+            self._restore(bbox)
+            self.dynamic_texts[artist] = (artist.get_text(), extent)
+            bboxes.append(bbox.padded(1))
+        # all of them, as putting back the old text of one may have
+        # wiped out part of another
+        for artist in self.dynamic_texts:
+            figure.draw_artist(artist)
+        return bboxes
+
+    def redraw_all(self):
+        """Redraw the whole figure, e.g. after a change of scale."""
+        self.background = None
         self.plot.redraw()
+
+    def _draw_dynamic(self):
+        figure = self.plot.get_figure()
+        for artist in self.dynamic_artists:
+            figure.draw_artist(artist)
+
+    def _full_draw_cb(self, event):
+        if not self.blit:
+            return
+        # the dynamic artists were left out; keep the figure without them
+        # and then draw them, so that they are in the image shown
+        self.background = self.widget.copy_from_bbox(
+            self.plot.get_figure().bbox)
+        self._draw_dynamic()
+        for artist in self.dynamic_texts:
+            self.dynamic_texts[artist] = None
+        self._draw_texts()
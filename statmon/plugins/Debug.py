@@ -7,6 +7,8 @@ import PlBase
 
 from ginga.gw import Widgets
 
+from statmon.util.stats import format_stats
+
 class Debug(PlBase.Plugin):
 
     def build_gui(self, container):
@@ -27,6 +29,15 @@ class Debug(PlBase.Plugin):
         self.root.add_widget(self.entry, stretch=0)
         self.entry.add_callback('activated', lambda w: self.command_cb(self.entry))
 
+        hbox = Widgets.HBox()
+        hbox.set_spacing(4)
+        btn = Widgets.Button("Plugin Stats")
+        btn.set_tooltip("Show callback statistics, slowest plugin first")
+        btn.add_callback('activated', lambda w: self.show_stats())
+        hbox.add_widget(btn, stretch=0)
+        hbox.add_widget(Widgets.Label(''), stretch=1)
+        self.root.add_widget(hbox, stretch=0)
+
     def start(self):
         pass
 
@@ -43,6 +54,10 @@ class Debug(PlBase.Plugin):
         self.controller.mm.load_module(name)
         return True
 
+    def show_stats(self):
+        stats = self.controller.get_plugin_stats()
+        self.tw.set_text(format_stats(stats))
+
     def command(self, cmdstr):
         self.logger.debug("Command is '%s'" % (cmdstr))
         # Evaluate command
@@ -96,7 +96,8 @@ class GuidingError(PlBase.Plugin):
         self.gui_up = True
 
     def start(self):
-        self.controller.register_select(str(self), self.update, aliases)
+        self.controller.register_select(str(self), self.update, aliases,
+                                        max_hz=1.0 / update_interval)
 
     def update(self, statusDict):
         cur_time = time.time()
@@ -111,11 +112,8 @@ class GuidingError(PlBase.Plugin):
                        for key in aliases if key in statusDict}
             self.stat_d.update(upd_dct)
 
-            t = time.time()
-            secs_since = t - self.update_time
-            self.logger.debug("{0:.2f} secs since last plot update".format(secs_since))
-            if secs_since >= update_interval:
-                self.update_plot()
+            # the controller limits us to one update per update_interval
+            self.update_plot()
 
         except Exception as e:
             self.logger.error("error updating from status: {}".format(e),
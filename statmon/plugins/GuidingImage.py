@@ -3,16 +3,13 @@
 #
 # E. Jeschke
 #
-import os
 import time
-import numpy as np
 
 from ginga.misc import Bunch
 from ginga.gw import Widgets
-from ginga.plot import data_source as dsp
 
 import PlBase
-from EnvMon3 import cross_connect_plots, make_plot
+from TimeSeries import TimeSeriesPlugin
 
 # For "guiding image" plugin
 ag_bright = 'TSCL.AG1Intensity'
@@ -60,26 +57,19 @@ al_error = [ag_error_x, ag_error_y,
             hsc_error_x, hsc_error_y,
             pfs_error_x, pfs_error_y]
 
-# starting dimensions of graph window (can change with window size)
-dims = (500, 200)
+al_guiding_history = [ag_bright, sv_bright,
+                      ag_seeing, sv_seeing,
+                      scag_bright, scag_seeing,
+                      shag_bright, shag_seeing,
+                      pfsag_bright, pfsag_seeing]
 
-# maximum number of data points to plot and save
-num_pts = int(24 * 60 * 60)      # 24 hours worth
 
-# interval (secs) between plot visual updates
-# NOTE: this is independent of the rate at which data is saved
-update_interval = 5.0
+class GuidingImage(TimeSeriesPlugin):
 
-# interval (secs) between dataset flush to disk
-save_interval = 10.0 * 60.0   # every 10 minutes
-
-# initialize graphs to show back this time period from current time
-show_last_time = 4.0 * 60 * 60
-
-plot_colors = ['darkviolet', 'palegreen4']
-
-
-class GuidingImage(PlBase.Plugin):
+    # plots are made by configure_plots(), for the current instrument
+    plot_table = []
+    min_size = (450, 170)
+    save_interval = None
 
     def build_gui(self, container):
         self.root = container
@@ -87,14 +77,20 @@ class GuidingImage(PlBase.Plugin):
 
         self.alias_d = {}
         self.plots = Bunch.Bunch()
-        # self.cst = None
+        self.dirty = set()
+        self.store = None
+
+        # keep the brightness and seeing history in the model, so that it
+        # is shared and survives a change of instrument.  Guiding errors
+        # are scaled before plotting, so they keep their own buffers.
+        self.load_settings()
+        self.model.subscribe_history(al_guiding_history, self.num_pts,
+                                     time_alias=self.time_alias,
+                                     compact=self.compact_history)
+        self.load_rules()
         self.update_time = time.time()
         self.save_time = time.time()
 
-        # min size for individual plots
-        self.wd = 450
-        self.ht = 170
-
         self.sub_widget = None
         self.gui_up = True
 
@@ -102,6 +98,7 @@ class GuidingImage(PlBase.Plugin):
 
         self.alias_d = {}
         self.plots = Bunch.Bunch()
+        self.dirty = set()
 
         # delete old widget
         w = self.sub_widget
@@ -150,77 +147,30 @@ class GuidingImage(PlBase.Plugin):
         w.set_margins(0, 0, 0, 0)
         w.set_spacing(2)
 
-        res = make_plot(self.alias_d, self.logger, dims,
-                        names_err, al_error, num_pts,
-                        y_acc=np.mean, title="Error")
-        res.widget.set_min_size(self.wd, self.ht)
-        w.add_widget(res.widget, stretch=1)
-        self.plots.guiding_error = res
-
-        res = make_plot(self.alias_d, self.logger, dims,
-                        names, al_bright, num_pts,
-                        y_acc=np.mean, title="Brightness")
-        res.widget.set_min_size(self.wd, self.ht)
-        w.add_widget(res.widget, stretch=1)
-        self.plots.brightness = res
-
-        res = make_plot(self.alias_d, self.logger, dims,
-                        names, al_seeing, num_pts,
-                        y_acc=np.mean, title="Seeing",
-                        warn_y=1.0)
-        res.widget.set_min_size(self.wd, self.ht)
-        w.add_widget(res.widget, stretch=1)
-        self.plots.seeing = res
-
-        cross_connect_plots(self.plots.values())
+        self.build_plots(w, [
+            dict(name='guiding_error', title="Error", names=names_err,
+                 aliases=al_error, scale=0.001),
+            dict(name='brightness', title="Brightness", names=names,
+                 aliases=al_bright),
+            dict(name='seeing', title="Seeing", names=names,
+                 aliases=al_seeing, warn_y=1.0),
+        ])
 
         self.root.add_widget(w, stretch=1)
 
-        # t = time.time()
-
-        # for alias in self.alias_d.keys():
-        #     points = self.cst[alias]
-        #     bnch = self.alias_d[alias]
-        #     bnch.dsrc.set_points(points)
-        #     dsp.update_plot_from_source(bnch.dsrc, bnch.plot,
-        #                                 update_limits=True)
-
-        #     bnch.aide.zoom_limit_x(t - show_last_time, t)
-
-        # self.update_plots()
+    def get_aliases(self):
+        return ['FITS.SBR.MAINOBCP'] + al_guiding
 
     def start(self):
-        aliases = ['FITS.SBR.MAINOBCP'] + al_guiding
-
-        home_dir = os.path.join(os.environ['HOME'], '.statmon')
-        if not os.path.isdir(home_dir):
-            os.mkdir(home_dir)
-        self.save_file = os.path.join(home_dir,
-                                      f"{self.controller.name}_{str(self)}.npy")
-        try:
-            d = np.load(self.save_file, allow_pickle=True)
-            self.cst = dict(d[()])
-        except Exception as e:
-            self.logger.error("Couldn't open persist file: {}".format(e))
-            self.cst = dict()
-
-        t = time.time()
-
-        # for alias in aliases:
-        #     # create a chest item for this alias if we don't have one
-        #     if alias not in self.cst:
-        #         self.cst[alias] = np.zeros((0, 2), dtype=float)
-
         self.obcp = 'SUKA'
         self.configure_plots(self.obcp)
 
-        self.controller.register_select(str(self), self.update, aliases)
+        # TimeSeriesPlugin.update() takes the aliases that changed and
+        # the status cache
+        self.controller.register_select(str(self), self.update,
+                                        self.get_aliases(), delta=True)
         self.controller.add_callback('change-config', self.change_config)
 
-    def stop(self):
-        #self.update_persist()
-        pass
-
     def change_config(self, controller, d):
         """This get's called if we have a change in configuration
         (e.g. instrument changed)
@@ -229,69 +179,5 @@ class GuidingImage(PlBase.Plugin):
         self.configure_plots(obcp)
         self.obcp = obcp
 
-    def update(self, statusDict):
-        #print(statusDict)
-        t = statusDict.get('GEN2.STATUS.TBLTIME.TSCL', time.time())
-        #t = statusDict.get('FITS.SBR.EPOCH', time.time())
-        self.logger.debug("status update t={}".format(t))
-
-        try:
-            for alias in self.alias_d.keys():
-
-                if alias in statusDict:
-                    val = statusDict[alias]
-                    if isinstance(val, float):
-                        if alias in al_error:
-                            val *= 0.001
-                        pt = (t, val)
-
-                        bnch = self.alias_d[alias]
-                        bnch.dsrc.add(pt)
-                        dsp.update_plot_from_source(bnch.dsrc, bnch.plot,
-                                                    update_limits=True)
-
-            t = time.time()
-            secs_since = t - self.update_time
-            self.logger.debug("{0:.2f} secs since last plot update".format(secs_since))
-            if secs_since >= update_interval:
-                self.update_plots()
-
-            # secs_since = t - self.save_time
-            # self.logger.debug("{0:.2f} secs since last persist update".format(secs_since))
-            # if t - self.save_time >= save_interval:
-            #     self.update_persist()
-
-        except Exception as e:
-            self.logger.error("error updating from status: {}".format(e),
-                              exc_info=True)
-
-    def update_plots(self):
-        t = time.time()
-        self.update_time = t
-        self.logger.debug('updating plots')
-        for plot in self.plots.values():
-            plot.aide.update_plots()
-        t1 = time.time()
-        self.logger.debug("time to update plots {0:.4f} sec".format(t1 - t))
-
-    # def update_persist(self):
-    #     t = time.time()
-    #     self.save_time = t
-    #     self.logger.debug('persisting data')
-    #     # Ugh. It seems we have to reassign the arrays into the chest
-    #     # every time, otherwise the additions to the array do not persist
-    #     # in the chest when it is flushed
-    #     # Double Ugh. Seems Chest does not have an update() method
-    #     for alias, bnch in self.alias_d.items():
-    #         self.cst[alias] = bnch.dsrc.get_points()
-
-    #     try:
-    #         np.save(self.save_file, self.cst, allow_pickle=True)
-    #     except Exception as e:
-    #         self.logger.error("Error saving array state: {}".format(e),
-    #                           exc_info=True)
-    #     t1 = time.time()
-    #     self.logger.debug("time to persist data {0:.4f} sec".format(t1 - t))
-
     def __str__(self):
         return 'guidingimage'
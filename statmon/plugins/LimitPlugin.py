@@ -1,26 +1,39 @@
 #
 # T. Inagaki
 #
-from matplotlib.figure import Figure
-from matplotlib.figure import SubplotParams
-from matplotlib.lines import Line2D
-
+# The limit bars are drawn with ginga canvas primitives (Line, Text)
+# instead of a matplotlib figure each.  Any number of bars can be
+# stacked on one canvas (LimitCanvas); each bar builds its objects once
+# and, on an update, only moves and recolors its current/commanded
+# markers, followed by a graphics-only redraw (``whence=3``).
+#
 import PlBase
-from CustomPlot import PlotWidget
 
+from ginga.gw import Viewers
+from ginga.canvas.CanvasObject import get_canvas_types
+
+# virtual drawing area of one bar (data coordinates); bars are stacked
+# top to bottom and the canvas is stretched to fill the pane
+W, H = 350.0, 100.0
+# the value axis spans this part of the width, as the figure's axes did
+X_LO, X_HI = 0.12 * W, 0.9 * W
 
-class Limit(PlotWidget):
-    """  Canvas to draw a limit """
-    def __init__(self, parent=None, title='Limit', width=5, height=5,
-                 alarm=[0,0], warn=[0,0], limit=[0,0], marker=0.0,
-                 marker_txt='', logger=None):
+# rendered width (pixels) of a text, by (text, font, fontsize); the
+# fonts are not scaled, so a string is only measured once
+text_widths = {}
 
-        sub = SubplotParams(left=0.05,  right=0.95, wspace=0, hspace=0)
-        self.fig = Figure(figsize=(width, height),  facecolor='white',
-                          subplotpars=sub)
-        super().__init__(self.fig)
 
-        self.axes = self.fig.add_subplot(111)
+class LimitBar(object):
+    """  One limit bar, drawn on the canvas of (viewer) in the band of
+    height H whose bottom is at (y0).
+    """
+    def __init__(self, viewer, y0, title='Limit', alarm=[0,0], warn=[0,0],
+                 limit=[0,0], marker=0.0, marker_txt='', logger=None):
+
+        self.viewer = viewer
+        self.canvas = viewer.get_canvas()
+        self.dc = get_canvas_types()
+        self.y0 = y0
 
         self.logger = logger
         self.title = title
@@ -32,94 +45,122 @@ class Limit(PlotWidget):
         self.warn_high = max(warn)
         self.marker = marker
         self.marker_txt = marker_txt
+        # what the current/cmd values show, as of the last update
+        self.shown = None
 
-        self.cur_color = 'green'
+        self.cur_color = '#008000'    # matplotlib's 'green'
         self.cmd_color = 'blue'
         self.warn_color = 'orange'
         self.alarm_color = 'red'
 
-        # y axis values. these are fixed values.
-        self.y_axis = [-1, 0.0,  1]
         self.center_y = 0.0
         self.init_x = 0.0  # initial value of x
 
-        # width/hight of widget
-        self.w = 350
-        self.h = 100
-        self.set_expanding(True, True)
-        self.set_min_size(None, self.h)
-        #self.set_max_size(None, self.h)
+        # text objects centered on their x (obj._cx)
+        self.centered = []
 
         self.init_figure()
 
+    def _x(self, val):
+        """ data x of value (val) """
+        span = float(self.limit_high - self.limit_low)
+        if span <= 0:
+            return (X_LO + X_HI) / 2.0
+        return X_LO + (val - self.limit_low) / span * (X_HI - X_LO)
+
+    def _y(self, y):
+        """ data y of (y) in the -1..1 range of the figure's y axis """
+        return self.y0 + 0.11 * H + (y + 1.0) / 2.0 * 0.77 * H
+
+    def _add(self, obj):
+        self.canvas.add(obj, redraw=False)
+        return obj
+
+    def _text(self, x, y, text, color, fontsize, center=True, **kwdargs):
+        obj = self.dc.Text(x, y, text='%s' % text, color=color,
+                           fontsize=fontsize, **kwdargs)
+        self._add(obj)
+        if center:
+            obj._cx = x
+            self.centered.append(obj)
+            self._recenter(obj)
+        return obj
+
+    def _recenter(self, obj):
+        """ center a text object on its x, by its rendered width """
+        try:
+            key = (obj.text, obj.font, obj.fontsize)
+            px_wd = text_widths.get(key, None)
+            if px_wd is None:
+                px_wd, _ = self.viewer.renderer.get_dimensions(obj)
+                text_widths[key] = px_wd
+            scale_x = self.viewer.get_scale_xy()[0]
+            if scale_x > 0:
+                obj.x = obj._cx - (px_wd / scale_x) / 2.0
+        except Exception:
+            pass
+
+    def recenter_all(self):
+        for obj in self.centered:
+            self._recenter(obj)
+
     def init_figure(self):
         ''' initial drawing '''
+        dc = self.dc
+        center_y = self._y(self.center_y)
 
         # position of current/cmd display
-        self.y_curoffset = 0.35
-        self.y_cmdoffset = -0.65
-
-        # current,commanded text
-        self.bbox = dict(boxstyle="round, pad=0.15",facecolor=self.cur_color, ec="none",  alpha=0.75,)
-#        center_x='%.1f' %self.center_x
-        self.cur_anno = self.axes.annotate(self.init_x,  fontsize=13, weight='bold',
-                                         xy=(self.init_x, self.center_y),
-                                         xytext=(self.init_x, self.y_curoffset),
-                                         bbox=self.bbox, color='w',
-                                         #rotation=-90,
-                                         arrowprops=dict(arrowstyle="-|>", relpos=(0.5, -0.2)),
-                                         transform=self.axes, horizontalalignment='center')
-
-        self.cmd_anno = self.axes.annotate(self.init_x,  fontsize=12, weight='bold',
-                                         xy=(self.init_x, self.center_y),
-                                         xytext=(self.init_x, self.y_cmdoffset),
-                                         bbox=dict(boxstyle="round,pad=0.15", facecolor=self.cmd_color,
-                                                   ec="none",  alpha=0.05, ),
-                                         color=self.cmd_color,
-                                         arrowprops=dict(arrowstyle="-|>", relpos=(0.5, 0)),
-                                         transform=self.axes, horizontalalignment='center')
+        self.y_curoffset = self._y(0.35)
+        self.y_cmdoffset = self._y(-0.65)
 
         # draw x-axis
-        line_kwargs = dict(alpha=0.7, ls='-', lw=1.5 , color=self.cur_color,
-                         marker='|', ms=8.0, mew=1.5, markevery=(1,10))
-
-        line_edge_kwargs = dict(alpha=0.9, ls='-', lw=2 , color=self.warn_color,
-                                marker='|', ms=20.0, mew=3, markevery=(1,1), mec=self.alarm_color)
-
-        middle = [self.warn_low,  self.marker, self.warn_high]
-        line_middle = Line2D(middle, [self.center_y]*len(middle), **line_kwargs)
-
-        right = [self.warn_high, self.limit_high]
-        line_right = Line2D(right, [self.center_y]*len(right), **line_edge_kwargs)
-
-        left = [self.warn_low, self.limit_low]
-        line_left = Line2D(left, [self.center_y]*len(left), **line_edge_kwargs)
-
-        self.axes.add_line(line_right)
-        self.axes.add_line(line_left)
-        self.axes.add_line(line_middle)
+        self._add(dc.Line(self._x(self.warn_low), center_y,
+                          self._x(self.warn_high), center_y,
+                          color=self.cur_color, linewidth=2, alpha=0.7))
+        for lo, hi in ((self.warn_high, self.limit_high),
+                       (self.warn_low, self.limit_low)):
+            self._add(dc.Line(self._x(lo), center_y, self._x(hi), center_y,
+                              color=self.warn_color, linewidth=2, alpha=0.9))
+            # limit ticks
+            self._add(dc.Line(self._x(hi), center_y - 0.1 * H,
+                              self._x(hi), center_y + 0.1 * H,
+                              color=self.alarm_color, linewidth=3,
+                              alpha=0.9))
+        # marker tick
+        self._add(dc.Line(self._x(self.marker), center_y - 0.04 * H,
+                          self._x(self.marker), center_y + 0.04 * H,
+                          color=self.cur_color, linewidth=2, alpha=0.7))
 
         # draw text
-        self.axes.text(0, 0.9, self.title, color=self.cmd_color, va='baseline', ha='left', transform=self.axes.transAxes, fontsize=11)
-        self.axes.text(0.5, 0.95, 'current',   va='baseline', ha='center',
-                       transform=self.axes.transAxes, fontsize=11)
-        self.axes.text(0.5, 0.1, 'commanded',  va='top', ha='center',
-                       transform=self.axes.transAxes, fontsize=10)
+        top = self.y0 + H
+        self._text(X_LO, top - 0.2 * H, self.title, self.cmd_color, 11,
+                   center=False)
+        self._text(W / 2.0, top - 0.12 * H, 'current', 'black', 11)
+        self._text(W / 2.0, self.y0 + 0.02 * H, 'commanded', 'black', 10)
 
         # draw labels of x-axis
         x_axis = [self.limit_low, self.marker, self.limit_high]
         x_label = [self.limit_low, self.marker_txt, self.limit_high]
 
-        for (x, label) in zip(x_axis, x_label) :
-            self.axes.text(x, -0.8,  '%s'%label, fontsize=11,  va='center', ha='center', alpha=0.7)
-        # set x,y scale.   note: added +-0.00001 in order to display a value that exceeds possitive/negative limit, otherwise, a value will disappear only when this widget is plugged into telstat
-        self.axes.set_xlim(self.limit_low-0.00001, self.limit_high+0.00001)
-        self.axes.set_ylim(min(self.y_axis), max(self.y_axis))
-        # # disable default x/y axis drawing
-        #self.axes.set_xlabel(False)
-        #self.axes.set_ylabel(False)
-        self.axes.axison = False
-        self.draw()
+        for (x, label) in zip(x_axis, x_label):
+            self._text(self._x(x), self._y(-0.8) - 0.05 * H, label,
+                       'black', 11, alpha=0.7, fillalpha=0.7)
+
+        # current,commanded value and arrows
+        x = self._x(self.init_x)
+        self.cur_arrow = self._add(dc.Line(
+            x, self.y_curoffset - 0.04 * H, x, center_y,
+            color='black', linewidth=1, arrow='end'))
+        self.cur_anno = self._text(x, self.y_curoffset, self.init_x, 'white',
+                                   13, font='Sans Serif;normal;bold',
+                                   bgcolor=self.cur_color, bgalpha=0.75,
+                                   borderpadding=2)
+        self.cmd_arrow = self._add(dc.Line(
+            x, self.y_cmdoffset + 0.16 * H, x, center_y,
+            color='black', linewidth=1, arrow='end'))
+        self.cmd_anno = self._text(x, self.y_cmdoffset, self.init_x,
+                                   self.cmd_color, 12,
+                                   font='Sans Serif;normal;bold')
 
     def get_val_state(self, val, state=None):
 
@@ -138,6 +179,9 @@ class Limit(PlotWidget):
             elif val < self.limit_low:
                 color = self.alarm_color
                 val=self.limit_low
+            elif state and state.strip() == 'Pointing':
+                # ignore alarm/warning if el in pointing
+                pass
             elif (val >= self.alarm_high or val <= self.alarm_low):
                 color = self.alarm_color
             elif (val >= self.warn_high or val <= self.warn_low):
@@ -145,40 +189,117 @@ class Limit(PlotWidget):
 
         return (text, val, color)
 
-    def update_limit(self, current , cmd, state=None):
+    def update_limit(self, current, cmd, state=None):
+        """ Update the current/cmd markers; returns True if anything
+        changed and the canvas needs a redraw.
+        """
+        self.logger.debug(f'updating current={current}, cmd={cmd} ,state={state}')
 
-        self.logger.debug('updating current={current}, cmd={cmd} ,state={state}')
-
-        # ignore alarm/warning if el in pointing
-        if state and state.strip() == 'Pointing':
-            color = self.cur_color
-
-        text, val, color = self.get_val_state(current, state)
+        cur_state = self.get_val_state(current, state)
+        cmd_state = self.get_val_state(cmd)
+        if (cur_state, cmd_state) == self.shown:
+            # nothing to redraw
+            return False
+        self.shown = (cur_state, cmd_state)
 
+        text, val, color = cur_state
         try:
-            self.cur_anno.set_text(text)
-            self.cur_anno.xy = (val, self.center_y)
-            #self.cur_anno.xytext = (val, self.y_curoffset)
-            self.cur_anno.set_x(val)
-            #self.cur_anno.set_y(self.y_curoffset)
-            self.bbox['facecolor'] = color
-            self.cur_anno.set_bbox(self.bbox)
+            x = self._x(val)
+            self.cur_anno.text = text
+            self.cur_anno._cx = x
+            self._recenter(self.cur_anno)
+            self.cur_anno.bgcolor = color
+            self.cur_arrow.x1 = self.cur_arrow.x2 = x
         except Exception as e:
             self.logger.error(f'error: setting current value. {e}')
-            pass
 
-        text, val, color = self.get_val_state(cmd)
+        text, val, color = cmd_state
         try:
-            #self.cmd_anno.xytext=(val, self.y_cmdoffset)
-            self.cmd_anno.set_text(text)
-            self.cmd_anno.xy = (val, self.center_y)
-            self.cmd_anno.set_x(val)
-            #self.cmd_anno.set_y(self.y_cmdoffset)
+            x = self._x(val)
+            self.cmd_anno.text = text
+            self.cmd_anno._cx = x
+            self._recenter(self.cmd_anno)
+            self.cmd_arrow.x1 = self.cmd_arrow.x2 = x
         except Exception as e:
             self.logger.error(f'error: setting cmd value. {e}')
-            pass
 
-        self.draw()
+        return True
+
+
+class LimitCanvas(object):
+    """  Limit bars, stacked on one ginga canvas """
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self.bars = []
+
+        self.viewer = Viewers.CanvasView(logger=logger, render='widget')
+        self.viewer.set_background('white')
+        self.viewer.set_foreground('black')
+        self.viewer.set_desired_size(int(W), int(H))
+        self.viewer.set_enter_focus(False)
+        self.viewer.add_callback('configure', self._configure_cb)
+
+        self.canvas = self.viewer.get_canvas()
+        self.gw = None
+
+    def get_widget(self):
+        if self.gw is None:
+            self.gw = Viewers.GingaViewerWidget(viewer=self.viewer)
+            self.gw.set_expanding(True, True)
+        self.gw.set_min_size(None, int(H) * max(1, len(self.bars)))
+        return self.gw
+
+    def add_bar(self, **kwdargs):
+        """ Add a bar below the others; (kwdargs) are passed to LimitBar """
+        bar = LimitBar(self.viewer, -H * (len(self.bars) + 1),
+                       logger=self.logger, **kwdargs)
+        self.bars.append(bar)
+        self.viewer.set_desired_size(int(W), int(H) * len(self.bars))
+        self._fit(*self.viewer.get_window_size())
+        return bar
+
+    def clear(self):
+        """ Remove all bars """
+        self.canvas.delete_all_objects(redraw=False)
+        self.bars = []
+
+    def _configure_cb(self, viewer, width, height):
+        self._fit(width, height)
+
+    def _fit(self, width, height):
+        if width < 2 or height < 2 or len(self.bars) == 0:
+            return
+        ht = H * len(self.bars)
+        try:
+            self.viewer.scale_to(width / W, height / ht)
+            self.viewer.set_pan(W / 2.0, -ht / 2.0)
+            for bar in self.bars:
+                bar.recenter_all()
+        except Exception as e:
+            self.logger.error("error fitting limit view: %s" % (e))
+
+    def update_limit(self, current, cmd, state=None, bar=0):
+        """ Update bar number (bar), redrawing the canvas if it changed """
+        if self.bars[bar].update_limit(current, cmd, state=state):
+            self.canvas.update_canvas(whence=3)
+
+
+class Limit(LimitCanvas):
+    """  Canvas to draw a limit
+
+    A LimitCanvas with one bar; see LimitBar for the parameters.
+    """
+    def __init__(self, logger=None, **kwdargs):
+        super().__init__(logger=logger)
+
+        self.bar = self.add_bar(**kwdargs)
+
+    def set_limit(self, **kwdargs):
+        """ Replace the bar, e.g. for the limits of another instrument """
+        self.clear()
+        self.bar = self.add_bar(**kwdargs)
+        self.canvas.update_canvas(whence=3)
 
 
 class AzLimitPlugin(PlBase.Plugin):
@@ -196,7 +317,7 @@ class AzLimitPlugin(PlBase.Plugin):
         limit = [-270.0, 270.0]
         self.limit = Limit(title=title, alarm=alarm, warn=warn,
                            limit=limit, logger=self.logger)
-        self.root.add_widget(self.limit, stretch=1)
+        self.root.add_widget(self.limit.get_widget(), stretch=1)
 
     def start(self):
         self.controller.register_select('azlimit', self.update, AzLimitPlugin.aliases)
@@ -227,7 +348,7 @@ class ElLimitPlugin(PlBase.Plugin):
         self.limit = Limit(title=title, alarm=alarm, warn=warn,
                            limit=limit, marker=marker,
                            marker_txt=marker_txt, logger=self.logger)
-        self.root.add_widget(self.limit, stretch=1)
+        self.root.add_widget(self.limit.get_widget(), stretch=1)
 
     def start(self):
         self.controller.register_select('ellimit', self.update,
@@ -287,12 +408,18 @@ class RotLimitPlugin(PlBase.Plugin):
 
         self.logger.debug('rotator-limit setlayout. obcp=%s aliases=%s  title=%s' %(obcp, self.aliases, self.title))
 
+        if self.limit_rot is not None:
+            # the bar is replaced on the same canvas
+            self.limit_rot.set_limit(title=self.title, alarm=self.alarm,
+                                     warn=self.warn, limit=self.limit)
+            return
+
         self.limit_rot = Limit(title=self.title, alarm=self.alarm,
                                warn=self.warn, limit=self.limit,
                                logger=self.logger)
 
         self.root.remove_all(delete=True)
-        self.root.add_widget(self.limit_rot, stretch=1)
+        self.root.add_widget(self.limit_rot.get_widget(), stretch=1)
 
     def change_config(self, controller, d):
 
@@ -313,6 +440,7 @@ class RotLimitPlugin(PlBase.Plugin):
         self.root.set_margins(0, 0, 0, 0)
         self.root.set_spacing(0)
         self.obcp = 'SUKA'
+        self.limit_rot = None
 
         try:
             self.set_layout(self.obcp)
@@ -361,13 +489,17 @@ class ProbeLimitPlugin(PlBase.Plugin):
 
         self.logger.debug(f"probe-limit obcp={obcp} aliases={self.aliases} title={self.title}")
 
-        width = 350
-        self.limit_probe = Limit(title=self.title,
-                                 alarm=self.alarm, warn=self.warn,
-                                 limit=self.limit, width=width,
-                                 logger=self.logger)
-        self.root.remove_all(delete=True)
-        self.root.add_widget(self.limit_probe, stretch=1)
+        if self.limit_probe is None:
+            self.limit_probe = Limit(title=self.title,
+                                     alarm=self.alarm, warn=self.warn,
+                                     limit=self.limit, logger=self.logger)
+        else:
+            # the bar is replaced on the same canvas
+            self.limit_probe.set_limit(title=self.title,
+                                       alarm=self.alarm, warn=self.warn,
+                                       limit=self.limit)
+        self.root.remove_all()
+        self.root.add_widget(self.limit_probe.get_widget(), stretch=1)
 
     def change_config(self, controller, d):
 
@@ -380,7 +512,8 @@ class ProbeLimitPlugin(PlBase.Plugin):
 
         try:
             if not (self.obcp in self.ao or self.obcp in self.popt2):
-                self.root.remove_all(delete=True)
+                # keep the bar's canvas, for when it is shown again
+                self.root.remove_all()
         except Exception as e:
             self.logger.error('error: deleting current layout. %s' %e)
         else:
@@ -404,6 +537,7 @@ class ProbeLimitPlugin(PlBase.Plugin):
         self.root = container
         self.root.set_margins(0, 0, 0, 0)
         self.root.set_spacing(0)
+        self.limit_probe = None
 
         try:
             self.obcp = 'SUKA'
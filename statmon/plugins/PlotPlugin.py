@@ -5,12 +5,13 @@
 import math
 import threading
 
+import numpy as np
 from matplotlib.figure import Figure
 from matplotlib.patches import Circle
-from matplotlib.artist import Artist
 from matplotlib.lines import Line2D
+from matplotlib.collections import EllipseCollection
+from matplotlib.colors import to_rgba
 
-from ginga.misc.Bunch import Bunch
 from ginga.gw import Widgets
 
 import PlBase
@@ -19,11 +20,25 @@ from CustomLabel import Label
 
 
 class GuidingErrorPlot(PlotWidget):
-    """ AG/SV/FMOS/AO188 Plotting """
-    def __init__(self, parent=None, center_x=0, center_y=0, logger=None):
+    """ AG/SV/FMOS/AO188 Plotting
+
+    The latest point is drawn as a circle of its own.  The points before
+    it are kept in a NumPy ring of positions and colors, and drawn as
+    one collection of small circles, whose offsets and colors are
+    replaced when a point arrives.
+
+    By default the plot is blitted (see CustomPlot.PlotWidget): only the
+    points and the arrow are redrawn for a new point, and the X/Y titles
+    if their text changed.
+    """
+
+    max_record = 500   # max number of record to draw on canvas
+
+    def __init__(self, parent=None, center_x=0, center_y=0, logger=None,
+                 blit=True):
 
         self.fig = Figure(figsize=(5, 5), dpi=None, facecolor='white')
-        super().__init__(self.fig)
+        super().__init__(self.fig, blit=blit)
 
         self.axes = self.fig.add_subplot(111)
         self.axes.set_aspect('equal')
@@ -43,9 +58,13 @@ class GuidingErrorPlot(PlotWidget):
         self.rlock = threading.RLock()
         self.logger = logger
         self.c = 0
-        self.plot_record = []
 
-        self.max_record = 500   # max number of record to draw on canvas
+        # points plotted, oldest first, with room for max_record more
+        # before the newest are moved back to the front; see add_record()
+        self.rec_xy = np.zeros((2 * self.max_record, 2))
+        self.rec_rgba = np.zeros((2 * self.max_record, 4))
+        self.rec_start = 0
+        self.rec_end = 0
 
         self.label_offset = 0.03    # offset potision of label of y-axis
         self.record_radius = 0.005  # the radius of a circle of record
@@ -157,6 +176,19 @@ class GuidingErrorPlot(PlotWidget):
                                       fontsize=14,
                                       transform=self.axes.transAxes)
 
+        # the points before the latest one
+        self.records = EllipseCollection(2 * self.record_radius,
+                                         2 * self.record_radius, 0.0,
+                                         units='xy', offsets=np.zeros((0, 2)),
+                                         offset_transform=self.axes.transData,
+                                         edgecolors='none')
+        self.axes.add_collection(self.records, autolim=False)
+        # the latest point
+        self.cur_point = Circle((self.center_x, self.center_y),
+                                0.0125 * (self.scale_index + 1),
+                                ec='none', fill=True, alpha=1, visible=False)
+        self.axes.add_patch(self.cur_point)
+
         # draw inner/outer circles
         self.inner_c = Circle((self.center_x, self.center_y), min(circle),
                               fc="None", ec="g", lw=0.5, ls='solid')
@@ -191,6 +223,14 @@ class GuidingErrorPlot(PlotWidget):
         # disable default x/y axis drawing
         self.axes.axison = False
 
+        # redrawn for every point, within the axes
+        for artist in (self.records, self.cur_point, self.arrow):
+            self.add_dynamic_artist(artist)
+        self.dynamic_bbox = self.axes.bbox
+        # above the axes; only redrawn when the text changes
+        for artist in (self.title_x, self.title_y):
+            self.add_dynamic_text(artist)
+
         self.draw()
 
     def reconfigure(self):
@@ -222,6 +262,8 @@ class GuidingErrorPlot(PlotWidget):
         #self.inner_c.set_axes([self.center_x, self.center_y])
         self.inner_c.set_radius(min(circle))
         self.outer_c.set_radius(max(circle))
+        self.records.set_widths(2 * self.record_radius)
+        self.records.set_heights(2 * self.record_radius)
 
         # re-draw labels of y-axis
         for (text, label) in zip(self.label, y_label):
@@ -239,54 +281,48 @@ class GuidingErrorPlot(PlotWidget):
         self.axes.set_xlim(min_val, max_val)
         self.axes.set_ylim(min_val, max_val)
 
-        self.draw()
+        self.redraw_all()
 
     def draw_path(self):
         ''' draw a path to a current plotting from previous one '''
         with self.rlock:
-            try:
-                cur = self.plot_record[-1]
-                pre = self.plot_record[-2]
-                self.arrow.xy = (cur.x, cur.y)
-                self.arrow.xytext = (pre.x, pre.y)
-
-            except Exception as e:
-                self.logger.warn(f'warn: drawing path. {e}')
-                pass
-
-    def redraw_point(self):
-        ''' re-draw a previous plotting to a smaller circle  '''
+            if self.rec_end - self.rec_start < 2:
+                return
+            self.arrow.xy = tuple(self.rec_xy[self.rec_end - 1])
+            self.arrow.xytext = tuple(self.rec_xy[self.rec_end - 2])
+
+    def redraw_records(self):
+        ''' re-draw the points before the latest one as small circles '''
         with self.rlock:
-            try:
-                # somehow self.plot_record[-1:] is not retrieving data, added extra[0]
-                pre = self.plot_record[-1] # extract the lastest record
-                pre.point.set_radius(self.record_radius)
-                pre.point.set_facecolor(pre.color)
-                pre.point.set_edgecolor(pre.color)
-                pre.point.set_alpha(0.75)
-            #  extracting the lastest record fails if a plotting is the first time. but it's ok
-            except Exception as e:
-                pre = None
-                self.logger.warn(f'warn: {e}')
+            start, end = self.rec_start, max(self.rec_start, self.rec_end - 1)
+            self.records.set_offsets(self.rec_xy[start:end])
+            self.records.set_facecolors(self.rec_rgba[start:end])
 
     def clear(self):
         ''' clear all plottings '''
         with self.rlock:
-            for num in list(range(len(self.plot_record))):
-                self.delete_oldest_record()
+            self.rec_start = self.rec_end = 0
+            self.cur_point.set_visible(False)
+            self.redraw_records()
             self.arrow.xy = (0, 0)
             self.arrow.xytext = (0, 0)
         self.draw()
 
-    def delete_oldest_record(self):
-        ''' delete the oldest plotting '''
-        try:
-            p = self.plot_record.pop(0)
-            Artist.remove(p.point)
-
-        except Exception as e:
-            print(e)
-            pass
+    def add_record(self, x, y, color):
+        ''' add a point to the ring, dropping the oldest past max_record '''
+        with self.rlock:
+            if self.rec_end == len(self.rec_xy):
+                # out of room: move the newest points to the front
+                n = self.max_record - 1
+                self.rec_xy[:n] = self.rec_xy[self.rec_end - n:self.rec_end]
+                self.rec_rgba[:n] = self.rec_rgba[self.rec_end - n:self.rec_end]
+                self.rec_start, self.rec_end = 0, n
+
+            self.rec_xy[self.rec_end] = (x, y)
+            self.rec_rgba[self.rec_end] = to_rgba(color, alpha=0.75)
+            self.rec_end += 1
+            if self.rec_end - self.rec_start > self.max_record:
+                self.rec_start += 1
 
     def update_plot(self, x , y):
         ''' update plotting '''
@@ -299,48 +335,48 @@ class GuidingErrorPlot(PlotWidget):
             self.logger.warn(f'warn: x, y are not digits. {e}')
             return
 
-        self.redraw_point()
-
         self.plot_point(x,y)
 
         self.draw_path()
 
-        with self.rlock:
-            plot_points = len(self.plot_record)
-            if plot_points > self.max_record:
-                self.delete_oldest_record()
-
         self.title_x.set_text('X:%02.2f' % (x))
         self.title_y.set_text('Y:%02.2f' % (y))
         #self.axes.set_title('x=%0.2f, y=%0.2f' %(x,y))
 
         self.draw()
 
-    def plot_point(self, x , y, ):
-        ''' plotting '''
-
-        self.c += 1
-
+    def get_colors(self, x, y):
+        ''' colors of a point: when it is the latest, and afterwards '''
         alarm = max(self.circle[self.scale_index])
 
-        circle = Circle(xy=(x,y), radius=0.0125*(self.scale_index+1), \
-                      ec="none", fill=True, alpha=1)
         if (x > alarm or x < -alarm) or (y > alarm or y < -alarm):
-            circle.set_facecolor(self.alarm_color)
-            color = self.alarm_color
-        else:
-            circle.set_facecolor(self.plot_color)
-            color = self.record_color
+            return (self.alarm_color, self.alarm_color)
+        return (self.plot_color, self.record_color)
 
-        self.axes.add_patch(circle)
+    def get_radius(self):
+        ''' radius of the latest point '''
+        return 0.0125 * (self.scale_index + 1)
 
-        plot = Bunch(point=circle, x=x, y=y, color=color)
+    def plot_point(self, x, y):
+        ''' plotting '''
+
+        self.c += 1
+
+        color, record_color = self.get_colors(x, y)
 
         with self.rlock:
-            self.plot_record.append(plot)
+            self.add_record(x, y, record_color)
+            self.cur_point.set_center((x, y))
+            self.cur_point.set_radius(self.get_radius())
+            self.cur_point.set_facecolor(color)
+            self.cur_point.set_visible(True)
+            self.redraw_records()
 
 
 class Ao1Plot(GuidingErrorPlot):
+
+    max_record = 100
+
     def __init__(self, parent=None, logger=None):
         GuidingErrorPlot.__init__(self, parent=parent, logger=logger)
 
@@ -349,7 +385,6 @@ class Ao1Plot(GuidingErrorPlot):
 
         self.plot_radius = 0.45
         self.record_radius = 0.1
-        self.max_record = 100
         self.alarm = 9.0
         self.warn = 6.0
         self.record_color = 'grey'
@@ -372,35 +407,23 @@ class Ao1Plot(GuidingErrorPlot):
 
         self.reconfigure()
 
-    def plot_point(self, x, y):
-        self.logger.debug('ao1 plotting')
-
+    def get_colors(self, x, y):
         if (x >= self.alarm or x <= -self.alarm) or \
            (y >= self.alarm or y <= -self.alarm):
-            circle = Circle(xy=(x,y), radius=self.plot_radius,
-                                fc=self.alarm_color, ec='none', fill=True, alpha=1)
-            color = self.alarm_color
+            return (self.alarm_color, self.alarm_color)
         elif (self.warn <= x or x <= -self.warn) or \
              (self.warn <= y  or y <= -self.warn):
-            circle = Circle(xy=(x,y), radius=self.plot_radius,
-                            fc=self.warn_color, ec='none', fill=True, alpha=1)
-            color = self.warn_color
-        else:
-            circle = Circle(xy=(x,y), radius=self.plot_radius,
-                          fc=self.plot_color, ec='none', fill=True, alpha=1)
-            color = self.record_color
+            return (self.warn_color, self.warn_color)
+        return (self.plot_color, self.record_color)
 
-        self.axes.add_patch(circle)
+    def get_radius(self):
+        return self.plot_radius
 
-        plot = Bunch(point=circle, x=x, y=y, color=color)
 
-        with self.rlock:
-            self.plot_record.append(plot)
-
-        return plot
+class Ao2Plot(GuidingErrorPlot):
 
+    max_record = 100
 
-class Ao2Plot(GuidingErrorPlot):
     def __init__(self, parent=None, logger=None):
 
         GuidingErrorPlot.__init__(self, parent=parent,
@@ -415,7 +438,6 @@ class Ao2Plot(GuidingErrorPlot):
         self.alarm_low = 2.0
         self.alarm_high = 8.0
 
-        self.max_record = 100
         self.record_color = 'grey'
         #self.alarm = self.warn = 3.0  # no warning. so set warn as alarm
 
@@ -438,27 +460,14 @@ class Ao2Plot(GuidingErrorPlot):
         self.reconfigure()
 
 
-    def plot_point(self, x, y):
+    def get_colors(self, x, y):
         if (x >= self.alarm_high or x <= self.alarm_low) or \
            (y >= self.alarm_high or y <= self.alarm_low):
-            circle = Circle(xy=(x,y), radius=self.plot_radius,
-                            fc = self.alarm_color, ec="none",
-                            fill=True, alpha=1)
-            color = self.alarm_color
-        else:
-            circle = Circle(xy=(x,y), radius=self.plot_radius,
-                            fc = self.plot_color, ec="none",
-                            fill=True, alpha=1)
-            color = self.record_color
-
-        self.axes.add_patch(circle)
-
-        plot = Bunch(point=circle, x=x, y=y, color=color)
-
-        with self.rlock:
-            self.plot_record.append(plot)
+            return (self.alarm_color, self.alarm_color)
+        return (self.plot_color, self.record_color)
 
-        return plot
+    def get_radius(self):
+        return self.plot_radius
 
 
 class Buttons(Widgets.HBox):
@@ -10,7 +10,9 @@
 # primitives (Text, Box, Rectangle, Circle, dashed Line, filled
 # Polygon).  Objects are built once and, on each status update, we
 # mutate them in place and redraw with ``whence=3`` (a graphics-only
-# partial redraw) so updates are smooth and flicker-free.
+# partial redraw) so updates are smooth and flicker-free.  Each part is
+# only updated when its status values change, and the canvas is only
+# redrawn when an object did.
 #
 import math
 
@@ -35,26 +37,45 @@ def yflip(py):
     return H - py
 
 
+# points of the unit circle every ANGLE_STEP degrees, computed once;
+# arcs take their points from it instead of calling cos/sin each time
+ANGLE_STEP = 0.1
+UNIT_CIRCLE = np.column_stack((
+    np.cos(np.radians(np.arange(0.0, 360.0, ANGLE_STEP))),
+    np.sin(np.radians(np.arange(0.0, 360.0, ANGLE_STEP)))))
+
+
+def unit_arc(a0, a1, n=28):
+    """(n, 2) array of points along the unit circle from a0..a1 degrees,
+    to the nearest ANGLE_STEP."""
+    idx = np.rint(np.linspace(a0, a1, n) / ANGLE_STEP).astype(int)
+    return UNIT_CIRCLE[idx % len(UNIT_CIRCLE)]
+
+
 def arc_pts(cx, cy, radius, a0, a1, n=28):
     """Sample points along an arc from a0..a1 degrees (math convention:
-    0 = +x/east, CCW positive), returned in y-up data coordinates.
+    0 = +x/east, CCW positive), returned in y-up data coordinates as an
+    (n, 2) array.
     """
-    angs = np.radians(np.linspace(a0, a1, n))
-    return [(cx + radius * math.cos(a), cy + radius * math.sin(a))
-            for a in angs]
+    return unit_arc(a0, a1, n) * radius + (cx, cy)
 
 
 def annulus_sector(cx, cy, r_in, r_out, a0, a1, n=28):
     """Filled annulus-sector polygon points (outer arc + inner arc back)."""
-    outer = arc_pts(cx, cy, r_out, a0, a1, n)
-    inner = arc_pts(cx, cy, r_in, a1, a0, n)
-    return outer + inner
+    unit = unit_arc(a0, a1, n)
+    return np.concatenate((unit * r_out, unit[::-1] * r_in)) + (cx, cy)
 
 
 def dome_cap(cx, cy, rx, ry, n=28):
     """Lower-half ellipse (flat top, bulging down) used for mirror covers."""
-    angs = np.radians(np.linspace(0.0, 180.0, n))
-    return [(cx + rx * math.cos(a), cy - ry * math.sin(a)) for a in angs]
+    return unit_arc(0.0, 180.0, n) * (rx, -ry) + (cx, cy)
+
+
+def rotate_pts(pts, ang, cx, cy):
+    """Rotate (N, 2) points (pts) by (ang) radians about the origin and
+    move them to (cx, cy)."""
+    c, s = math.cos(ang), math.sin(ang)
+    return np.dot(pts, ((c, s), (-s, c))) + (cx, cy)
 
 
 class TelescopeCanvas(object):
@@ -92,6 +113,10 @@ class TelescopeCanvas(object):
 
         # references to dynamic objects, keyed by role
         self.o = {}
+        # status values each part was last updated with, keyed by part
+        self.last = {}
+        # set when an object changes; cleared for each status update
+        self.changed = False
         # centered text objects (recentered by measuring rendered width)
         self._centered = []
         # bookkeeping for the top-screen rear bar (as in the original)
@@ -118,6 +143,8 @@ class TelescopeCanvas(object):
             viewer.scale_to(scale, scale)
             viewer.set_pan(W / 2.0, H / 2.0)
             self._recenter_all()
+            # redo every part with the next status, at the new size
+            self.invalidate()
         except Exception as e:
             self.logger.error("error fitting telescope view: %s" % (e))
 
@@ -160,20 +187,31 @@ class TelescopeCanvas(object):
         for obj in self._centered:
             self._recenter(obj)
 
+    def _set(self, obj, **attrs):
+        """Set attributes of a canvas object, noting any change."""
+        for name, value in attrs.items():
+            if getattr(obj, name, None) != value:
+                setattr(obj, name, value)
+                self.changed = True
+
+    def _set_points(self, obj, points):
+        obj.set_data_points(points)
+        self.changed = True
+
     def _set_text(self, obj, text=None, color=None):
-        if text is not None:
+        if text is not None and text != obj.text:
             obj.text = text
+            self.changed = True
             if getattr(obj, '_cx', None) is not None:
                 self._recenter(obj)
         if color is not None:
-            obj.color = color
-            obj.fillcolor = color
+            self._set(obj, color=color, fillcolor=color)
 
     def _set_visible(self, obj, tf):
         a = 1.0 if tf else 0.0
-        obj.alpha = a
+        self._set(obj, alpha=a)
         if hasattr(obj, 'fillalpha'):
-            obj.fillalpha = a
+            self._set(obj, fillalpha=a)
 
     # -- build all objects once ---------------------------------------
 
@@ -214,6 +252,7 @@ class TelescopeCanvas(object):
         self.R = 115.0
         self.R_in = 58.0
         self.subaru_r = 26.0
+        self.subaru_shape = self._subaru_shape()
 
         # elevation annulus sector (built first so rings draw over it)
         self.o['el_wedge'] = self._add(dc.Polygon(
@@ -221,6 +260,9 @@ class TelescopeCanvas(object):
             color=self.c_green, fill=True, fillcolor=self.c_green,
             alpha=0.5, fillalpha=0.5, linewidth=0))
         # wind wedge (narrow isosceles triangle poking in from the outer ring)
+        # pointing along +x; the tip x is set by the wind speed
+        self.wind_shape = np.array(((self.R - 42.0, 0.0), (self.R, 11.0),
+                                    (self.R, -11.0)))
         self.o['wind'] = self._add(dc.Polygon(
             [(cx, cy + self.R - 42), (cx - 11, cy + self.R),
              (cx + 11, cy + self.R)],
@@ -312,26 +354,28 @@ class TelescopeCanvas(object):
             for obj in self.o[key]:
                 self._set_visible(obj, False)
 
-    def _subaru_tri_pts(self, az):
-        """Triangle pointing in the telescope azimuth direction, with its
+    def _subaru_shape(self):
+        """Triangle pointing along +x from the compass center, with its
         base sitting on the outer edge of the blue center circle and the tip
         reaching out toward the inner ring (as in the original).
-
-        NOTE: Subaru measures azimuth from South (S=0, W=90), so az 0
-        points at the bottom of the compass and az 90 at the left -- not
-        the compass-bearing convention.
         """
-        cx, cy = self.compass_c
-        a = math.radians(az)
-        ux, uy = -math.sin(a), -math.cos(a)    # unit pointing vector, S=0
         r0 = self.subaru_r                     # base rides the center circle
         r1 = self.R_in - 4.0                   # tip stops just inside the ring
         ba = math.radians(42.0)                # half-angle subtended by base
         ca, sa = math.cos(ba), math.sin(ba)
-        b1 = (cx + r0 * (ux * ca - uy * sa), cy + r0 * (ux * sa + uy * ca))
-        b2 = (cx + r0 * (ux * ca + uy * sa), cy + r0 * (-ux * sa + uy * ca))
-        tip = (cx + r1 * ux, cy + r1 * uy)
-        return [tip, b1, b2]
+        return np.array(((r1, 0.0), (r0 * ca, r0 * sa), (r0 * ca, -r0 * sa)))
+
+    def _subaru_tri_pts(self, az):
+        """The triangle of _subaru_shape(), pointing in the telescope
+        azimuth direction.
+
+        NOTE: Subaru measures azimuth from South (S=0, W=90), so az 0
+        points at the bottom of the compass and az 90 at the left -- not
+        the compass-bearing convention.
+        """
+        # unit pointing vector, S=0: (-sin(az), -cos(az))
+        ang = -(math.pi / 2.0 + math.radians(az))
+        return rotate_pts(self.subaru_shape, ang, *self.compass_c)
 
     # ================================================================
     # update handlers (state -> object mutation).  Decode logic is kept
@@ -350,7 +394,7 @@ class TelescopeCanvas(object):
             text, bg, fg = 'Dome Shutter Partial', self.c_warn, self.c_white
         else:
             text, bg, fg = 'Dome Shutter Undefined', self.c_alarm, self.c_white
-        self.o['dome_bar'].fillcolor = bg
+        self._set(self.o['dome_bar'], fillcolor=bg)
         self._set_text(self.o['dome_txt'], text=text, color=fg)
 
     def update_topscreen(self, mode, front, rear):
@@ -393,7 +437,7 @@ class TelescopeCanvas(object):
         shift = CX - (lo + hi) / 2.0     # center the group on CX
         for key, x0 in rel.items():
             obj = self.o[key]
-            obj.x1, obj.x2 = x0 + shift, x0 + shift + length
+            self._set(obj, x1=x0 + shift, x2=x0 + shift + length)
 
     def update_windscreen(self, drv, windscreen, cmd, pos, el):
         color = self.c_normal
@@ -433,11 +477,10 @@ class TelescopeCanvas(object):
                            color=color)
 
         bar = self.o['ws_bar']
-        bar.color = color
-        bar.fillcolor = color
+        self._set(bar, color=color, fillcolor=color)
         if pos not in ERROR:
             try:
-                bar.y2 = self.ws_base + float(pos) * 8.0
+                self._set(bar, y2=self.ws_base + float(pos) * 8.0)
             except Exception:
                 pass
 
@@ -483,24 +526,26 @@ class TelescopeCanvas(object):
             a0 = 180.0 - float(el)
             pts = annulus_sector(cx, cy, self.R_in, self.R, a0, 180.0)
             wedge = self.o['el_wedge']
-            wedge.set_data_points(pts)
-            wedge.color = color
-            wedge.fillcolor = color
+            self._set_points(wedge, pts)
             # keep the fill semi-transparent (~0.5) rather than fully opaque
-            wedge.alpha = wedge.fillalpha = (0.5 if el > 0.5 else 0.0)
+            alpha = 0.5 if el > 0.5 else 0.0
+            self._set(wedge, color=color, fillcolor=color, alpha=alpha,
+                      fillalpha=alpha)
         except Exception as e:
             self.logger.error('error: elevation. %s' % (e))
 
         # subaru azimuth marker
         try:
-            self.o['subaru_tri'].set_data_points(self._subaru_tri_pts(float(az)))
+            self._set_points(self.o['subaru_tri'],
+                             self._subaru_tri_pts(float(az)))
         except Exception as e:
             self.logger.error('error: azimuth. %s' % (e))
 
         # light path along elevation
         try:
             y = math.tan(math.radians(float(el))) * self.R
-            self.o['az_light'].y2 = cy + max(-self.R, min(self.R, y))
+            self._set(self.o['az_light'],
+                      y2=cy + max(-self.R, min(self.R, y)))
         except Exception:
             pass
 
@@ -523,21 +568,15 @@ class TelescopeCanvas(object):
                 color, alpha = self.c_warn, 0.5
             else:
                 color, alpha = self.c_alarm, 0.8
-            # tip points inward from the outer ring by the (scaled) speed
+            # tip points inward from the outer ring by the (scaled) speed;
+            # the wedge is built along +x and rotated into place
             depth = min(self.R * 0.62, 40.0 + speed)
-            tx = cx + (self.R - depth) * math.cos(ang)
-            ty = cy + (self.R - depth) * math.sin(ang)
-            perp = ang + math.pi / 2.0
-            ox, oy = 11.0 * math.cos(perp), 11.0 * math.sin(perp)
-            b1 = (cx + self.R * math.cos(ang) + ox,
-                  cy + self.R * math.sin(ang) + oy)
-            b2 = (cx + self.R * math.cos(ang) - ox,
-                  cy + self.R * math.sin(ang) - oy)
+            shape = self.wind_shape
+            shape[0, 0] = self.R - depth
             obj = self.o['wind']
-            obj.set_data_points([(tx, ty), b1, b2])
-            obj.color = color
-            obj.fillcolor = color
-            obj.alpha = obj.fillalpha = alpha
+            self._set_points(obj, rotate_pts(shape, ang, cx, cy))
+            self._set(obj, color=color, fillcolor=color, alpha=alpha,
+                      fillalpha=alpha)
         except Exception as e:
             self.logger.error('error: wind. %s' % (e))
 
@@ -545,19 +584,20 @@ class TelescopeCanvas(object):
         m1 = self.o['m1']
         try:
             if m1cover in ERROR:
-                m1.fillcolor, text = self.c_alarm, 'M1 Cover Undef'
+                fill, text = self.c_alarm, 'M1 Cover Undef'
             elif m1cover_onway in ERROR:
-                m1.fillcolor, text = self.c_alarm, 'M1 Cover OnWay Undef'
+                fill, text = self.c_alarm, 'M1 Cover OnWay Undef'
             elif m1cover_onway == 0x01:
-                m1.fillcolor, text = self.c_warn, 'M1 Cover OnWay-Open'
+                fill, text = self.c_warn, 'M1 Cover OnWay-Open'
             elif m1cover_onway == 0x02:
-                m1.fillcolor, text = self.c_warn, 'M1 Cover OnWay-Closed'
+                fill, text = self.c_warn, 'M1 Cover OnWay-Closed'
             elif (m1cover & 0x5555555555555555555555) == 0x1111111111111111111111:
-                m1.fillcolor, text = self.c_white, 'M1 Cover Open'
+                fill, text = self.c_white, 'M1 Cover Open'
             elif (m1cover & 0x5555555555555555555555) == 0x4444444444444444444444:
-                m1.fillcolor, text = self.c_black, 'M1 Cover Closed'
+                fill, text = self.c_black, 'M1 Cover Closed'
             else:
-                m1.fillcolor, text = self.c_warn, 'M1 Cover Partial'
+                fill, text = self.c_warn, 'M1 Cover Partial'
+            self._set(m1, fillcolor=fill)
             self._set_text(self.o['m1_txt'], text=text)
         except Exception as e:
             self.logger.error('Error: M1 cover. %s' % (e))
@@ -565,13 +605,14 @@ class TelescopeCanvas(object):
     def update_cell(self, cell):
         obj = self.o['cell']
         if cell == 0x01:
-            obj.fillcolor, text = self.c_white, 'Cell Cover Open'
+            fill, text = self.c_white, 'Cell Cover Open'
         elif cell == 0x04:
-            obj.fillcolor, text = self.c_black, 'Cell Cover Closed'
+            fill, text = self.c_black, 'Cell Cover Closed'
         elif cell == 0x00:
-            obj.fillcolor, text = self.c_warn, 'Cell Cover OnWay'
+            fill, text = self.c_warn, 'Cell Cover OnWay'
         else:
-            obj.fillcolor, text = self.c_alarm, 'Cell Cover Undef'
+            fill, text = self.c_alarm, 'Cell Cover Undef'
+        self._set(obj, fillcolor=fill)
         self._set_text(self.o['cell_txt'], text=text)
 
     # --- right-column decoders (kept identical to the originals) ------
@@ -692,9 +733,23 @@ class TelescopeCanvas(object):
               'csir': ['tipchop', 'insrot', 'm3'],
               'csopt': ['insrot', 'adc', 'm3']}
 
+    # status read by update_focus()
+    FOCUS_ALIASES = ('TSCV.M3Drive', 'TSCV.ImgRotRotation', 'TSCV.ImgRotMode',
+                     'TSCV.ImgRotType', 'TSCV.FOCUSINFO',
+                     'WAV.STG1_PS', 'WAV.STG2_PS', 'WAV.STG3_PS',
+                     'AON.LWFS.LASH', 'AON.HWFS.LASH',
+                     'TSCV.ADCOnOff', 'TSCV.ADCMode', 'TSCV.ADCInOut',
+                     'TSCV.ADCONOFF_PF', 'TSCV.ADCMODE_PF',
+                     'TSCV.TT_Mode', 'TSCV.TT_Drive', 'TSCV.TT_DataAvail',
+                     'TSCV.TT_ChopStat',
+                     'TSCV.InsRotRotation', 'TSCV.InsRotMode',
+                     'TSCV.INSROTROTATION_PF', 'TSCV.INSROTMODE_PF')
+
     def set_focus(self, obcp):
         self.obcp = obcp
         self.focus_kind = self.FOCUS.get(obcp)
+        # the objects shown for the new focus need filling in
+        self.invalidate()
         roles = set(self.LAYOUT.get(self.focus_kind, []))
         for role in ('insrot', 'adc', 'm3', 'tipchop'):
             self._set_visible(self.o[role], role in roles)
@@ -805,35 +860,58 @@ class TelescopeCanvas(object):
                     text += '\n' + res
         return text, color
 
+    def _update(self, part, update_fn, **kwargs):
+        """Call (update_fn) with (kwargs), unless they are the values
+        (part) was last updated with."""
+        if self.last.get(part) == kwargs:
+            return
+        update_fn(**kwargs)
+        self.last[part] = kwargs
+
+    def invalidate(self):
+        """Make the next status update redo every part."""
+        self.last = {}
+
     def update_telescope(self, **k):
+        self.changed = False
         try:
-            self.update_dome(dome=k.get('STATL.DOMESHUTTER_POS'))
-            self.update_topscreen(mode=k.get('TSCV.TopScreen'),
-                                  front=k.get('TSCL.TSFPOS'),
-                                  rear=k.get('TSCL.TSRPOS'))
-            self.update_windscreen(drv=k.get('TSCV.WINDSDRV'),
-                                   windscreen=k.get('TSCV.WindScreen'),
-                                   cmd=k.get('TSCL.WINDSCMD'),
-                                   pos=k.get('TSCL.WINDSPOS'),
-                                   el=k.get('TSCS.EL'))
-            self.update_z(z=k.get('TSCL.Z'))
-            self.update_m2(focus=k.get('STATL.M2_DESCR'))
-            self.update_focuslabel(focus=k.get('STATL.FOC_DESCR'),
-                                   alarm=k.get('TSCV.FOCUSALARM'))
-            self.update_azel(az=k.get('TSCS.AZ'), el=k.get('TSCS.EL'),
-                             winddir=k.get('TSCL.WINDD'),
-                             windspeed=k.get('TSCL.WINDS_O'),
-                             state=k.get('STATL.TELDRIVE'))
-            self.update_m1cover(m1cover=k.get('TSCV.M1Cover'),
-                                m1cover_onway=k.get('TSCV.M1CoverOnway'))
-            self.update_cell(cell=k.get('TSCV.CellCover'))
+            self._update('dome', self.update_dome,
+                         dome=k.get('STATL.DOMESHUTTER_POS'))
+            self._update('topscreen', self.update_topscreen,
+                         mode=k.get('TSCV.TopScreen'),
+                         front=k.get('TSCL.TSFPOS'),
+                         rear=k.get('TSCL.TSRPOS'))
+            self._update('windscreen', self.update_windscreen,
+                         drv=k.get('TSCV.WINDSDRV'),
+                         windscreen=k.get('TSCV.WindScreen'),
+                         cmd=k.get('TSCL.WINDSCMD'),
+                         pos=k.get('TSCL.WINDSPOS'),
+                         el=k.get('TSCS.EL'))
+            self._update('z', self.update_z, z=k.get('TSCL.Z'))
+            self._update('m2', self.update_m2, focus=k.get('STATL.M2_DESCR'))
+            self._update('focuslabel', self.update_focuslabel,
+                         focus=k.get('STATL.FOC_DESCR'),
+                         alarm=k.get('TSCV.FOCUSALARM'))
+            self._update('azel', self.update_azel,
+                         az=k.get('TSCS.AZ'), el=k.get('TSCS.EL'),
+                         winddir=k.get('TSCL.WINDD'),
+                         windspeed=k.get('TSCL.WINDS_O'),
+                         state=k.get('STATL.TELDRIVE'))
+            self._update('m1cover', self.update_m1cover,
+                         m1cover=k.get('TSCV.M1Cover'),
+                         m1cover_onway=k.get('TSCV.M1CoverOnway'))
+            self._update('cell', self.update_cell,
+                         cell=k.get('TSCV.CellCover'))
             if self.focus_kind is not None:
-                self.update_focus(**k)
+                self._update('focus', self.update_focus,
+                             **{alias: k.get(alias)
+                                for alias in self.FOCUS_ALIASES})
         except Exception as e:
             self.logger.error("error updating telescope plugin: %s" % (e),
                               exc_info=True)
-        # one flicker-free, graphics-only redraw for the whole update
-        self.canvas.update_canvas(whence=3)
+        if self.changed:
+            # one flicker-free, graphics-only redraw for the whole update
+            self.canvas.update_canvas(whence=3)
 
 
 class TelescopePlugin(PlBase.Plugin):
@@ -0,0 +1,523 @@
+#
+# TimeSeries.py -- Base class for StatMon time series plugins
+#
+"""
+Plugins that plot the recent history of status aliases (EnvMon*,
+GuidingImage) describe their plots in a table and leave ingest,
+throttled redraw and persistence to the TimeSeriesPlugin base class.
+"""
+import os
+import time
+import functools
+import numpy as np
+
+from ginga.misc import Bunch
+from ginga.gw import Viewers, Widgets
+from ginga.plot.plotaide import PlotAide
+from ginga.canvas.types import plots as gplots
+from ginga.plot import time_series as tsp
+from ginga.plot import data_source as dsp
+
+from statmon.util.history import (HistoryDataSource, CompactHistoryRing,
+                                  SharedHistoryDataSource, merge_older,
+                                  prepare_merge, finish_merge)
+from statmon.util import persist, lod, rules
+
+import PlBase
+
+plot_colors = ['blue', 'palegreen4', 'darkviolet', 'brown', 'deeppink2']
+
+
+class TimeSeriesPlugin(PlBase.Plugin):
+    """Base class for plugins that plot the history of status aliases.
+
+    Subclasses describe their plots in `plot_table`, a list of dicts
+    with the keys:
+      name    -- key of the plot in self.plots
+      title   -- title of the plot
+      names   -- legend names, one per alias
+      aliases -- status aliases to plot
+    and optionally warn_y and alert_y (levels at which the plot
+    background changes) and scale (a factor applied to the values).
+    Unscaled aliases are plotted from the model's shared history.
+
+    Settings for a plugin are read from plugin_<name>.cfg; see
+    load_settings().
+    """
+
+    # description of the plots; see above
+    plot_table = []
+    # title shown above the plots, if any
+    title = None
+    # alias whose value is the time of a point
+    time_alias = 'GEN2.STATUS.TBLTIME.TSCL'
+    # maximum number of data points to plot and save
+    num_pts = int(24 * 60 * 60)      # 24 hours worth
+    # starting dimensions of graph window (can change with window size)
+    dims = (500, 200)
+    # min size for individual plots
+    min_size = None
+    # interval (secs) between plot visual updates
+    # NOTE: this is independent of the rate at which data is saved
+    update_interval = 5.0
+    # interval (secs) between dataset flush to disk; None to not save
+    save_interval = 10.0 * 60.0   # every 10 minutes
+    # initialize graphs to show back this time period from current time
+    show_last_time = 4.0 * 60 * 60
+    # rollups kept on disk, shown when zooming out past num_pts:
+    # (interval secs, number of intervals kept)
+    rollups = [(60.0, 14 * 24 * 60),     # 1 minute for 2 weeks
+               (600.0, 90 * 24 * 6)]     # 10 minutes for 90 days
+    # default rules for the plot backgrounds (see statmon.util.rules),
+    # in addition to the warn_y/alert_y levels of the plots.  They can
+    # be replaced by setting 'warning_rules' in plugin_<name>.cfg
+    warning_rules = []
+    # keep the values of the plotted series as float32, which takes a
+    # quarter less memory (see statmon.util.history.CompactHistoryRing).
+    # Can be set with 'compact_history' in plugin_<name>.cfg
+    compact_history = False
+
+    def build_gui(self, container):
+        self.root = container
+        self.root.set_margins(2, 2, 2, 2)
+        self.root.set_spacing(2)
+
+        self.alias_d = {}
+        self.plots = Bunch.Bunch()
+        # aliases with points not yet in their plot
+        self.dirty = set()
+        self.store = None
+        self.update_time = time.time()
+        self.save_time = time.time()
+
+        self.load_settings()
+        self.subscribe_history(self.plot_table)
+        self.load_rules()
+
+        if self.title is not None:
+            lbl = Widgets.Label(self.title)
+            lbl.set_halign('center')
+            lbl.set_font('DejaVu Sans Bold', 12)
+            self.root.add_widget(lbl, stretch=0)
+
+        self.build_plots(self.root, self.plot_table)
+
+        self.gui_up = True
+
+    def subscribe_history(self, table):
+        # keep the history of our (unscaled) aliases in the model, where
+        # it is shared with any other plugin plotting the same aliases
+        aliases = [alias for info in table if info.get('scale') is None
+                   for alias in info['aliases']]
+        self.model.subscribe_history(aliases, self.num_pts,
+                                     time_alias=self.time_alias,
+                                     compact=self.compact_history)
+
+    def load_settings(self):
+        """Load plugin_<name>.cfg, which can set 'warning_rules' and
+        'compact_history' in place of the class defaults.
+        """
+        self.settings = self.controller.settings.create_category(
+            'plugin_' + str(self))
+        self.settings.set_defaults(warning_rules=self.warning_rules,
+                                   compact_history=self.compact_history)
+        self.settings.load(onError='silent')
+        self.compact_history = self.settings.get('compact_history')
+
+    def load_rules(self):
+        self.rules = rules.RuleSet(self.settings.get('warning_rules'),
+                                   self.logger)
+        # plot name -> index in rules.levels, set by update_plots()
+        self.rule_levels = {}
+
+        # rules may look at aliases that are not plotted
+        aliases = set([alias for rule in self.rules.rules
+                       for alias in rule.get_aliases()])
+        self.model.subscribe_history(aliases, self.num_pts,
+                                     time_alias=self.time_alias,
+                                     compact=self.compact_history)
+
+    def build_plots(self, container, table):
+        """Make the plots described by (table) and add them to
+        (container).
+        """
+        for info in table:
+            scale = info.get('scale')
+            res = make_plot(self.alias_d, self.logger, self.dims,
+                            info['names'], info['aliases'], self.num_pts,
+                            y_acc=np.mean, title=info['title'],
+                            warn_y=info.get('warn_y'),
+                            alert_y=info.get('alert_y'),
+                            history=(self.model.history if scale is None
+                                     else None),
+                            compact=self.compact_history)
+            for alias in info['aliases']:
+                self.alias_d[alias].scale = scale
+            # shared sources may already hold points
+            self.dirty.update(info['aliases'])
+            if self.min_size is not None:
+                res.widget.set_min_size(*self.min_size)
+            container.add_widget(res.widget, stretch=1)
+            self.plots[info['name']] = res
+
+            if info['name'] in self.rules.get_plots():
+                plot_bg = res.aide.get_plot_decor('plot_bg')
+                plot_bg.check_warning = functools.partial(
+                    self.check_warning, info['name'])
+
+        self.x_link = cross_connect_plots(self.plots.values())
+
+    def get_aliases(self):
+        aliases = [alias for info in self.plot_table
+                   for alias in info['aliases']]
+        aliases.extend([alias for rule in self.rules.rules
+                        for alias in rule.get_aliases()])
+        aliases.append(self.time_alias)
+        return list(dict.fromkeys(aliases))
+
+    def get_rule_points(self, alias):
+        bnch = self.alias_d.get(alias, None)
+        if bnch is not None:
+            return bnch.dsrc.get_points()
+        if self.model.history.has_alias(alias):
+            return self.model.get_history(alias)
+        return np.zeros((0, 2), dtype=float)
+
+    def check_warning(self, name):
+        """Sets the background of plot (name) from the warning rules, as
+        evaluated by the last update_plots(), and its warn_y/alert_y.
+        Called by the plot background on every redraw.
+        """
+        bnch = self.plots[name]
+        plot_bg = bnch.aide.get_plot_decor('plot_bg')
+        level = self.rule_levels.get(name, 0)
+
+        latest = [plot_src.get_latest()
+                  for plot_src in bnch.aide.plots.values()]
+        latest = [pt[1] for pt in latest if pt is not None]
+        if len(latest) > 0:
+            max_y = max(latest)
+            if plot_bg.alert_y is not None and max_y > plot_bg.alert_y:
+                level = 2
+            elif plot_bg.warn_y is not None and max_y > plot_bg.warn_y:
+                level = max(level, 1)
+
+        getattr(plot_bg, rules.levels[level])()
+
+    def start(self):
+        if self.save_interval is not None:
+            self.open_persist()
+
+        self.update_plots()
+
+        # only the aliases that changed are delivered, so a series that
+        # holds still is not redrawn; it still gets a point on each tick
+        # of the time alias (see update())
+        self.controller.register_select(str(self), self.update,
+                                        self.get_aliases(), delta=True)
+
+        if self.store is not None:
+            # the plots start out empty and live; the saved history is
+            # brought in on the thread pool
+            self.controller.nongui_do(self.backfill)
+
+    def stop(self):
+        if self.store is not None:
+            # writes out whatever has not been saved yet
+            self.store.close()
+
+    def open_persist(self):
+        home_dir = os.path.join(os.environ['HOME'], '.statmon')
+        save_name = f"{self.controller.name}_{str(self)}"
+        self.store = persist.SeriesStore(os.path.join(home_dir, save_name),
+                                         self.num_pts, self.logger,
+                                         rollups=self.rollups)
+        # bring in history saved in the old single-file format
+        persist.import_npy(self.store,
+                           os.path.join(home_dir, save_name + '.npy'),
+                           self.logger)
+
+        for alias, bnch in self.alias_d.items():
+            # zooming out past the points held shows the rollups
+            bnch.plot.older_points = functools.partial(
+                self.store.load_rollup, alias)
+
+    def backfill(self):
+        """Load the saved history and hand it to the GUI thread to merge
+        into the plots: first the last show_last_time, then the rest,
+        with the rollups shown when zooming out past it.  Runs on the
+        thread pool.
+        """
+        t = time.time()
+        t_split = t - self.show_last_time
+        aliases = list(self.alias_d.keys())
+
+        for recent in (True, False):
+            for alias in aliases:
+                if self.controller.ev_quit.is_set():
+                    return
+                # reads the points out of the file here, instead of on
+                # the GUI thread
+                points = self.store.load(alias)
+                i = np.searchsorted(points[:, 0], t_split)
+                points = np.array(points[i:] if recent else points[:i])
+                if not recent:
+                    self.store.read_rollups(alias)
+
+                bnch = self.alias_d[alias]
+                if bnch.shared:
+                    # the model appends under its lock, so the merged
+                    # points can be built here; the GUI thread only
+                    # puts them in
+                    merge = prepare_merge(bnch.dsrc, points)
+                    self.controller.gui_do(self.finish_history, alias,
+                                           merge)
+                else:
+                    self.controller.gui_do(self.merge_history, alias,
+                                           points)
+
+            if recent:
+                self.controller.gui_do(self.show_recent)
+            else:
+                self.controller.gui_do(self.update_plots)
+
+        self.logger.debug("time to load history {0:.4f} sec".format(
+            time.time() - t))
+
+    def merge_history(self, alias, points):
+        bnch = self.alias_d.get(alias, None)
+        if bnch is None or len(points) == 0:
+            return
+        if merge_older(bnch.dsrc, points):
+            self.dirty.add(alias)
+
+    def finish_history(self, alias, merge):
+        bnch = self.alias_d.get(alias, None)
+        if bnch is None:
+            return
+        if finish_merge(bnch.dsrc, merge):
+            self.dirty.add(alias)
+
+    def show_recent(self):
+        self.update_plots()
+        t = time.time()
+        for bnch in self.plots.values():
+            bnch.aide.zoom_limit_x(t - self.show_last_time, t)
+
+    def update(self, statusInfo, statusDict):
+        """Called with the aliases that changed (statusInfo) and a view
+        of the whole status cache (statusDict).
+
+        Each tick of the time alias adds a point to every series, with
+        its current value, so that a value that holds still is still
+        sampled (and saved).  Only the series that changed are redrawn.
+        """
+        t = statusDict.get(self.time_alias, None)
+        if not isinstance(t, float):
+            t = time.time()
+        self.logger.debug("status update t={}".format(t))
+
+        if self.time_alias in statusInfo:
+            aliases = self.alias_d.keys() & statusDict.keys()
+        else:
+            aliases = self.alias_d.keys() & statusInfo.keys()
+
+        try:
+            for alias in aliases:
+                val = statusDict[alias]
+                if isinstance(val, float):
+                    bnch = self.alias_d[alias]
+                    if bnch.scale is not None:
+                        val *= bnch.scale
+                    if self.store is not None:
+                        self.store.append(alias, t, val)
+
+                    if not bnch.shared:
+                        # the limits are updated by update_plots()
+                        bnch.dsrc.add((t, val), update_limits=False)
+                    if alias in statusInfo:
+                        # the plot is brought up to date by update_plots()
+                        self.dirty.add(alias)
+
+            t = time.time()
+            secs_since = t - self.update_time
+            self.logger.debug("{0:.2f} secs since last plot update".format(secs_since))  # noqa
+            if secs_since >= self.update_interval:
+                self.update_plots()
+
+            if self.store is not None and \
+               t - self.save_time >= self.save_interval:
+                self.update_persist()
+
+        except Exception as e:
+            self.logger.error("error updating from status: {}".format(e),
+                              exc_info=True)
+
+    def update_plots(self):
+        t = time.time()
+        self.update_time = t
+        self.logger.debug('updating plots')
+        # rebuild the plot arrays only for the series that changed,
+        # once per refresh instead of once per point
+        dirty, self.dirty = self.dirty, set()
+        for alias in dirty:
+            bnch = self.alias_d.get(alias, None)
+            if bnch is None:
+                continue
+            if isinstance(bnch.dsrc, HistoryDataSource):
+                # the plot takes the times and values as they are kept
+                # (e.g. float32 values), without copying them
+                bnch.plot.plot_xy(*bnch.dsrc.get_columns(),
+                                  limits=bnch.dsrc.get_limits())
+            else:
+                bnch.dsrc.update_limits()
+                dsp.update_plot_from_source(bnch.dsrc, bnch.plot,
+                                            update_limits=True)
+        # the rules for all plots are evaluated once here, not on each
+        # redraw of each plot
+        self.rule_levels = self.rules.evaluate(self.get_rule_points)
+        for bnch in self.plots.values():
+            bnch.aide.update_plots()
+        t1 = time.time()
+        self.logger.debug("time to update plots {0:.4f} sec".format(t1 - t))
+
+    def update_persist(self):
+        self.save_time = time.time()
+        self.logger.debug('persisting data')
+        # the GUI thread only hands off; the points are written out on
+        # the thread pool
+        if not self.store.save_in_background(self.controller.nongui_do):
+            self.logger.warning("last persist still running; skipped")
+
+
+def make_plot(alias_d, logger, dims, names, aliases, num_pts,
+              y_acc=np.mean, title='',
+              warn_y=None, alert_y=None,
+              show_x_axis=True, show_y_axis=True, history=None,
+              compact=False):
+
+    win_wd, win_ht = dims[:2]
+    viewer = Viewers.CanvasView(logger, render='widget')
+
+    viewer.set_desired_size(win_wd, win_ht)
+    viewer.set_zoom_algorithm('rate')
+    viewer.set_zoomrate(1.41)
+    viewer.enable_autozoom('off')
+    viewer.set_background('white')
+    viewer.set_foreground('black')
+    viewer.set_enter_focus(True)
+    # w = viewer.get_widget()
+    # if w is not None:
+    #     w.resize(win_wd, win_ht)
+
+    # our plot
+    aide = PlotAide(viewer)
+    aide.settings.set(autoaxis_x='pan', autoaxis_y='vis')
+
+    bg = tsp.TimePlotBG(warn_y=warn_y, alert_y=alert_y, linewidth=2)
+    aide.add_plot_decor(bg)
+
+    title = tsp.TimePlotTitle(title=title)
+    aide.add_plot_decor(title)
+
+    x_axis = tsp.XTimeAxis(num_labels=4)
+    aide.add_plot_decor(x_axis)
+
+    y_axis = gplots.YAxis(num_labels=4)
+    aide.add_plot_decor(y_axis)
+
+    srcs = []
+    for i, name in enumerate(names):
+        psrc = lod.LODXYPlot(name=name,
+                             color=plot_colors[i % len(plot_colors)],
+                             x_acc=np.mean, y_acc=y_acc,
+                             linewidth=2.0, coord='data')
+        aide.add_plot(psrc)
+
+        alias = aliases[i]
+        shared = history is not None and history.has_alias(alias)
+        if shared:
+            # points are kept in the model's history, shared with
+            # any other plugin plotting this alias
+            dsrc = SharedHistoryDataSource(history, alias,
+                                           none_for_empty=True)
+        elif compact:
+            dsrc = HistoryDataSource(CompactHistoryRing(num_pts),
+                                     none_for_empty=True)
+        else:
+            buf = np.zeros((num_pts, 2), dtype=float)
+            dsrc = dsp.XYDataSource(buf, overwrite=True,
+                                    none_for_empty=True)
+        dsrc.plot = psrc
+        srcs.append(dsrc)
+
+        alias_d[alias] = Bunch.Bunch(plot=psrc, dsrc=dsrc, aide=aide,
+                                     shared=shared)
+
+    # add scrollbar interface around this viewer
+    sw = Viewers.GingaScrolledViewerWidget(viewer=viewer, width=win_wd,
+                                           height=win_ht)
+    #sw.set_expanding(True, True)
+    aide.configure_scrollbars(sw)
+
+    res = Bunch.Bunch(viewer=viewer, aide=aide, sources=srcs, aliases=aliases,
+                      widget=sw)
+    return res
+
+
+class XRangeLink:
+    """Keeps the X range of a set of plots the same.  When the user zooms
+    or pans one of them in X, its X range is applied to each of the
+    others, which are then redrawn once.
+    """
+
+    def __init__(self):
+        self.aides = []
+        # True while applying a range, to ignore the pans it causes
+        self.syncing = False
+
+    def add_plot(self, aide):
+        if len(self.aides) > 0:
+            self.aides[0].settings.share_settings(aide.settings,
+                                                  keylist=['autoaxis_x'])
+        self.aides.append(aide)
+        # the aide has already zoomed itself when this is called
+        aide.add_callback('plot-zoom-x', self.zoom_x_cb)
+        settings = aide.viewer.get_settings()
+        settings.get_setting('pan').add_callback('set', self.pan_cb, aide)
+
+    def zoom_x_cb(self, aide, direction):
+        self.sync_from(aide)
+
+    def pan_cb(self, setting, pan_pos, aide):
+        # ignore the pans the aide makes itself, e.g. to keep up with
+        # the data
+        if aide._adjusting or aide._panning_x or aide._scaling_x:
+            return
+        self.sync_from(aide)
+
+    def sync_from(self, aide):
+        if self.syncing:
+            return
+        self.syncing = True
+        try:
+            bbox = aide.viewer.get_pan_bbox()
+            x_lo, x_hi = bbox[0][0], bbox[2][0]
+            for other in self.aides:
+                if other is aide:
+                    continue
+                with other.viewer.suppress_redraw:
+                    other.zoom_limit_x(x_lo, x_hi)
+                    other.update_plots()
+        finally:
+            self.syncing = False
+
+
+def cross_connect_plots(plot_info):
+    """Link the plots so that zooming or panning in X in one does the
+    same to all the others.  Returns the XRangeLink.
+    """
+    link = XRangeLink()
+    for res in plot_info:
+        link.add_plot(res.aide)
+    return link
@@ -0,0 +1,427 @@
+#
+# history.py -- shared in-memory status history for StatMon
+#
+import time
+import numbers
+import contextlib
+
+import numpy as np
+
+
+class HistoryRing:
+    """Fixed-size history of (time, value) points for one alias.
+
+    Points live in a single array with some slack at the end.  When the
+    slack is used up the newest `length` points are copied to the start
+    of a new array.  This keeps the valid points contiguous, so that
+    get_points() can return a view instead of a copy.
+
+    The points in a view returned by get_points() or get_columns() are
+    never written again, so the view can be kept (e.g. by a plot).  But
+    the buffer and its indices change together only under the writer's
+    lock: a reader in another thread should take that lock around the
+    call (see HistoryDataSource).
+    """
+
+    # whether values are kept as float32 (see CompactHistoryRing)
+    compact = False
+
+    def __init__(self, length, time_alias=None, slack=None):
+        self.length = length
+        if slack is None:
+            slack = max(1, length // 4)
+        self.buf = np.zeros((length + slack, 2), dtype=float)
+        # alias whose (float) value is used as the time of a new point
+        self.time_alias = time_alias
+        self.start = 0
+        self.end = 0
+        # points appended and calls to set_points(), ever; lets a merge
+        # tell what has changed since it read the points
+        self.num_appended = 0
+        self.num_set = 0
+
+    def append(self, t, val):
+        if self.end == len(self.buf):
+            # out of slack: copy the newest points to the front of a new
+            # array, leaving the views into the old one intact
+            n = self.length - 1
+            buf = np.zeros_like(self.buf)
+            buf[:n] = self.buf[self.end - n:self.end]
+            self.buf, self.start, self.end = buf, 0, n
+
+        self.buf[self.end] = (t, val)
+        self.end += 1
+        if self.end - self.start > self.length:
+            self.start += 1
+        self.num_appended += 1
+
+    def set_points(self, points):
+        points = np.asarray(points, dtype=float).reshape((-1, 2))
+        points = points[-self.length:]
+        n = len(points)
+        buf = np.zeros_like(self.buf)
+        buf[:n] = points
+        self.buf, self.start, self.end = buf, 0, n
+        self.num_set += 1
+
+    def get_points(self):
+        """Get the current points as a (zero-copy) view."""
+        start, end = self.start, self.end
+        return self.buf[start:end]
+
+    def get_columns(self):
+        """Get the current times and values as two (zero-copy) views."""
+        start, end = self.start, self.end
+        return self.buf[start:end, 0], self.buf[start:end, 1]
+
+    def peek(self):
+        if self.end == self.start:
+            return None
+        return self.buf[self.end - 1]
+
+    def peek_rear(self):
+        if self.end == self.start:
+            return None
+        return self.buf[self.start]
+
+    def __len__(self):
+        return self.end - self.start
+
+
+class CompactHistoryRing(HistoryRing):
+    """HistoryRing keeping the times as float64 and the values as
+    float32, in separate arrays: 12 bytes a point instead of 16.
+    float32 holds about 7 significant digits, which is more than any
+    of the sensors we plot deliver; times stay float64 as they need
+    sub-second resolution on top of the epoch seconds.
+
+    get_points() has to build a (N, 2) float64 array, so it returns a
+    copy; get_columns() still returns views.
+    """
+
+    compact = True
+
+    def __init__(self, length, time_alias=None, slack=None):
+        self.length = length
+        if slack is None:
+            slack = max(1, length // 4)
+        self.times = np.zeros(length + slack, dtype=float)
+        self.values = np.zeros(length + slack, dtype=np.float32)
+        self.time_alias = time_alias
+        self.start = 0
+        self.end = 0
+        self.num_appended = 0
+        self.num_set = 0
+
+    def append(self, t, val):
+        if self.end == len(self.times):
+            # out of slack: copy the newest points to new arrays
+            n = self.length - 1
+            times = np.zeros_like(self.times)
+            values = np.zeros_like(self.values)
+            times[:n] = self.times[self.end - n:self.end]
+            values[:n] = self.values[self.end - n:self.end]
+            self.times, self.values = times, values
+            self.start, self.end = 0, n
+
+        self.times[self.end] = t
+        self.values[self.end] = val
+        self.end += 1
+        if self.end - self.start > self.length:
+            self.start += 1
+        self.num_appended += 1
+
+    def set_points(self, points):
+        points = np.asarray(points, dtype=float).reshape((-1, 2))
+        points = points[-self.length:]
+        n = len(points)
+        times = np.zeros_like(self.times)
+        values = np.zeros_like(self.values)
+        times[:n] = points[:, 0]
+        values[:n] = points[:, 1]
+        self.times, self.values = times, values
+        self.start, self.end = 0, n
+        self.num_set += 1
+
+    def get_points(self):
+        """Get the current points as a (N, 2) float64 array (a copy)."""
+        times, values = self.get_columns()
+        points = np.empty((len(times), 2), dtype=float)
+        points[:, 0] = times
+        points[:, 1] = values
+        return points
+
+    def get_columns(self):
+        start, end = self.start, self.end
+        return self.times[start:end], self.values[start:end]
+
+    def peek(self):
+        if self.end == self.start:
+            return None
+        i = self.end - 1
+        return np.array((self.times[i], self.values[i]))
+
+    def peek_rear(self):
+        if self.end == self.start:
+            return None
+        i = self.start
+        return np.array((self.times[i], self.values[i]))
+
+
+class StatusHistory:
+    """History rings for all subscribed aliases, shared by all plugins.
+
+    Nothing is allocated until an alias is subscribed; after that the
+    model appends a point to its ring every time a float value for the
+    alias arrives.
+    """
+
+    def __init__(self, logger, lock=None):
+        self.logger = logger
+        # the writer's lock, held while points are appended
+        if lock is None:
+            lock = contextlib.nullcontext()
+        self.lock = lock
+        self.rings = {}
+
+    def subscribe(self, aliases, num_pts, time_alias=None, compact=False):
+        """Make sure there is a ring of at least (num_pts) points for
+        each alias in (aliases).  Points are timestamped with the value
+        of (time_alias) in the status cache, or the arrival time.
+
+        If (compact) is True the values may be kept as float32 (see
+        CompactHistoryRing).  A ring is only compact if everyone who
+        subscribed to it asked for that.
+        """
+        for alias in aliases:
+            ring = self.rings.get(alias, None)
+            if ring is not None and ring.length >= num_pts and \
+               (compact or not ring.compact):
+                continue
+
+            length, ring_class = num_pts, HistoryRing
+            if compact and (ring is None or ring.compact):
+                ring_class = CompactHistoryRing
+            if ring is not None:
+                length = max(length, ring.length)
+            new_ring = ring_class(length, time_alias=time_alias)
+            if ring is not None:
+                # grow (or widen) an existing ring, keeping its points;
+                # readers find the new ring by its alias (see
+                # SharedHistoryDataSource)
+                new_ring.time_alias = ring.time_alias
+                new_ring.set_points(ring.get_points())
+            self.rings[alias] = new_ring
+
+    def has_alias(self, alias):
+        return alias in self.rings
+
+    def get_ring(self, alias):
+        return self.rings[alias]
+
+    def get_points(self, alias):
+        with self.lock:
+            return self.rings[alias].get_points()
+
+    def append(self, statusInfo, statusDict):
+        """Append the float values in (statusInfo) to their rings.
+        (statusDict) is the status cache the time aliases are read from.
+        """
+        if len(self.rings) == 0:
+            return
+        t_now = time.time()
+        for alias in self.rings.keys() & statusInfo.keys():
+            val = statusInfo[alias]
+            if not isinstance(val, float) or not np.isfinite(val):
+                continue
+            ring = self.rings[alias]
+            t = t_now
+            if ring.time_alias is not None:
+                t = statusDict.get(ring.time_alias, t_now)
+                if not isinstance(t, float):
+                    t = t_now
+            ring.append(t, val)
+
+
+def merge_older(dsrc, points):
+    """Put (points), a (N, 2) array sorted by time, in front of the points
+    of data source (dsrc), leaving out any that are not older than its
+    first point.  Used to bring in saved history after live points have
+    started arriving.  Returns True if any points were added.
+    """
+    return finish_merge(dsrc, prepare_merge(dsrc, points))
+
+
+def prepare_merge(dsrc, points):
+    """The first half of merge_older(), which builds the merged points
+    and can be run off the thread that uses (dsrc) if the points are
+    appended under its lock.  Returns what finish_merge() needs, or None
+    if there is nothing to merge.
+    """
+    if not hasattr(dsrc, 'ring'):
+        # can't tell what changes in the meantime; finish_merge()
+        # does the work
+        return None, points
+
+    with getattr(dsrc, 'lock', contextlib.nullcontext()):
+        ring = dsrc.ring
+        state = (ring, ring.num_appended, ring.num_set)
+        cur = dsrc.get_points()
+    if len(cur) > 0:
+        points = points[points[:, 0] < cur[0, 0]]
+    if len(points) == 0 or len(cur) >= ring.length:
+        return None
+    return state, np.concatenate((points, cur))[-ring.length:]
+
+
+def finish_merge(dsrc, merge):
+    """The second half of merge_older(): puts the points built by
+    prepare_merge() into (dsrc) with a single set_points(), followed by
+    any points appended since.  Returns True if any points were added.
+    """
+    if merge is None:
+        return False
+    state, points = merge
+    # no point may be appended between reading and replacing the points
+    with getattr(dsrc, 'lock', contextlib.nullcontext()):
+        if state is not None:
+            ring, num_appended, num_set = state
+        if (state is not None and dsrc.ring is ring and
+                ring.num_set == num_set):
+            n = min(ring.num_appended - num_appended, len(ring))
+            if n > 0:
+                x, y = ring.get_columns()
+                points = np.concatenate(
+                    (points, np.column_stack((x[-n:], y[-n:]))))
+        else:
+            # replaced since (e.g. by another merge): merge with the
+            # points there are now
+            cur = np.array(dsrc.get_points())
+            if len(cur) > 0:
+                points = points[points[:, 0] < cur[0, 0]]
+            if len(points) == 0:
+                return False
+            points = np.concatenate((points, cur))
+        dsrc.set_points(points)
+    return True
+
+
+class HistoryDataSource:
+    """A ginga XYDataSource work-alike backed by a shared HistoryRing.
+
+    The model appends the points, so add() is only needed to push in
+    points that did not come from the status stream (e.g. loaded from a
+    persist file).  If the ring is appended to in another thread, (lock)
+    is the lock held by that writer; the points are read and written
+    under it.
+    """
+
+    def __init__(self, ring, none_for_empty=False, lock=None):
+        self._ring = ring
+        self.none_for_empty = none_for_empty
+        if lock is None:
+            lock = contextlib.nullcontext()
+        self.lock = lock
+        self.limits = np.array([[0.0, 0.0], [0.0, 0.0]])
+
+    @property
+    def ring(self):
+        return self._ring
+
+    @property
+    def length(self):
+        return self.ring.length
+
+    def get_limits(self):
+        # the model appends points behind our back, so the limits are
+        # computed from the current points when they are asked for
+        self.update_limits()
+        return np.copy(self.limits)
+
+    def update_limits(self):
+        x, y = self.get_columns()
+        if len(x) == 0:
+            self.limits = np.array([[0.0, 0.0], [0.0, 0.0]])
+        else:
+            self.limits = np.array([[x[0], y.min()],
+                                    [x[-1], y.max()]], dtype=float)
+
+    def set_points(self, points):
+        with self.lock:
+            self.ring.set_points(points)
+        self.update_limits()
+
+    def add_points(self, points):
+        with self.lock:
+            for pt in points:
+                self._add(pt)
+        self.update_limits()
+
+    def _add(self, pt):
+        x, y = pt
+        # skip bogus values
+        if not isinstance(y, numbers.Number) or not np.isfinite(y):
+            return
+        self.ring.append(x, y)
+
+    def add(self, pt, update_limits=True):
+        with self.lock:
+            self._add(pt)
+        if update_limits:
+            self.update_limits()
+
+    append = add
+    push = add
+
+    def is_fullp(self):
+        return len(self.ring) >= self.length
+
+    def peek(self):
+        with self.lock:
+            pt = self.ring.peek()
+        if pt is None and not self.none_for_empty:
+            raise ValueError("Buffer is empty")
+        return pt
+
+    get_latest = peek
+
+    def peek_rear(self):
+        with self.lock:
+            pt = self.ring.peek_rear()
+        if pt is None and not self.none_for_empty:
+            raise ValueError("Buffer is empty")
+        return pt
+
+    def get_points(self):
+        with self.lock:
+            return self.ring.get_points()
+
+    def get_columns(self):
+        with self.lock:
+            return self.ring.get_columns()
+
+    @property
+    def points(self):
+        return self.get_points()
+
+    def __len__(self):
+        return len(self.ring)
+
+
+class SharedHistoryDataSource(HistoryDataSource):
+    """HistoryDataSource for (alias) in the StatusHistory (history).
+
+    The ring is looked up on every call, as a later subscribe() may
+    replace it with a longer (or non-compact) one; the points are read
+    under the model's lock.
+    """
+
+    def __init__(self, history, alias, none_for_empty=False):
+        super().__init__(history.get_ring(alias),
+                         none_for_empty=none_for_empty, lock=history.lock)
+        self.history = history
+        self.alias = alias
+
+    @property
+    def ring(self):
+        return self.history.get_ring(self.alias)
@@ -0,0 +1,161 @@
+#
+# lod.py -- level of detail reduction for long time series plots
+#
+"""
+A 24 hour series at one point a second is 86400 points, but a plot is
+only a few hundred pixels wide.  Instead of handing every visible
+point to the path, LODXYPlot keeps the minimum and maximum of the
+points falling in each pixel column, so a plot of any length draws at
+most about 2 x width points and spikes are not averaged away.
+"""
+import numpy as np
+
+from ginga.canvas.types.plots import XYPlot
+
+
+def decimate_minmax(points, start_x, stop_x, num_buckets):
+    """Reduce (points), a (N, 2) array sorted by X, to those in the range
+    (start_x, stop_x), keeping only the min and max Y of each of
+    (num_buckets) equal slices of the range.  Returns a (M, 2) float
+    array with M <= 2 * (num_buckets + 1).
+
+    Slices are aligned to multiples of their width, not to (start_x),
+    so that panning does not make the reduced line jitter.
+    """
+    return decimate_minmax_xy(points[:, 0], points[:, 1], start_x, stop_x,
+                              num_buckets)
+
+
+def decimate_minmax_xy(x_data, y_data, start_x, stop_x, num_buckets):
+    """Like decimate_minmax, for points given as separate X and Y arrays
+    (e.g. float64 times and float32 values).
+    """
+    i, j = np.searchsorted(x_data, (start_x, stop_x), side='left')
+    # keep one point beyond each end, so the line runs off the plot
+    i, j = max(0, i - 1), min(len(x_data), j + 1)
+    x_data, y_data = x_data[i:j], y_data[i:j]
+    if len(x_data) <= 2 * num_buckets:
+        return np.column_stack((x_data, y_data)).astype(float, copy=False)
+
+    width = (stop_x - start_x) / num_buckets
+    bucket = np.floor(x_data / width)
+    # index of the first point in each bucket
+    idx = np.flatnonzero(np.diff(bucket, prepend=bucket[0] - 1))
+    # fmin/fmax skip NaNs, which the plot would not draw anyway
+    y_min = np.fmin.reduceat(y_data, idx)
+    y_max = np.fmax.reduceat(y_data, idx)
+    # min at the first X of the bucket and max at the last, so that
+    # the line draws the full range of each pixel column
+    idx_last = np.append(idx[1:], len(x_data)) - 1
+
+    res = np.empty((2 * len(idx), 2), dtype=float)
+    res[0::2, 0] = x_data[idx]
+    res[0::2, 1] = y_min
+    res[1::2, 0] = x_data[idx_last]
+    res[1::2, 1] = y_max
+    return res
+
+
+class LODXYPlot(XYPlot):
+    """XYPlot that reduces the visible points to a min/max pair per pixel
+    column.  Points must be sorted by X, as a time series is; otherwise
+    the plot falls back to XYPlot's own reduction.
+
+    If `older_points` is set, it is called as older_points(x_lo, x_hi,
+    width) when the view reaches back before the first point, and
+    returns (N, 2) points sorted by X for that range, at a resolution
+    of about (width) per point (e.g. from a rollup of the series).
+
+    Points can also be given as separate X and Y arrays with plot_xy(),
+    which does not copy them; the path still gets a (M, 2) float array.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # whether the points are sorted by X; checked when next reduced
+        self.x_sorted = None
+        self.older_points = None
+        # X and Y data points, when given to plot_xy()
+        self.columns = None
+
+    def plot(self, points, limits=None):
+        super().plot(points, limits=limits)
+        self.x_sorted = None
+        self.columns = None
+
+    def plot_xy(self, xpts, ypts, limits=None):
+        """Plot points given as separate X and Y arrays, in data
+        coordinates.  Unlike XYPlot.plot_xy(), the arrays are kept as
+        they are, so they can be views of a compact buffer.
+        """
+        self.columns = (np.asarray(xpts), np.asarray(ypts))
+        self.points = None
+        self.plot_xlim = (None, None)
+        self.x_sorted = None
+        if limits is not None:
+            self.limits = np.asarray(limits)
+        elif len(xpts) == 0:
+            self.limits = np.array([[0.0, 0.0], [0.0, 0.0]])
+        else:
+            self.limits = np.array([(np.min(xpts), np.min(ypts)),
+                                    (np.max(xpts), np.max(ypts))],
+                                   dtype=float)
+
+    def get_data_points(self, points=None):
+        if points is None and self.columns is not None:
+            # only when falling back on XYPlot's reduction
+            return np.column_stack(self.columns).astype(float, copy=False)
+        return super().get_data_points(points=points)
+
+    def get_latest(self):
+        if self.columns is None:
+            return super().get_latest()
+        x_data, y_data = self.columns
+        if len(x_data) == 0:
+            return None
+        return np.array((x_data[-1], y_data[-1]), dtype=float)
+
+    def calc_points(self, viewer, start_x, stop_x):
+        # in case X axis is flipped
+        start_x, stop_x = min(start_x, stop_x), max(start_x, stop_x)
+
+        new_xlim = (start_x, stop_x)
+        if new_xlim == self.plot_xlim:
+            # X limits are the same, no need to recalculate points
+            return
+
+        if not np.all(np.isfinite(new_xlim)):
+            super().calc_points(viewer, start_x, stop_x)
+            return
+
+        if self.columns is not None:
+            x_data, y_data = self.columns
+        else:
+            points = self.get_data_points(points=self.points)
+            if len(points) == 0:
+                points = np.zeros((0, 2), dtype=float)
+            x_data, y_data = points[:, 0], points[:, 1]
+        if len(x_data) > 0:
+            if self.x_sorted is None:
+                self.x_sorted = bool(np.all(np.diff(x_data) >= 0))
+            if not self.x_sorted:
+                super().calc_points(viewer, start_x, stop_x)
+                return
+
+        self.plot_xlim = new_xlim
+        wd, ht = viewer.get_window_size()
+        num_buckets = max(1, int(wd))
+        first_x = x_data[0] if len(x_data) > 0 else stop_x
+        points = decimate_minmax_xy(x_data, y_data, start_x, stop_x,
+                                    num_buckets)
+
+        if self.older_points is not None and start_x < first_x:
+            # the view reaches back past the points we hold
+            older = self.older_points(start_x, first_x,
+                                      (stop_x - start_x) / num_buckets)
+            older = older[older[:, 0] < first_x]
+            if len(older) > 0:
+                older = decimate_minmax(older, start_x, stop_x, num_buckets)
+                points = np.concatenate((older, points))
+
+        self.path.points = points
@@ -0,0 +1,390 @@
+#
+# persist.py -- append-only on-disk time series for StatMon plugins
+#
+"""
+Each alias is kept in its own file: a 16 byte header followed by
+(time, value) records of two little-endian float64s.  Points are only
+ever appended, so a crash can at worst leave a partial record at the
+end, which is ignored when the file is read and cut off when it is
+next opened for appending.  Files are read with a memory map, so
+loading does no parsing and only touches the points that are used.
+
+Appending a point only queues it in memory; save() writes the queued
+points out and can be run off the GUI thread.
+
+A store can also keep rollups of its series: the min, mean and max of
+the points over fixed intervals (e.g. 1 and 10 minutes), each in files
+of their own.  These are kept much longer than the raw points, and are
+written as the raw points are saved.
+"""
+import os
+import math
+import time
+import threading
+
+import numpy as np
+
+# 8 byte magic + 8 bytes reserved, so records stay 16 byte aligned
+magic = b'STMSER1\n'
+header_size = 16
+rec_dtype = np.dtype('<f8')
+
+
+class SeriesStore:
+    """Append-only series files for a set of aliases, in directory
+    (dirpath).  Files are compacted to the last (num_pts) points when
+    they grow past (compact_factor) times that.
+
+    Records are (num_cols) floats; file names end in (suffix).
+    (rollups) is a list of (interval, num_rows) pairs: a Rollup over
+    (interval) seconds keeping (num_rows) rows is made for each.
+    """
+
+    def __init__(self, dirpath, num_pts, logger, compact_factor=4,
+                 suffix='.dat', num_cols=2, rollups=None):
+        self.dirpath = dirpath
+        self.num_pts = num_pts
+        self.logger = logger
+        self.compact_factor = compact_factor
+        self.suffix = suffix
+        self.num_cols = num_cols
+        self.rec_size = num_cols * rec_dtype.itemsize
+        # open files for appending, by alias
+        self.files = {}
+        # number of records in each open file
+        self.counts = {}
+        # points appended but not yet written, by alias
+        self.pending = {}
+        self.lock = threading.Lock()
+        # serializes writers, so points reach the files in order
+        self.write_lock = threading.Lock()
+        # True while a background save is queued or running
+        self.saving = False
+        if not os.path.isdir(dirpath):
+            os.makedirs(dirpath)
+        if rollups is None:
+            rollups = []
+        self.rollups = [Rollup(dirpath, interval, num_rows, logger)
+                        for interval, num_rows in sorted(rollups)]
+
+    def get_path(self, alias):
+        return os.path.join(self.dirpath, alias + self.suffix)
+
+    def _num_records(self, path):
+        with open(path, 'rb') as in_f:
+            if in_f.read(len(magic)) != magic:
+                raise ValueError("bad header in series file '%s'" % (path))
+        return (os.path.getsize(path) - header_size) // self.rec_size
+
+    def load(self, alias):
+        """Returns a (N, num_cols) array of the last points saved for
+        (alias).  The array may be a read-only memory map of the file.
+        """
+        path = self.get_path(alias)
+        if not os.path.exists(path) or os.path.getsize(path) < header_size:
+            # may be just being created
+            return np.zeros((0, self.num_cols), dtype=float)
+
+        try:
+            n = self._num_records(path)
+        except Exception as e:
+            self.logger.error("Couldn't read series file: {}".format(e))
+            os.rename(path, path + '.bad')
+            return np.zeros((0, self.num_cols), dtype=float)
+
+        if n == 0:
+            return np.zeros((0, self.num_cols), dtype=float)
+        arr = np.memmap(path, dtype=rec_dtype, mode='r',
+                        offset=header_size, shape=(n, self.num_cols))
+        return arr[-self.num_pts:]
+
+    def _compact(self, alias, path):
+        # keep only the newest points; the new file replaces the old
+        # one in a single rename
+        points = np.array(self.load(alias))
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as out_f:
+            out_f.write(magic.ljust(header_size, b'\0'))
+            out_f.write(points.astype(rec_dtype).tobytes())
+        os.replace(tmp_path, path)
+        return len(points)
+
+    def _open(self, alias):
+        path = self.get_path(alias)
+        n = None
+        if os.path.exists(path):
+            try:
+                n = self._num_records(path)
+            except Exception as e:
+                self.logger.error("Couldn't read series file: {}".format(e))
+                os.rename(path, path + '.bad')
+
+        if n is not None:
+            if n > self.num_pts * self.compact_factor:
+                n = self._compact(alias, path)
+            else:
+                # drop any partial record left by a crash
+                os.truncate(path, header_size + n * self.rec_size)
+            out_f = open(path, 'ab')
+        else:
+            n = 0
+            out_f = open(path, 'wb')
+            out_f.write(magic.ljust(header_size, b'\0'))
+        self.files[alias] = out_f
+        self.counts[alias] = n
+        return out_f
+
+    def _write(self, alias, points):
+        # called with write_lock held
+        out_f = self.files.get(alias, None)
+        if out_f is None:
+            out_f = self._open(alias)
+        out_f.write(points.tobytes())
+        self.counts[alias] += len(points)
+
+        if self.counts[alias] > self.num_pts * self.compact_factor:
+            # a store that stays open (e.g. a long running plugin)
+            # is compacted here, on the thread doing the save
+            out_f.close()
+            del self.files[alias]
+            self._open(alias)
+
+    def append(self, alias, t, val):
+        """Queue a point for (alias), to be written by the next save()."""
+        # plots skip bogus values, so don't bother saving them
+        if not math.isfinite(val):
+            return
+        with self.lock:
+            self.pending.setdefault(alias, []).append((t, val))
+
+    def save(self):
+        """Write the points appended since the last save to disk."""
+        with self.write_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            for alias, points in pending.items():
+                points = np.array(points, dtype=rec_dtype)
+                for rollup in self.rollups:
+                    if alias not in rollup.carry:
+                        # first save since the store was opened: pick up
+                        # the points already saved that are not rolled up
+                        rollup.add(alias, np.array(self.load(alias)))
+                    rollup.add(alias, points)
+
+                self._write(alias, points)
+            for out_f in self.files.values():
+                out_f.flush()
+            for rollup in self.rollups:
+                rollup.save()
+
+    def save_in_background(self, nongui_do):
+        """Run save() using (nongui_do), unless the last background save
+        is still running.  Returns False if the save was skipped; the
+        points are then written by the next one.
+        """
+        if self.saving:
+            return False
+        self.saving = True
+        nongui_do(self._save_task)
+        return True
+
+    def _save_task(self):
+        t = time.time()
+        try:
+            self.save()
+        except Exception as e:
+            self.logger.error("Error saving series: {}".format(e),
+                              exc_info=True)
+        finally:
+            self.saving = False
+        t1 = time.time()
+        self.logger.debug("time to persist data {0:.4f} sec".format(t1 - t))
+
+    def close(self):
+        self.save()
+        with self.write_lock:
+            for out_f in self.files.values():
+                out_f.close()
+            self.files = {}
+            self.counts = {}
+        for rollup in self.rollups:
+            rollup.close()
+
+    def write_points(self, alias, points):
+        """Append (points), a (N, num_cols) array, to the file for
+        (alias) right away.
+        """
+        points = np.asarray(points, dtype=rec_dtype).reshape(
+            (-1, self.num_cols))
+        with self.write_lock:
+            self._write(alias, points)
+
+    def import_points(self, alias, points):
+        """Append (points) to the file for (alias); used to bring in
+        history saved in some other format.
+        """
+        self.write_points(alias, points)
+
+    def read_rollups(self, alias):
+        """Read the rollups for (alias) into memory, for load_rollup().
+        Can be run off the GUI thread.
+        """
+        for rollup in self.rollups:
+            rollup.read(alias)
+
+    def load_rollup(self, alias, x_lo, x_hi, width):
+        """Returns a (N, 2) array of points for (alias) between times
+        (x_lo) and (x_hi) from the rollups, as a min and a max point per
+        row.  Uses the coarsest rollup whose interval is at most
+        (width) seconds, and coarser ones for earlier times it does not
+        cover.
+
+        Only the rows read in by read_rollups() are used, so this does
+        not touch the disk and can be called from the GUI thread.
+        """
+        i = max(0, len([rollup for rollup in self.rollups
+                        if rollup.interval <= width]) - 1)
+        segments = []
+        for rollup in self.rollups[i:]:
+            if x_hi <= x_lo:
+                break
+            rows = rollup.load(alias, x_lo, x_hi)
+            if len(rows) == 0:
+                continue
+            segments.insert(0, minmax_points(rows))
+            x_hi = rows[0, 0]
+
+        if len(segments) == 0:
+            return np.zeros((0, 2), dtype=float)
+        return np.concatenate(segments)
+
+
+class Rollup:
+    """Rows of (time, min, mean, max) of a series over each (interval)
+    seconds, for a set of aliases.  The last (num_rows) rows are kept,
+    in files ending in '.<interval>s.dat'.
+
+    An interval is written once a point arrives for a later one.  The
+    points of an interval that is not complete when the store is
+    closed are not written; the first points added after it is opened
+    again are those of the raw series, and any that the rows written
+    already cover are skipped.
+    """
+
+    def __init__(self, dirpath, interval, num_rows, logger):
+        self.interval = interval
+        self.num_rows = num_rows
+        self.store = SeriesStore(dirpath, num_rows, logger,
+                                 suffix='.%ds.dat' % (interval),
+                                 num_cols=4)
+        # points of the interval not yet complete, by alias
+        self.carry = {}
+        # rows read into memory by read(), by alias; kept up to date
+        # as rows are written
+        self.rows = {}
+        self.lock = threading.Lock()
+
+    def add(self, alias, points):
+        """Add (points), a (N, 2) array, to the rollup for (alias)."""
+        carry = self.carry.get(alias, None)
+        if carry is not None:
+            points = np.concatenate((carry, points))
+        else:
+            # nothing added since the rollup was opened
+            rows = self.store.load(alias)
+            if len(rows) > 0:
+                points = points[points[:, 0] >= rows[-1, 0] + self.interval]
+        points = points[np.isfinite(points).all(axis=1)]
+        points = points[np.argsort(points[:, 0], kind='stable')]
+
+        rows, i = rollup_points(points, self.interval)
+        self.carry[alias] = points[i:]
+        if len(rows) > 0:
+            with self.lock:
+                self.store.write_points(alias, rows)
+                if alias in self.rows:
+                    self.rows[alias] = np.concatenate(
+                        (self.rows[alias], rows))[-self.num_rows:]
+
+    def read(self, alias):
+        """Read the rows for (alias) into memory, for load()."""
+        with self.lock:
+            with self.store.write_lock:
+                out_f = self.store.files.get(alias, None)
+                if out_f is not None:
+                    out_f.flush()
+            self.rows[alias] = np.array(self.store.load(alias))
+
+    def load(self, alias, x_lo, x_hi):
+        """Returns the rows for (alias) between times (x_lo) and (x_hi),
+        with one more on each side if there is one.  Only rows read in
+        with read() are returned.
+        """
+        rows = self.rows.get(alias, None)
+        if rows is None:
+            return np.zeros((0, 4), dtype=float)
+        i, j = np.searchsorted(rows[:, 0], (x_lo, x_hi))
+        return rows[max(0, i - 1):j + 1]
+
+    def save(self):
+        self.store.save()
+
+    def close(self):
+        self.store.close()
+
+
+def rollup_points(points, interval):
+    """Rolls up (points), a (N, 2) array sorted by time, into rows of
+    (time, min, mean, max) over each (interval) seconds.  Returns the
+    rows and the index of the first point of the last interval, which
+    is left out as more points may arrive for it.
+    """
+    if len(points) == 0:
+        return np.zeros((0, 4), dtype=float), 0
+    bucket = np.floor(points[:, 0] / interval)
+    # index of the first point of each interval
+    idx = np.flatnonzero(np.diff(bucket, prepend=bucket[0] - 1))
+    last = idx[-1]
+    idx = idx[:-1]
+    if len(idx) == 0:
+        return np.zeros((0, 4), dtype=float), last
+
+    y = points[:last, 1]
+    counts = np.diff(np.append(idx, last))
+    rows = np.empty((len(idx), 4), dtype=float)
+    rows[:, 0] = bucket[idx] * interval
+    rows[:, 1] = np.minimum.reduceat(y, idx)
+    rows[:, 2] = np.add.reduceat(y, idx) / counts
+    rows[:, 3] = np.maximum.reduceat(y, idx)
+    return rows, last
+
+
+def minmax_points(rows):
+    """Turns rollup (rows) into (N, 2) points: the min and then the max
+    of each row, both at the time of the row.
+    """
+    points = np.empty((2 * len(rows), 2), dtype=float)
+    points[0::2, 0] = rows[:, 0]
+    points[0::2, 1] = rows[:, 1]
+    points[1::2, 0] = rows[:, 0]
+    points[1::2, 1] = rows[:, 3]
+    return points
+
+
+def import_npy(store, npy_path, logger):
+    """One-time import of a persist file in the old format (a pickled
+    dict of alias -> (N, 2) array saved with np.save) into (store).
+    The old file is renamed so that it is not imported again.
+    """
+    if not os.path.exists(npy_path):
+        return
+    try:
+        d = dict(np.load(npy_path, allow_pickle=True)[()])
+        for alias, points in d.items():
+            if not os.path.exists(store.get_path(alias)):
+                store.import_points(alias, points)
+        store.save()
+        os.rename(npy_path, npy_path + '.imported')
+
+    except Exception as e:
+        logger.error("Couldn't import persist file: {}".format(e))
@@ -0,0 +1,280 @@
+#
+# replay.py -- record, replay and synthesize Gen2 status stream envelopes
+#
+"""
+Envelopes have the same shape that StatusStream.subscribe_loop() puts
+on the status queue: {'status': {alias: value, ...}}.  Recordings are
+stored one envelope per line as JSON, with the arrival time added
+under the key 'time'.  A file name ending in '.gz' is compressed.
+"""
+import time
+import gzip
+import threading
+import json
+import random
+import queue as Queue
+
+import numpy as np
+
+
+# Example values for aliases used by the shipped plugins that are not
+# floats.  A recording (see template_from_records()) gives a better
+# template.
+default_template = {
+    'FITS.SBR.MAINOBCP': 'HSC',
+    'STATL.TSC_F_SELECT': 'P_OPT',
+    'STATL.TELDRIVE': 'Guiding(AG1)',
+    'STATL.TELDRIVE_INFO': 'NORMAL',
+    'STATL.DOMESHUTTER_POS': 'OPEN',
+    'STATL.FOC_DESCR': 'Prime Focus',
+    'STATL.M2_DESCR': 'PF_OPT2',
+    'STATL.SV_CALC_MODE': 'CTR',
+    'FITS.SBR.RA': '05:35:17.300',
+    'FITS.SBR.RA_CMD': '05:35:17.300',
+    'FITS.SBR.DEC': '-05:23:28.00',
+    'FITS.SBR.DEC_CMD': '-05:23:28.00',
+    'STATS.RA': '053517.300',
+    'STATS.SLEWING_STATUS': 'NO',
+    'GEN2.TSCLOGINS': 'OCS%',
+    'GEN2.TSCMODE': 'OBS',
+    'GEN2.PRECIP.SENSOR1.STATUS': 'DRY',
+    'TSCL.LIMIT_FLAG': 0,
+}
+# prefixes of aliases that are integers (mostly bit fields)
+int_prefixes = ('TSCV.',)
+# suffixes of aliases that are strings
+str_suffixes = ('.PROP_ID', '.OBJECT')
+
+
+def template_from_records(records):
+    """Make a template for SyntheticStream from the last value of each
+    alias in (records), a sequence of (time, envelope) pairs.
+    """
+    template = {}
+    for t, envelope in records:
+        template.update(envelope['status'])
+    return template
+
+
+def open_recording(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+
+class EnvelopeWriter:
+    """Writes status envelopes to a recording file."""
+
+    def __init__(self, path):
+        self.fp = open_recording(path, 'w')
+
+    def write(self, envelope, t=None):
+        if t is None:
+            t = time.time()
+        rec = dict(time=t, status=envelope['status'])
+        self.fp.write(json.dumps(rec) + '\n')
+
+    def flush(self):
+        self.fp.flush()
+
+    def close(self):
+        self.fp.close()
+
+
+class RecordingQueue:
+    """Stands in for the status queue on the producer side: each
+    envelope put on it is passed on to (queue) and recorded by (writer).
+
+    The producer only hands the envelope to a queue of at most
+    (max_pending) envelopes; a thread of its own encodes and writes
+    them, flushing the file every (flush_interval) seconds.  If the
+    writer falls behind, envelopes are dropped from the recording (and
+    counted) rather than holding up the stream.  If the recording fails
+    it is logged and recording stops; the envelopes keep flowing to
+    (queue).
+    """
+
+    def __init__(self, queue, writer, logger=None, max_pending=10000,
+                 flush_interval=1.0):
+        self.queue = queue
+        self.writer = writer
+        self.logger = logger
+        self.flush_interval = flush_interval
+        self.rec_q = Queue.Queue(maxsize=max_pending)
+        self.recording = True
+        # envelopes left out of the recording because the queue was full
+        self.num_dropped = 0
+        self.thread = threading.Thread(target=self._write_loop,
+                                       name='RecordingQueue', daemon=True)
+        self.thread.start()
+
+    def put(self, envelope, block=True, timeout=None):
+        self.queue.put(envelope, block=block, timeout=timeout)
+
+        if not self.recording:
+            return
+        try:
+            self.rec_q.put_nowait((time.time(), envelope))
+
+        except Queue.Full:
+            self.num_dropped += 1
+
+    def put_nowait(self, envelope):
+        self.put(envelope, block=False)
+
+    def _write_loop(self):
+        last_flush = time.time()
+        num_reported = 0
+        while True:
+            try:
+                item = self.rec_q.get(timeout=self.flush_interval)
+            except Queue.Empty:
+                item = ()
+            if item is None:
+                break
+
+            try:
+                if len(item) > 0:
+                    t, envelope = item
+                    self.writer.write(envelope, t=t)
+
+                t = time.time()
+                if t - last_flush >= self.flush_interval:
+                    self.writer.flush()
+                    last_flush = t
+                    num_dropped = self.num_dropped
+                    if num_dropped > num_reported and \
+                       self.logger is not None:
+                        self.logger.warning(
+                            "recording fell behind; {} envelopes "
+                            "dropped so far".format(num_dropped))
+                        num_reported = num_dropped
+
+            except Exception as e:
+                self.recording = False
+                if self.logger is not None:
+                    self.logger.error("error recording status; recording "
+                                      "stopped: {}".format(e), exc_info=True)
+                break
+
+        if self.num_dropped > 0 and self.logger is not None:
+            self.logger.warning("{} envelopes were dropped from the "
+                                "recording".format(self.num_dropped))
+        try:
+            self.writer.close()
+
+        except Exception as e:
+            if self.logger is not None:
+                self.logger.error("error closing recording: {}".format(e))
+
+    def close(self, timeout=10.0):
+        """Stop recording: write out what is queued and close the
+        writer.
+        """
+        self.recording = False
+        if self.thread.is_alive():
+            self.rec_q.put(None)
+            self.thread.join(timeout=timeout)
+
+
+def read_envelopes(path):
+    """Generates the (time, envelope) pairs in a recording file."""
+    with open_recording(path, 'r') as in_f:
+        for line in in_f:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            rec = json.loads(line)
+            yield (rec['time'], dict(status=rec['status']))
+
+
+def replay_stream(ev_quit, status_q, records, speed=1.0, stamp=None):
+    """Put the envelopes from (records), a sequence of (time, envelope)
+    pairs, on (status_q) with their original spacing divided by (speed).
+    A (speed) of 0 replays as fast as possible.  If (stamp) is given it
+    names an alias that is set to time.perf_counter() in each envelope
+    as it is put on the queue.  Returns the number of envelopes sent.
+    """
+    count = 0
+    t_first = t_start = None
+    for t, envelope in records:
+        if ev_quit.is_set():
+            break
+        if speed > 0:
+            if t_first is None:
+                t_first, t_start = t, time.time()
+            delay = t_start + (t - t_first) / speed - time.time()
+            if delay > 0:
+                ev_quit.wait(delay)
+        if stamp is not None:
+            envelope = dict(status=dict(envelope['status']))
+            envelope['status'][stamp] = time.perf_counter()
+        status_q.put(envelope)
+        count += 1
+    return count
+
+
+class SyntheticStream:
+    """Generates a plausible status stream for a set of aliases.
+
+    Every packet carries a random (fraction) of the aliases.  Values
+    follow the type of the alias in (template) (alias -> example value):
+    floats and ints do a random walk from the example value, anything
+    else is repeated as is.  Aliases not in (template) or in
+    default_template are floats, or ints or strings if they match
+    int_prefixes or str_suffixes.
+    Aliases in (time_aliases) are always sent, set to the packet time.
+    """
+
+    def __init__(self, aliases, rate=10.0, fraction=0.2, template=None,
+                 time_aliases=None, seed=None):
+        self.aliases = sorted(set(aliases))
+        self.rate = rate
+        self.fraction = fraction
+        template = dict(default_template, **(template or {}))
+        if time_aliases is None:
+            time_aliases = []
+        self.time_aliases = list(time_aliases)
+        self.rng = random.Random(seed)
+
+        self.values = {}
+        for alias in self.aliases:
+            val = template.get(alias, None)
+            if val is None:
+                if alias.startswith(int_prefixes):
+                    val = self.rng.randint(0, 255)
+                elif alias.endswith(str_suffixes):
+                    val = 'BENCH'
+                else:
+                    val = self.rng.uniform(-100.0, 100.0)
+            self.values[alias] = val
+
+    def next_status(self, t):
+        num = max(1, int(len(self.aliases) * self.fraction))
+        status = {}
+        for alias in self.rng.sample(self.aliases, min(num,
+                                                       len(self.aliases))):
+            val = self.values[alias]
+            if isinstance(val, bool):
+                pass
+            elif isinstance(val, float):
+                if np.isfinite(val):
+                    val += self.rng.gauss(0.0, 1.0 + abs(val) * 0.001)
+            elif isinstance(val, int):
+                val += self.rng.choice((-1, 0, 1))
+            self.values[alias] = val
+            status[alias] = val
+
+        for alias in self.time_aliases:
+            status[alias] = t
+        return status
+
+    def records(self, num_packets, t_start=None):
+        """Generates (num_packets) (time, envelope) pairs, (rate) per
+        second starting at (t_start).
+        """
+        if t_start is None:
+            t_start = time.time()
+        for i in range(num_packets):
+            t = t_start + i / self.rate
+            yield (t, dict(status=self.next_status(t)))
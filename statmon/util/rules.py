@@ -0,0 +1,187 @@
+#
+# rules.py -- declarative warning rules for StatMon time series plots
+#
+"""
+A rule sets the background of a plot to 'warning' or 'alert' when an
+expression over one or more aliases is true, e.g.
+
+    dict(plot='m1_and_dew', level='warning',
+         vars=dict(m1='STATL.M1_TEMP_MIN', dew='STATL.DEW_POINT_TLSCP'),
+         expr='m1 - dew <= 2.0', window=60.0, when='any')
+
+(vars) maps the names used in (expr) to aliases.  With a (window) of
+0 the expression is evaluated on the latest value of each alias.
+Otherwise it is evaluated, as NumPy arrays, at every time any of the
+aliases has a point in the last (window) seconds of data, each alias
+taking its latest value at that time; (when) is 'any' or 'all' of
+those times.
+
+Expressions are Python syntax limited to numbers, the names in (vars),
+arithmetic, comparisons, 'and', 'or', 'not' and the functions in
+functions below.
+"""
+import ast
+import functools
+
+import numpy as np
+
+# plot background levels, in increasing order of severity
+levels = ('normal', 'warning', 'alert')
+
+functions = dict(abs=np.abs,
+                 min=lambda *args: functools.reduce(np.minimum, args),
+                 max=lambda *args: functools.reduce(np.maximum, args))
+
+_allowed_nodes = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp,
+                  ast.Compare, ast.Call, ast.Name, ast.Load, ast.Constant,
+                  ast.operator, ast.unaryop, ast.boolop, ast.cmpop)
+
+
+class RuleError(Exception):
+    pass
+
+
+class _ArrayLogic(ast.NodeTransformer):
+    # 'and', 'or' and 'not' become their elementwise NumPy versions
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        fn = 'logical_and' if isinstance(node.op, ast.And) else 'logical_or'
+        res = node.values[0]
+        for value in node.values[1:]:
+            res = ast.Call(func=ast.Name(id=fn, ctx=ast.Load()),
+                           args=[res, value], keywords=[])
+        return res
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.Call(func=ast.Name(id='logical_not', ctx=ast.Load()),
+                            args=[node.operand], keywords=[])
+        return node
+
+
+def compile_expr(expr, names):
+    """Check (expr) and compile it for evaluation with the variables in
+    (names).  Raises RuleError if it uses anything else.
+    """
+    try:
+        tree = ast.parse(expr, mode='eval')
+    except SyntaxError as e:
+        raise RuleError("bad rule expression '%s': %s" % (expr, e))
+
+    for node in ast.walk(tree):
+        if not isinstance(node, _allowed_nodes):
+            raise RuleError("'%s' not allowed in rule expression '%s'" % (
+                node.__class__.__name__, expr))
+        if isinstance(node, ast.Constant) and \
+           not isinstance(node.value, (int, float)):
+            raise RuleError("only numbers allowed in rule expression '%s'" % (
+                expr))
+        if isinstance(node, ast.Compare) and len(node.ops) > 1:
+            raise RuleError("chained comparison in rule expression '%s'" % (
+                expr))
+        if isinstance(node, ast.Call) and \
+           not (isinstance(node.func, ast.Name) and
+                node.func.id in functions and len(node.keywords) == 0):
+            raise RuleError("unknown function in rule expression '%s'" % (
+                expr))
+        if isinstance(node, ast.Name) and \
+           node.id not in names and node.id not in functions:
+            raise RuleError("unknown name '%s' in rule expression '%s'" % (
+                node.id, expr))
+
+    tree = ast.fix_missing_locations(_ArrayLogic().visit(tree))
+    return compile(tree, '<rule>', 'eval')
+
+
+class WarningRule:
+    """A rule for the background of plot (plot); see the module
+    docstring for the other parameters.
+    """
+
+    def __init__(self, plot, expr, vars, level='warning', window=0.0,
+                 when='any'):
+        if level not in levels[1:]:
+            raise RuleError("rule level must be 'warning' or 'alert'")
+        if when not in ('any', 'all'):
+            raise RuleError("rule 'when' must be 'any' or 'all'")
+        self.plot = plot
+        self.expr = expr
+        self.vars = dict(vars)
+        self.level = levels.index(level)
+        self.window = window
+        self.when = when
+        self.code = compile_expr(expr, self.vars)
+        self.namespace = dict(functions, logical_and=np.logical_and,
+                              logical_or=np.logical_or,
+                              logical_not=np.logical_not,
+                              __builtins__={})
+
+    def get_aliases(self):
+        return list(self.vars.values())
+
+    def evaluate(self, get_points):
+        """Returns True if the rule is triggered.  (get_points) returns
+        the (N, 2) points of an alias, sorted by time.
+        """
+        series = {name: get_points(alias)
+                  for name, alias in self.vars.items()}
+        if any(len(points) == 0 for points in series.values()):
+            return False
+
+        if self.window <= 0:
+            values = {name: points[-1, 1] for name, points in series.items()}
+        else:
+            # every time any alias has a point in the window, counted
+            # back from the newest point of all
+            t_lo = max(points[-1, 0] for points in series.values()) - \
+                self.window
+            times = np.unique(np.concatenate(
+                [points[np.searchsorted(points[:, 0], t_lo):, 0]
+                 for points in series.values()]))
+            # the latest value of each alias at each of those times
+            values = {}
+            for name, points in series.items():
+                idx = np.searchsorted(points[:, 0], times, side='right') - 1
+                values[name] = points[np.clip(idx, 0, None), 1]
+
+        res = eval(self.code, self.namespace, values)
+        if self.when == 'all':
+            return bool(np.all(res))
+        return bool(np.any(res))
+
+
+class RuleSet:
+    """Evaluates a list of rules (dicts of WarningRule parameters) for
+    all plots at once.
+    """
+
+    def __init__(self, rule_specs, logger):
+        self.logger = logger
+        self.rules = []
+        for spec in rule_specs:
+            try:
+                self.rules.append(WarningRule(**spec))
+            except Exception as e:
+                self.logger.error("bad warning rule {}: {}".format(spec, e))
+
+    def get_plots(self):
+        return set([rule.plot for rule in self.rules])
+
+    def evaluate(self, get_points):
+        """Returns a dict of plot name -> index in levels of the most
+        severe rule triggered for it.
+        """
+        res = {}
+        for rule in self.rules:
+            level = res.setdefault(rule.plot, 0)
+            if rule.level <= level:
+                continue
+            try:
+                if rule.evaluate(get_points):
+                    res[rule.plot] = rule.level
+            except Exception as e:
+                self.logger.error("error evaluating warning rule '{}': {}".format(
+                    rule.expr, e))
+        return res
@@ -0,0 +1,134 @@
+#
+# stats.py -- rolling timing statistics for StatMon plugins
+#
+import time
+import math
+import bisect
+import threading
+
+
+class RollingHistogram:
+    """Histogram of durations (secs) over the last (window) seconds.
+
+    Durations are counted in log-spaced bins from (lo) to (hi) seconds.
+    The window is divided into (num_slots) slots; when a slot falls out
+    of the window its counts are dropped, so the window slides in steps
+    of window / num_slots.
+    """
+
+    def __init__(self, window=60.0, num_slots=6, lo=1.0e-5, hi=10.0,
+                 bins_per_decade=5):
+        num_bins = int(round(math.log10(hi / lo) * bins_per_decade))
+        self.edges = [lo * 10 ** (i / bins_per_decade)
+                      for i in range(num_bins + 1)]
+        self.num_slots = num_slots
+        self.slot_time = window / num_slots
+        # one extra bin at each end for under/overflow
+        self.counts = [[0] * (num_bins + 2) for i in range(num_slots)]
+        self.sums = [0.0] * num_slots
+        self.cur = 0
+        self.cur_start = time.time()
+
+    def _advance(self, t):
+        n = int((t - self.cur_start) / self.slot_time)
+        if n <= 0:
+            return
+        for i in range(min(n, self.num_slots)):
+            self.cur = (self.cur + 1) % self.num_slots
+            counts = self.counts[self.cur]
+            counts[:] = [0] * len(counts)
+            self.sums[self.cur] = 0.0
+        self.cur_start += n * self.slot_time
+
+    def add(self, val, t=None):
+        if t is None:
+            t = time.time()
+        self._advance(t)
+        self.counts[self.cur][bisect.bisect(self.edges, val)] += 1
+        self.sums[self.cur] += val
+
+    def get_counts(self):
+        """Returns the counts per bin over the window."""
+        self._advance(time.time())
+        return [sum(col) for col in zip(*self.counts)]
+
+    def percentile(self, pct, counts=None):
+        """Returns the upper edge of the bin holding the (pct) percentile,
+        or the top edge if it is in the overflow bin."""
+        if counts is None:
+            counts = self.get_counts()
+        total = sum(counts)
+        if total == 0:
+            return 0.0
+        rank = total * pct / 100.0
+        acc = 0
+        for i, count in enumerate(counts):
+            acc += count
+            if acc >= rank:
+                return self.edges[min(i, len(self.edges) - 1)]
+        return self.edges[-1]
+
+    def summary(self):
+        counts = self.get_counts()
+        count = sum(counts)
+        total = sum(self.sums)
+        return dict(count=count, total=total,
+                    mean=total / count if count > 0 else 0.0,
+                    p50=self.percentile(50, counts),
+                    p90=self.percentile(90, counts),
+                    p99=self.percentile(99, counts))
+
+
+class CallbackStats:
+    """Statistics for the status callbacks of one plugin registration.
+
+    Updated from the status and GUI threads and read from any thread
+    (e.g. a remote call), so everything is done under a lock.
+    """
+
+    def __init__(self, window=60.0):
+        self.lock = threading.Lock()
+        self.num_callbacks = 0
+        self.num_fetched = 0
+        # time spent in the callback
+        self.cb_time = RollingHistogram(window)
+        # time from being queued for the GUI thread to being run
+        self.lag = RollingHistogram(window)
+
+    def add_fetched(self, num):
+        with self.lock:
+            self.num_fetched += num
+
+    def add_lag(self, lag, t):
+        with self.lock:
+            self.lag.add(lag, t)
+
+    def add_callback(self, cb_time, t):
+        with self.lock:
+            self.num_callbacks += 1
+            self.cb_time.add(cb_time, t)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(callbacks=self.num_callbacks,
+                        fetched=self.num_fetched,
+                        cb_time=self.cb_time.summary(),
+                        lag=self.lag.summary())
+
+
+def format_stats(stats):
+    """Format the result of Controller.get_plugin_stats() as a table,
+    slowest plugin (most callback time in the window) first.  Callback
+    times and lags are in milliseconds.
+    """
+    lines = ["%-20s %8s %8s %9s %8s %8s %8s %8s" % (
+        'plugin', 'calls', 'fetched', 'cb tot s', 'cb p50ms', 'cb p99ms',
+        'lag p50', 'lag p99')]
+    for ident, d in sorted(stats.items(),
+                           key=lambda item: -item[1]['cb_time']['total']):
+        cb, lag = d['cb_time'], d['lag']
+        lines.append("%-20s %8d %8d %9.3f %8.2f %8.2f %8.2f %8.2f" % (
+            ident[:20], d['callbacks'], d['fetched'], cb['total'],
+            cb['p50'] * 1000, cb['p99'] * 1000,
+            lag['p50'] * 1000, lag['p99'] * 1000))
+    return '\n'.join(lines)
@@ -0,0 +1,75 @@
+#
+# test_history.py -- tests for statmon.util.history
+#
+import time
+import logging
+import threading
+
+import numpy as np
+
+from statmon.util.history import (StatusHistory, SharedHistoryDataSource,
+                                  merge_older, prepare_merge, finish_merge)
+
+
+def test_merge_older_with_concurrent_appends():
+    """Points appended by the model while saved history is merged in
+    must all end up in the ring, in time order."""
+    logger = logging.getLogger('test_history')
+    num_appends = 2000
+
+    for compact in (False, True):
+        # like the model: appends are made under its lock
+        lock = threading.RLock()
+        history = StatusHistory(logger, lock=lock)
+        history.subscribe(['A'], 10 * num_appends, compact=compact)
+        dsrc = SharedHistoryDataSource(history, 'A')
+
+        t0 = time.time() - 1000.0
+        with lock:
+            history.append({'A': -1.0}, {})
+
+        def model_loop():
+            for i in range(num_appends):
+                with lock:
+                    history.append({'A': float(i)}, {})
+
+        thread = threading.Thread(target=model_loop)
+        thread.start()
+        for i in range(200):
+            # each merge brings in points older than all those held
+            old = np.array([(t0 - i - 0.5, -2.0), (t0 - i, -2.0)])
+            merge_older(dsrc, old)
+        thread.join()
+
+        points = dsrc.get_points()
+        assert np.all(np.diff(points[:, 0]) >= 0.0)
+        values = points[:, 1]
+        assert list(values[values >= 0.0]) == list(range(num_appends))
+        assert np.count_nonzero(values == -1.0) == 1
+        assert np.count_nonzero(values == -2.0) == 400
+
+
+def test_prepared_merges():
+    """Merges prepared before points are appended, or before another
+    merge is finished, still keep every point."""
+    logger = logging.getLogger('test_history')
+
+    for compact in (False, True):
+        history = StatusHistory(logger)
+        history.subscribe(['A'], 100, compact=compact)
+        dsrc = SharedHistoryDataSource(history, 'A')
+        history.append({'A': 10.0}, {})
+
+        t0 = time.time() - 1000.0
+        recent = np.array([(t0 + 1.0, 1.0), (t0 + 2.0, 2.0)])
+        older = np.array([(t0 - 2.0, -2.0), (t0 - 1.0, -1.0)])
+        merge_recent = prepare_merge(dsrc, recent)
+        merge_older_pts = prepare_merge(dsrc, older)
+        history.append({'A': 11.0}, {})
+        assert finish_merge(dsrc, merge_recent)
+        history.append({'A': 12.0}, {})
+        assert finish_merge(dsrc, merge_older_pts)
+
+        points = dsrc.get_points()
+        assert list(points[:, 1]) == [-2.0, -1.0, 1.0, 2.0,
+                                      10.0, 11.0, 12.0]